@@ -14,16 +14,22 @@ supported interpreters each function resolves builtins against the references
 captured when it was defined, not this mapping.
 """
 
-import json
 import sys
 from collections.abc import Callable
+from typing import TYPE_CHECKING
 
 from src.constants import (
     BLOCKED_ATTRIBUTES,
     EXECUTOR_CIRCULAR_REFERENCE_KEY,
     EXECUTOR_FILENAMES,
+    MAX_IMPORT_DECISION_CACHE_SIZE,
 )
 from src.errors import SecurityViolationError
+from src.json_codec import json_dumps
+
+if TYPE_CHECKING:
+    from src.message_types.pipe import PrintArgs
+    from src.task_executor import _PrintStream
 
 # Bind the frame helper while ``sys`` is importable (this module drops most of
 # its builtins at end of load). Keep only this function, not all of ``sys``, to
@@ -100,7 +106,9 @@ class _SafePrint(_HardenedCallable):
     __slots__ = ("_print_args", "_format_print_args")
     _DENY = _INTROSPECTION_DENY | frozenset({"_print_args", "_format_print_args"})
 
-    def __init__(self, print_args: list, format_print_args: Callable):
+    def __init__(
+        self, print_args: "PrintArgs | _PrintStream", format_print_args: Callable
+    ):
         object.__setattr__(self, "_print_args", print_args)
         object.__setattr__(self, "_format_print_args", format_print_args)
 
@@ -108,7 +116,7 @@ class _SafePrint(_HardenedCallable):
         serializable_args = []
         for arg in args:
             try:
-                json.dumps(arg, default=str, ensure_ascii=False)
+                json_dumps(arg)
                 serializable_args.append(arg)
             except Exception:
                 # Ensure args are serializable across the multiprocessing pipe.
@@ -219,6 +227,29 @@ def _import_initiated_by_user_code() -> bool:
     return initiator.f_code.co_filename in EXECUTOR_FILENAMES
 
 
+def _decide_import(
+    decisions: dict, validate: Callable, config, check_name, package
+) -> tuple[bool, str | None]:
+    """The ``(is_allowed, error_msg)`` of ``validate`` for an import, cached in
+    ``decisions`` by validation target."""
+    # Only exact strings are cached: a name that isn't a string is left for the
+    # validator to reject, and a `str` subclass can hash and compare equal to a
+    # cached allowed name while importing another.
+    if type(check_name) is not str or (
+        package is not None and type(package) is not str
+    ):
+        return validate(check_name, config, package)
+
+    key = (check_name, package)
+    decision = decisions.get(key)
+    if decision is None:
+        decision = validate(check_name, config, package)
+        # Bounded, as user code may import any number of names.
+        if len(decisions) < MAX_IMPORT_DECISION_CACHE_SIZE:
+            decisions[key] = decision
+    return decision
+
+
 class _GuardedImport(_HardenedCallable):
     """Hardened wrapper around an import entry point.
 
@@ -226,11 +257,28 @@ class _GuardedImport(_HardenedCallable):
     in-place replacements on ``importlib.import_module`` / ``importlib.__import__``.
     Only the importlib entry points are ``trust_eligible``; the user-builtins
     ``__import__`` always validates, regardless of caller.
+
+    Allowlist decisions are cached per validation target, as the config they
+    depend on is fixed for the life of the guard, so that a package importing
+    the same names over and over is only validated once per name. Whether an
+    import is trusted depends on its caller, so that is still checked per call.
     """
 
-    __slots__ = ("_security_config", "_validate_import", "_original", "_trust_eligible")
+    __slots__ = (
+        "_security_config",
+        "_validate_import",
+        "_original",
+        "_trust_eligible",
+        "_decisions",
+    )
     _DENY = _INTROSPECTION_DENY | frozenset(
-        {"_security_config", "_validate_import", "_original", "_trust_eligible"}
+        {
+            "_security_config",
+            "_validate_import",
+            "_original",
+            "_trust_eligible",
+            "_decisions",
+        }
     )
 
     def __init__(
@@ -244,6 +292,7 @@ class _GuardedImport(_HardenedCallable):
         object.__setattr__(self, "_validate_import", validate_import)
         object.__setattr__(self, "_original", original)
         object.__setattr__(self, "_trust_eligible", trust_eligible)
+        object.__setattr__(self, "_decisions", {})
 
     def __call__(self, name, *args, **kwargs):
         config = object.__getattribute__(self, "_security_config")
@@ -255,9 +304,14 @@ class _GuardedImport(_HardenedCallable):
             and not _import_initiated_by_user_code()
         )
         if not trusted:
-            validate = object.__getattribute__(self, "_validate_import")
             check_name, package = _validation_target(name, args, kwargs)
-            is_allowed, error_msg = validate(check_name, config, package)
+            is_allowed, error_msg = _decide_import(
+                object.__getattribute__(self, "_decisions"),
+                object.__getattribute__(self, "_validate_import"),
+                config,
+                check_name,
+                package,
+            )
             if not is_allowed:
                 assert error_msg is not None
                 raise SecurityViolationError(
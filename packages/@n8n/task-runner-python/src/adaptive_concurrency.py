@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Callable
+
+from src.constants import (
+    AUTO_CONCURRENCY_CPU_PRESSURE_HIGH,
+    AUTO_CONCURRENCY_CPU_PRESSURE_LOW,
+    AUTO_CONCURRENCY_INTERVAL,
+    AUTO_CONCURRENCY_MAX,
+    AUTO_CONCURRENCY_MEMORY_PRESSURE_HIGH,
+    AUTO_CONCURRENCY_MEMORY_PRESSURE_LOW,
+    AUTO_CONCURRENCY_MIN_TASK_MEMORY,
+    AUTO_CONCURRENCY_RESERVED_MEMORY,
+    AUTO_CONCURRENCY_TASK_MEMORY,
+    AUTO_CONCURRENCY_TASK_MEMORY_DECAY,
+    AUTO_CONCURRENCY_TASKS_PER_CPU,
+    CGROUP_ROOT,
+    LOG_CONCURRENCY_CHANGE,
+    LOG_CONCURRENCY_INITIAL,
+    PRESSURE_DIR,
+)
+
+
+def _read_text(path: Path) -> str | None:
+    try:
+        return path.read_text()
+    except OSError:
+        return None
+
+
+def _find_cgroup_dirs(cgroup_root: Path) -> list[Path]:
+    """Directories of the cgroup v2 this process is in and of its ancestors, whose
+    limits all apply, innermost first."""
+
+    cgroup_path = "/"
+    for line in (_read_text(Path("/proc/self/cgroup")) or "").splitlines():
+        if line.startswith("0::"):
+            cgroup_path = line[3:].strip() or "/"
+
+    dirs = []
+    path = Path(cgroup_path)
+    while True:
+        cgroup_dir = cgroup_root / path.relative_to("/")
+        if cgroup_dir.is_dir():
+            dirs.append(cgroup_dir)
+        if path == path.parent:
+            return dirs
+        path = path.parent
+
+
+def read_cpu_limit(cgroup_dirs: list[Path]) -> float:
+    """CPUs available to this process, per the tightest `cpu.max` quota, else the
+    CPUs it may run on."""
+
+    try:
+        limit = float(len(os.sched_getaffinity(0)))
+    except AttributeError:  # not on Linux
+        limit = float(os.cpu_count() or 1)
+
+    for cgroup_dir in cgroup_dirs:
+        content = _read_text(cgroup_dir / "cpu.max")
+        if content is None:
+            continue
+        quota, _, period = content.partition(" ")
+        if quota == "max":
+            continue
+        try:
+            limit = min(limit, int(quota) / int(period))
+        except ValueError:
+            continue
+
+    return limit
+
+
+def read_memory_limit(cgroup_dirs: list[Path]) -> int | None:
+    """Bytes of memory available to this process, per the tightest `memory.max`
+    limit, or `None` if unlimited."""
+
+    limit = None
+
+    for cgroup_dir in cgroup_dirs:
+        content = (_read_text(cgroup_dir / "memory.max") or "").strip()
+        if not content.isdigit():  # "max" or missing
+            continue
+        limit = int(content) if limit is None else min(limit, int(content))
+
+    return limit
+
+
+def read_pressure(path: Path) -> float | None:
+    """Share of the last 10 seconds, in %, in which some task stalled on the
+    resource, per Linux pressure stall information, or `None` if unavailable."""
+
+    for line in (_read_text(path) or "").splitlines():
+        if not line.startswith("some "):
+            continue
+        for field in line.split()[1:]:
+            name, _, value = field.partition("=")
+            if name == "avg10":
+                return float(value)
+
+    return None
+
+
+def read_process_rss(pid: int) -> int | None:
+    """Resident memory of a process in bytes, or `None` if it is gone."""
+
+    content = _read_text(Path(f"/proc/{pid}/statm"))
+    if content is None:
+        return None
+    try:
+        return int(content.split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IndexError, ValueError):
+        return None
+
+
+def _format_memory(size_bytes: int | None) -> str:
+    if size_bytes is None:
+        return "unlimited"
+    return f"{size_bytes / (1024 * 1024):.0f} MB"
+
+
+class AdaptiveConcurrency:
+    """Number of task slots to offer, sized on start from the CPU quota and memory
+    limit of the cgroup of the runner, then adjusted every few seconds:
+
+    - down to fit the memory limit, at the memory tasks are seen to use,
+    - down by one slot while CPU or memory pressure is high,
+    - up by one slot while all slots are busy and pressure is low.
+
+    Tasks already running are never stopped, a lower limit only takes effect as
+    they finish. Every change is logged with the reason for it.
+    """
+
+    def __init__(
+        self,
+        get_task_pids: Callable[[], list[int]],
+        get_running_count: Callable[[], int],
+        on_change: Callable[[], None],
+        cgroup_root: Path = Path(CGROUP_ROOT),
+        pressure_dir: Path = Path(PRESSURE_DIR),
+    ):
+        self.get_task_pids = get_task_pids
+        self.get_running_count = get_running_count
+        self.on_change = on_change
+        self.pressure_dir = pressure_dir
+        self.logger = logging.getLogger(__name__)
+
+        cgroup_dirs = _find_cgroup_dirs(cgroup_root)
+        self.cpu_limit = read_cpu_limit(cgroup_dirs)
+        self.memory_limit = read_memory_limit(cgroup_dirs)
+        self.task_memory = AUTO_CONCURRENCY_TASK_MEMORY  # bytes, estimated per task
+
+        self.limit = self.max_limit
+        self.adjust_coroutine: asyncio.Task | None = None
+
+    @property
+    def max_limit(self) -> int:
+        """Most task slots that the CPU quota and memory limit allow for."""
+
+        cpu_slots = int(self.cpu_limit * AUTO_CONCURRENCY_TASKS_PER_CPU)
+        slots = min(cpu_slots, AUTO_CONCURRENCY_MAX)
+
+        if self.memory_limit is not None:
+            available = self.memory_limit - AUTO_CONCURRENCY_RESERVED_MEMORY
+            slots = min(slots, available // self.task_memory)
+
+        return max(1, slots)
+
+    def start(self) -> None:
+        self.logger.info(
+            LOG_CONCURRENCY_INITIAL.format(
+                limit=self.limit,
+                cpus=f"{self.cpu_limit:g}",
+                memory=_format_memory(self.memory_limit),
+            )
+        )
+
+        if self.adjust_coroutine is None:
+            self.adjust_coroutine = asyncio.create_task(self._adjust_loop())
+
+    async def stop(self) -> None:
+        if self.adjust_coroutine and not self.adjust_coroutine.done():
+            self.adjust_coroutine.cancel()
+            try:
+                await self.adjust_coroutine
+            except asyncio.CancelledError:
+                pass
+        self.adjust_coroutine = None
+
+    async def _adjust_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.sleep(AUTO_CONCURRENCY_INTERVAL)
+                self.adjust()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self.logger.error(f"Error adjusting concurrency: {e}")
+
+    def adjust(self) -> None:
+        """Resize the task slots from the current pressure and task memory."""
+
+        self._observe_task_memory()
+        cpu_pressure = read_pressure(self.pressure_dir / "cpu")
+        memory_pressure = read_pressure(self.pressure_dir / "memory")
+        max_limit = self.max_limit
+
+        if self.limit > max_limit:
+            self._set_limit(
+                max_limit,
+                f"fits {_format_memory(self.memory_limit)} memory limit "
+                f"at {_format_memory(self.task_memory)} per task",
+            )
+        elif self._is_above(memory_pressure, AUTO_CONCURRENCY_MEMORY_PRESSURE_HIGH):
+            self._set_limit(self.limit - 1, f"memory pressure at {memory_pressure}%")
+        elif self._is_above(cpu_pressure, AUTO_CONCURRENCY_CPU_PRESSURE_HIGH):
+            self._set_limit(self.limit - 1, f"CPU pressure at {cpu_pressure}%")
+        elif (
+            self.limit < max_limit
+            and self.get_running_count() >= self.limit
+            and not self._is_above(cpu_pressure, AUTO_CONCURRENCY_CPU_PRESSURE_LOW)
+            and not self._is_above(
+                memory_pressure, AUTO_CONCURRENCY_MEMORY_PRESSURE_LOW
+            )
+        ):
+            self._set_limit(self.limit + 1, "all task slots busy at low pressure")
+
+    def _observe_task_memory(self) -> None:
+        # The estimate follows the largest task running, decaying slowly once
+        # large tasks are done, so that a burst of them does not cap slots for long.
+        sizes = [
+            rss
+            for pid in self.get_task_pids()
+            if (rss := read_process_rss(pid)) is not None
+        ]
+        decayed = int(self.task_memory * AUTO_CONCURRENCY_TASK_MEMORY_DECAY)
+        self.task_memory = max(
+            max(sizes, default=0), decayed, AUTO_CONCURRENCY_MIN_TASK_MEMORY
+        )
+
+    @staticmethod
+    def _is_above(pressure: float | None, threshold: float) -> bool:
+        return pressure is not None and pressure > threshold
+
+    def _set_limit(self, limit: int, reason: str) -> None:
+        limit = max(1, limit)
+        if limit == self.limit:
+            return
+
+        self.logger.info(
+            LOG_CONCURRENCY_CHANGE.format(
+                old_limit=self.limit, limit=limit, reason=reason
+            )
+        )
+        self.limit = limit
+        self.on_change()
@@ -0,0 +1,216 @@
+import hashlib
+import hmac
+import importlib.util
+import json
+import logging
+import marshal
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import types
+from pathlib import Path
+from typing import Callable, TypeVar
+
+from src.constants import (
+    CODE_CACHE_BUSY_TIMEOUT,
+    CODE_CACHE_EVICTION_TARGET,
+    CODE_CACHE_FILENAME,
+    LOG_CODE_CACHE_DISABLED,
+    LOG_CODE_CACHE_INVALID_ENTRY,
+)
+from src.metrics import CODE_CACHE_LOOKUPS
+
+T = TypeVar("T")
+
+SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+
+def get_runner_version() -> str:
+    """Version of the runner code and of the bytecode it compiles to, so that
+    cached verdicts and code objects never outlive a change to either. Read from
+    the sources, as the runner is not installed as a versioned package."""
+
+    digest = hashlib.sha256(importlib.util.MAGIC_NUMBER)
+    src_dir = Path(__file__).parent
+    for path in sorted(src_dir.rglob("*.py")):
+        digest.update(str(path.relative_to(src_dir)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class CodeCache:
+    """Validation verdicts and compiled code, persisted in a SQLite database in a
+    local directory, so that they survive restarts, e.g. in auto-shutdown mode,
+    and are shared by runners on the same host that use the same directory.
+
+    SQLite in WAL mode handles concurrent access from several processes. Entries
+    hold the runner version in their key, and the least recently used are evicted
+    once the database holds more than `max_size` bytes of values.
+
+    The cache is an optimization only: on any error opening or using the database
+    it logs once and turns itself off, and tasks go on with the in-memory caches.
+
+    Subprocesses run as the same user as the runner and could write to the
+    database, so every entry is signed along with its key, with a secret that
+    only the runner holds. Entries that fail verification or decoding are
+    discarded as misses. Runners share entries only if they share the secret,
+    otherwise each signs with a random one and reads back its own entries only.
+    """
+
+    def __init__(self, directory: str, max_size: int, secret: str = ""):
+        self.max_size = max_size  # bytes
+        self.version = get_runner_version()
+        self.secret = secret.encode() if secret else secrets.token_bytes(32)
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+
+        self.connection: sqlite3.Connection | None = None
+        try:
+            self.connection = self._connect(directory)
+        except (OSError, sqlite3.Error) as e:
+            self._disable(e)
+
+    @staticmethod
+    def _connect(directory: str) -> sqlite3.Connection:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        connection = sqlite3.connect(
+            os.path.join(directory, CODE_CACHE_FILENAME),
+            timeout=CODE_CACHE_BUSY_TIMEOUT,
+            isolation_level=None,  # autocommit, each statement is a transaction
+            check_same_thread=False,  # serialized by `self.lock`
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, used_at REAL NOT NULL)"
+        )
+        return connection
+
+    def get_violations(self, code_hash: str, allowlists: tuple) -> list[str] | None:
+        return self._get(
+            "validation", f"{code_hash}/{allowlists!r}", self._decode_violations
+        )
+
+    def set_violations(
+        self, code_hash: str, allowlists: tuple, violations: list[str]
+    ) -> None:
+        value = json.dumps(violations).encode()
+        self._set("validation", f"{code_hash}/{allowlists!r}", value)
+
+    def get_code(self, code_hash: str, filename: str) -> bytes | None:
+        return self._get("compile", f"{code_hash}/{filename}", self._decode_code)
+
+    def set_code(self, code_hash: str, filename: str, code: bytes) -> None:
+        self._set("compile", f"{code_hash}/{filename}", code)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    @staticmethod
+    def _decode_violations(value: bytes) -> list[str]:
+        violations = json.loads(value)
+        if not isinstance(violations, list) or not all(
+            isinstance(violation, str) for violation in violations
+        ):
+            raise TypeError("Violations must be a list of strings")
+        return violations
+
+    @staticmethod
+    def _decode_code(value: bytes) -> bytes:
+        # loaded by subprocesses, so checked here rather than failing the task there
+        if not isinstance(marshal.loads(value), types.CodeType):
+            raise TypeError("Compiled code must be a code object")
+        return value
+
+    def _sign(self, entry_key: str, value: bytes) -> bytes:
+        return hmac.digest(self.secret, entry_key.encode() + b"\0" + value, "sha256")
+
+    def _get(self, kind: str, key: str, decode: Callable[[bytes], T]) -> T | None:
+        entry_key = f"{kind}/{self.version}/{key}"
+        with self.lock:
+            if self.connection is None:
+                return None
+            try:
+                # as bytes even if something else was written as text
+                row = self.connection.execute(
+                    "UPDATE entries SET used_at = ? WHERE key = ? "
+                    "RETURNING CAST(value AS BLOB)",
+                    (time.time(), entry_key),
+                ).fetchone()
+            except sqlite3.Error as e:
+                self._disable(e)
+                return None
+
+        decoded = None
+        if row is not None:
+            signature, value = row[0][:SIGNATURE_SIZE], row[0][SIGNATURE_SIZE:]
+            try:
+                if not hmac.compare_digest(signature, self._sign(entry_key, value)):
+                    raise ValueError("Signature does not match")
+                decoded = decode(value)
+            except (ValueError, EOFError, TypeError) as e:
+                self.logger.warning(
+                    LOG_CODE_CACHE_INVALID_ENTRY.format(key=entry_key, error=e)
+                )
+                self._delete(entry_key)
+
+        CODE_CACHE_LOOKUPS.inc(cache=kind, result="miss" if decoded is None else "hit")
+        return decoded
+
+    def _set(self, kind: str, key: str, value: bytes) -> None:
+        entry_key = f"{kind}/{self.version}/{key}"
+        entry = self._sign(entry_key, value) + value
+        with self.lock:
+            if self.connection is None:
+                return
+            try:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                    (entry_key, entry, len(entry), time.time()),
+                )
+                self._evict(self.connection)
+            except sqlite3.Error as e:
+                self._disable(e)
+
+    def _delete(self, entry_key: str) -> None:
+        with self.lock:
+            if self.connection is None:
+                return
+            try:
+                self.connection.execute(
+                    "DELETE FROM entries WHERE key = ?", (entry_key,)
+                )
+            except sqlite3.Error as e:
+                self._disable(e)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        (total,) = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if total <= self.max_size:
+            return
+
+        # down to below the limit, so as not to evict on every write once full
+        connection.execute(
+            "DELETE FROM entries WHERE key IN ("
+            "SELECT key FROM (SELECT key, SUM(size) OVER "
+            "(ORDER BY used_at DESC ROWS UNBOUNDED PRECEDING) AS kept FROM entries) "
+            "WHERE kept > ?)",
+            (int(self.max_size * CODE_CACHE_EVICTION_TARGET),),
+        )
+
+    def _disable(self, error: Exception) -> None:
+        self.logger.warning(LOG_CODE_CACHE_DISABLED.format(error=error))
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except sqlite3.Error:
+                pass
+        self.connection = None
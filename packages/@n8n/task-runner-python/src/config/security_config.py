@@ -8,3 +8,5 @@ class SecurityConfig:
     builtins_deny: set[str]
     runner_env_deny: bool
     allow_transitive_imports: bool = False
+    memory_limit: int = 0  # bytes a task may allocate, 0 for no limit
+    cpu_limit: int = 0  # seconds of CPU time per task, 0 for no limit
@@ -1,3 +1,4 @@
+import os
 from dataclasses import dataclass
 
 from src.env import read_bool_env, read_int_env, read_str_env
@@ -7,22 +8,39 @@ from src.constants import (
     DEFAULT_MAX_CONCURRENCY,
     DEFAULT_MAX_PAYLOAD_SIZE,
     DEFAULT_TASK_BROKER_URI,
+    DEFAULT_TASK_CPU_LIMIT,
+    DEFAULT_TASK_MEMORY_LIMIT,
     DEFAULT_TASK_TIMEOUT,
     DEFAULT_AUTO_SHUTDOWN_TIMEOUT,
+    DEFAULT_CODE_CACHE_MAX_SIZE,
+    DEFAULT_PER_ITEM_MAX_SHARDS,
     DEFAULT_SHUTDOWN_TIMEOUT,
+    DEFAULT_WORKER_POOL_REFILL_RATE,
+    DEFAULT_WORKER_POOL_SIZE,
+    MAX_CONCURRENCY_AUTO,
     ENV_ALLOW_TRANSITIVE_IMPORTS,
     ENV_BLOCK_RUNNER_ENV_ACCESS,
     ENV_BUILTINS_DENY,
+    ENV_CODE_CACHE_DIR,
+    ENV_CODE_CACHE_MAX_SIZE,
+    ENV_CODE_CACHE_SECRET,
     ENV_EXTERNAL_ALLOW,
+    ENV_FORKSERVER_PRELOAD,
     ENV_GRANT_TOKEN,
     ENV_MAX_CONCURRENCY,
     ENV_MAX_PAYLOAD_SIZE,
+    ENV_PER_ITEM_MAX_SHARDS,
     ENV_RUNNER_ID,
     ENV_STDLIB_ALLOW,
     ENV_TASK_BROKER_URI,
+    ENV_TASK_CPU_LIMIT,
+    ENV_TASK_MEMORY_LIMIT,
     ENV_TASK_TIMEOUT,
     ENV_AUTO_SHUTDOWN_TIMEOUT,
     ENV_GRACEFUL_SHUTDOWN_TIMEOUT,
+    ENV_STREAM_PRINT_OUTPUT,
+    ENV_WORKER_POOL_REFILL_RATE,
+    ENV_WORKER_POOL_SIZE,
     PIPE_MSG_MAX_SIZE,
 )
 
@@ -54,9 +72,14 @@ class TaskRunnerConfig:
     # connections by runner ID, so two runners sharing one keep evicting each other.
     runner_id: str
     task_broker_uri: str
+    # Task slots, unless sized adaptively from cgroup limits and host pressure.
     max_concurrency: int
+    adaptive_concurrency: bool
     max_payload_size: int
     task_timeout: int
+    # Per task, applied in its subprocess before user code runs. 0 for no limit.
+    task_memory_limit: int  # bytes allocated on top of what the subprocess starts with
+    task_cpu_limit: int  # seconds of CPU time
     auto_shutdown_timeout: int
     graceful_shutdown_timeout: int
     stdlib_allow: set[str]
@@ -64,11 +87,37 @@ class TaskRunnerConfig:
     builtins_deny: set[str]
     env_deny: bool
     allow_transitive_imports: bool
+    worker_pool_size: int
+    worker_pool_refill_rate: int
+    forkserver_preload: bool
+    stream_print_output: bool
+    # Directory to persist validation verdicts and compiled code in, shared by
+    # runners on the same host that set the same one. Empty to keep them in memory.
+    code_cache_dir: str
+    code_cache_max_size: int  # bytes
+    # Key to sign entries of the code cache with, to share them across restarts
+    # and runners. Empty for each runner to sign with a random key of its own.
+    code_cache_secret: str
+    # Subprocesses to split the items of a per-item task across, each taking a
+    # task slot that is free when the task starts. 1 to run every task in one.
+    per_item_max_shards: int
 
     @property
     def is_auto_shutdown_enabled(self) -> bool:
         return self.auto_shutdown_timeout > 0
 
+    @property
+    def is_worker_pool_enabled(self) -> bool:
+        return self.worker_pool_size > 0
+
+    @property
+    def is_sharding_enabled(self) -> bool:
+        return self.per_item_max_shards > 1
+
+    @property
+    def is_code_cache_enabled(self) -> bool:
+        return bool(self.code_cache_dir)
+
     @classmethod
     def from_env(cls):
         grant_token = read_str_env(ENV_GRANT_TOKEN, "")
@@ -83,6 +132,20 @@ class TaskRunnerConfig:
                 f"Task timeout must be positive, got {task_timeout}"
             )
 
+        task_memory_limit = read_int_env(
+            ENV_TASK_MEMORY_LIMIT, DEFAULT_TASK_MEMORY_LIMIT
+        )
+        if task_memory_limit < 0:
+            raise ConfigurationError(
+                f"Task memory limit must be non-negative, got {task_memory_limit}"
+            )
+
+        task_cpu_limit = read_int_env(ENV_TASK_CPU_LIMIT, DEFAULT_TASK_CPU_LIMIT)
+        if task_cpu_limit < 0:
+            raise ConfigurationError(
+                f"Task CPU limit must be non-negative, got {task_cpu_limit}"
+            )
+
         auto_shutdown_timeout = read_int_env(
             ENV_AUTO_SHUTDOWN_TIMEOUT, DEFAULT_AUTO_SHUTDOWN_TIMEOUT
         )
@@ -105,13 +168,61 @@ class TaskRunnerConfig:
                 f"Max payload size of {max_payload_size} bytes exceeds pipe message limit of {PIPE_MSG_MAX_SIZE} bytes. Reduce {ENV_MAX_PAYLOAD_SIZE}."
             )
 
+        adaptive_concurrency = (
+            read_str_env(ENV_MAX_CONCURRENCY, "").strip().lower()
+            == MAX_CONCURRENCY_AUTO
+        )
+        max_concurrency = (
+            DEFAULT_MAX_CONCURRENCY
+            if adaptive_concurrency
+            else read_int_env(ENV_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY)
+        )
+
+        worker_pool_size = read_int_env(ENV_WORKER_POOL_SIZE, DEFAULT_WORKER_POOL_SIZE)
+        if worker_pool_size < 0:
+            raise ConfigurationError(
+                f"Worker pool size must be non-negative, got {worker_pool_size}"
+            )
+
+        worker_pool_refill_rate = read_int_env(
+            ENV_WORKER_POOL_REFILL_RATE, DEFAULT_WORKER_POOL_REFILL_RATE
+        )
+        if worker_pool_refill_rate <= 0:
+            raise ConfigurationError(
+                f"Worker pool refill rate must be positive, got {worker_pool_refill_rate}"
+            )
+
+        code_cache_max_size = read_int_env(
+            ENV_CODE_CACHE_MAX_SIZE, DEFAULT_CODE_CACHE_MAX_SIZE
+        )
+        if code_cache_max_size <= 0:
+            raise ConfigurationError(
+                f"Code cache max size must be positive, got {code_cache_max_size}"
+            )
+
+        # Dropped from the environment, which the forkserver and subprocesses are
+        # started with, as they must not be able to sign entries of the code cache.
+        code_cache_secret = read_str_env(ENV_CODE_CACHE_SECRET, "")
+        os.environ.pop(ENV_CODE_CACHE_SECRET, None)
+
+        per_item_max_shards = read_int_env(
+            ENV_PER_ITEM_MAX_SHARDS, DEFAULT_PER_ITEM_MAX_SHARDS
+        )
+        if per_item_max_shards <= 0:
+            raise ConfigurationError(
+                f"Per-item max shards must be positive, got {per_item_max_shards}"
+            )
+
         return cls(
             grant_token=grant_token,
             runner_id=read_str_env(ENV_RUNNER_ID, ""),
             task_broker_uri=read_str_env(ENV_TASK_BROKER_URI, DEFAULT_TASK_BROKER_URI),
-            max_concurrency=read_int_env(ENV_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY),
+            max_concurrency=max_concurrency,
+            adaptive_concurrency=adaptive_concurrency,
             max_payload_size=max_payload_size,
             task_timeout=task_timeout,
+            task_memory_limit=task_memory_limit * 1024 * 1024,
+            task_cpu_limit=task_cpu_limit,
             auto_shutdown_timeout=auto_shutdown_timeout,
             graceful_shutdown_timeout=graceful_shutdown_timeout,
             stdlib_allow=parse_allowlist(
@@ -128,4 +239,12 @@ class TaskRunnerConfig:
             ),
             env_deny=read_bool_env(ENV_BLOCK_RUNNER_ENV_ACCESS, True),
             allow_transitive_imports=read_bool_env(ENV_ALLOW_TRANSITIVE_IMPORTS, False),
+            worker_pool_size=worker_pool_size,
+            worker_pool_refill_rate=worker_pool_refill_rate,
+            forkserver_preload=read_bool_env(ENV_FORKSERVER_PRELOAD, False),
+            stream_print_output=read_bool_env(ENV_STREAM_PRINT_OUTPUT, False),
+            code_cache_dir=read_str_env(ENV_CODE_CACHE_DIR, ""),
+            code_cache_max_size=code_cache_max_size * 1024 * 1024,
+            code_cache_secret=code_cache_secret,
+            per_item_max_shards=per_item_max_shards,
         )
@@ -27,18 +27,55 @@ RUNNER_RPC_CALL = "runner:rpc"
 TASK_TYPE_PYTHON = "python"
 RUNNER_NAME = "Python Task Runner"
 DEFAULT_MAX_CONCURRENCY = 5  # tasks
+MAX_CONCURRENCY_AUTO = "auto"  # to size task slots from cgroup limits and pressure
 DEFAULT_MAX_PAYLOAD_SIZE = 1024 * 1024 * 1024  # 1 GiB
 DEFAULT_TASK_TIMEOUT = 60  # seconds
+DEFAULT_TASK_MEMORY_LIMIT = 0  # MiB a task may allocate, 0 for no limit
+DEFAULT_TASK_CPU_LIMIT = 0  # seconds of CPU time per task, 0 for no limit
 DEFAULT_AUTO_SHUTDOWN_TIMEOUT = 0  # seconds
 DEFAULT_SHUTDOWN_TIMEOUT = 10  # seconds
-OFFER_INTERVAL = 0.25  # 250ms
-OFFER_VALIDITY = 5000  # ms
+OFFER_RETRY_INTERVAL = 0.25  # 250ms, after failing to send offers
+OFFER_VALIDITY = 5000  # ms, at least
+OFFER_VALIDITY_MAX = 30000  # ms, at most, before jitter
 OFFER_VALIDITY_MAX_JITTER = 500  # ms
-OFFER_VALIDITY_LATENCY_BUFFER = 0.1  # 100ms
+OFFER_VALIDITY_RTT_MULTIPLIER = 20  # offer validity per broker round trip
+OFFER_VALIDITY_LATENCY_BUFFER = 0.1  # 100ms, at least
+OFFER_VALIDITY_LATENCY_BUFFER_RTT_MULTIPLIER = 2  # latency buffer per round trip
 MAX_VALIDATION_CACHE_SIZE = 500  # cached validation results
+MAX_COMPILE_CACHE_SIZE = 500  # cached compiled code objects
+MAX_IMPORT_DECISION_CACHE_SIZE = 1000  # import decisions cached per subprocess
+MAX_FORMAT_TEMPLATE_CACHE_SIZE = 256  # format templates validated per subprocess
+MAX_CACHED_FORMAT_TEMPLATE_LENGTH = 4096  # chars, longer templates are not cached
+VALIDATION_POOL_SIZE = 2  # threads validating and compiling uncached code
+VALIDATION_TIMEOUT = 10  # seconds to validate and compile the code of a task
+DEFAULT_CODE_CACHE_MAX_SIZE = 64  # MiB of validation verdicts and code on disk
+CODE_CACHE_FILENAME = "code_cache.sqlite3"
+CODE_CACHE_BUSY_TIMEOUT = 1  # seconds to wait on other runners writing to it
+CODE_CACHE_EVICTION_TARGET = 0.9  # of the max size, to evict down to once full
+DEFAULT_WORKER_POOL_SIZE = 0  # pre-spawned subprocesses, 0 to disable pooling
+DEFAULT_WORKER_POOL_REFILL_RATE = 10  # subprocesses spawned per second
+DEFAULT_PER_ITEM_MAX_SHARDS = 1  # subprocesses per per-item task, 1 for no sharding
+PER_ITEM_SHARD_MIN_ITEMS = 1000  # items per shard, fewer not worth a subprocess
+FORKSERVER_PRELOAD_MODULE = "src.forkserver_preload"
+
+# Adaptive concurrency
+CGROUP_ROOT = "/sys/fs/cgroup"
+PRESSURE_DIR = "/proc/pressure"
+AUTO_CONCURRENCY_TASKS_PER_CPU = 2  # task slots per CPU
+AUTO_CONCURRENCY_MAX = 64  # task slots
+AUTO_CONCURRENCY_TASK_MEMORY = 64 * 1024 * 1024  # bytes per task, until observed
+AUTO_CONCURRENCY_MIN_TASK_MEMORY = 16 * 1024 * 1024  # bytes per task
+AUTO_CONCURRENCY_RESERVED_MEMORY = 128 * 1024 * 1024  # bytes for runner, forkserver
+AUTO_CONCURRENCY_TASK_MEMORY_DECAY = 0.9  # of the estimate per interval
+AUTO_CONCURRENCY_INTERVAL = 5  # seconds between adjustments
+AUTO_CONCURRENCY_CPU_PRESSURE_HIGH = 60.0  # % of time stalled, avg10, to shrink
+AUTO_CONCURRENCY_CPU_PRESSURE_LOW = 20.0  # % of time stalled, avg10, to grow
+AUTO_CONCURRENCY_MEMORY_PRESSURE_HIGH = 10.0  # % of time stalled, avg10, to shrink
+AUTO_CONCURRENCY_MEMORY_PRESSURE_LOW = 1.0  # % of time stalled, avg10, to grow
 
 # Executor
 EXECUTOR_USER_OUTPUT_KEY = "__n8n_internal_user_output__"
+EXECUTOR_USER_FUNCTION_NAME = "_user_function"
 EXECUTOR_CIRCULAR_REFERENCE_KEY = "__n8n_internal_circular_ref__"
 EXECUTOR_SAFE_FORMAT_KEY = "__n8n_internal_safe_format__"
 EXECUTOR_ALL_ITEMS_FILENAME = "<all_items_task_execution>"
@@ -46,10 +83,20 @@ EXECUTOR_PER_ITEM_FILENAME = "<per_item_task_execution>"
 EXECUTOR_FILENAMES = {EXECUTOR_ALL_ITEMS_FILENAME, EXECUTOR_PER_ITEM_FILENAME}
 SIGTERM_EXIT_CODE = -15
 SIGKILL_EXIT_CODE = -9
+SIGXCPU_EXIT_CODE = -24  # on exceeding the CPU time limit
+MEMORY_LIMIT_EXIT_CODE = 86  # on running out of memory under the memory limit
+CPU_LIMIT_GRACE = 1  # seconds of CPU time past SIGXCPU before SIGKILL
 PIPE_MSG_PREFIX_LENGTH = 4  # bytes
 PIPE_MSG_MAX_SIZE = (
     2 ** (PIPE_MSG_PREFIX_LENGTH * 8) - 1
 )  # bytes (~4 GiB with 4-byte prefix)
+PIPE_CHUNK_SIZE = 1024 * 1024  # bytes of result items per pipe frame
+PIPE_FRAME_RESULT_CHUNK = 1  # frame with a JSON array of result items
+PIPE_FRAME_END = 2  # frame with the closing message, i.e. print args or error
+PIPE_FRAME_PRINT = 3  # frame with the args of a `print()` call, as it happens
+SHARED_ITEMS_WRITE_BUFFER_SIZE = 1024 * 1024  # bytes
+SHARED_ITEMS_READ_BUFFER_SIZE = 64 * 1024  # bytes
+SHARED_ITEMS_BATCH_SIZE = 64 * 1024  # bytes
 
 # Broker
 DEFAULT_TASK_BROKER_URI = "http://127.0.0.1:5679"
@@ -66,12 +113,22 @@ ENV_RUNNER_ID = "N8N_RUNNERS_ID"
 ENV_MAX_CONCURRENCY = "N8N_RUNNERS_MAX_CONCURRENCY"
 ENV_MAX_PAYLOAD_SIZE = "N8N_RUNNERS_MAX_PAYLOAD"
 ENV_TASK_TIMEOUT = "N8N_RUNNERS_TASK_TIMEOUT"
+ENV_TASK_MEMORY_LIMIT = "N8N_RUNNERS_TASK_MEMORY_LIMIT"
+ENV_TASK_CPU_LIMIT = "N8N_RUNNERS_TASK_CPU_LIMIT"
 ENV_AUTO_SHUTDOWN_TIMEOUT = "N8N_RUNNERS_AUTO_SHUTDOWN_TIMEOUT"
 ENV_GRACEFUL_SHUTDOWN_TIMEOUT = "N8N_RUNNERS_GRACEFUL_SHUTDOWN_TIMEOUT"
 ENV_STDLIB_ALLOW = "N8N_RUNNERS_STDLIB_ALLOW"
 ENV_EXTERNAL_ALLOW = "N8N_RUNNERS_EXTERNAL_ALLOW"
 ENV_BUILTINS_DENY = "N8N_RUNNERS_BUILTINS_DENY"
 ENV_ALLOW_TRANSITIVE_IMPORTS = "N8N_RUNNERS_ALLOW_TRANSITIVE_IMPORTS"
+ENV_WORKER_POOL_SIZE = "N8N_RUNNERS_WORKER_POOL_SIZE"
+ENV_WORKER_POOL_REFILL_RATE = "N8N_RUNNERS_WORKER_POOL_REFILL_RATE"
+ENV_FORKSERVER_PRELOAD = "N8N_RUNNERS_FORKSERVER_PRELOAD"
+ENV_STREAM_PRINT_OUTPUT = "N8N_RUNNERS_STREAM_PRINT_OUTPUT"
+ENV_CODE_CACHE_DIR = "N8N_RUNNERS_CODE_CACHE_DIR"
+ENV_CODE_CACHE_MAX_SIZE = "N8N_RUNNERS_CODE_CACHE_MAX_SIZE"
+ENV_CODE_CACHE_SECRET = "N8N_RUNNERS_CODE_CACHE_SECRET"
+ENV_PER_ITEM_MAX_SHARDS = "N8N_RUNNERS_PER_ITEM_MAX_SHARDS"
 ENV_HEALTH_CHECK_SERVER_ENABLED = "N8N_RUNNERS_HEALTH_CHECK_SERVER_ENABLED"
 ENV_HEALTH_CHECK_SERVER_HOST = "N8N_RUNNERS_HEALTH_CHECK_SERVER_HOST"
 ENV_HEALTH_CHECK_SERVER_PORT = "N8N_RUNNERS_HEALTH_CHECK_SERVER_PORT"
@@ -87,6 +144,8 @@ ENV_SENTRY_TRACES_SAMPLE_RATE = "N8N_SENTRY_TRACES_SAMPLE_RATE"
 # Sentry
 SENTRY_TAG_SERVER_TYPE_KEY = "server_type"
 SENTRY_TAG_SERVER_TYPE_VALUE = "task_runner_python"
+SENTRY_TASK_TRANSACTION_NAME = "Python task"
+SENTRY_TASK_TRANSACTION_OP = "task"  # and `task.<phase>` for spans of its phases
 IGNORED_ERROR_TYPES = (
     ConfigurationError,
     TaskRuntimeError,
@@ -100,16 +159,40 @@ IGNORED_ERROR_TYPES = (
 # Logging
 LOG_FORMAT = "%(asctime)s.%(msecs)03d\t%(levelname)s\t%(message)s"
 LOG_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
-LOG_TASK_COMPLETE = 'Completed task {task_id} in {duration} ({result_size}) for node "{node_name}" ({node_id}) in workflow "{workflow_name}" ({workflow_id})'
+LOG_TASK_COMPLETE = 'Completed task {task_id} in {duration} ({result_size}; {usage}; {timing}) for node "{node_name}" ({node_id}) in workflow "{workflow_name}" ({workflow_id})'
+LOG_FORKSERVER_PRELOAD = "Preloaded {module_count} modules ({imported_count} with dependencies) into forkserver in {duration}, adding {memory} resident memory"
+LOG_FORKSERVER_PRELOAD_FAILED = "Failed to preload modules into forkserver: {modules}"
+LOG_CONCURRENCY_INITIAL = (
+    "Sized concurrency to {limit} task slots for {cpus} CPUs and {memory} memory"
+)
+LOG_CONCURRENCY_CHANGE = (
+    "Changed concurrency from {old_limit} to {limit} task slots: {reason}"
+)
 LOG_TASK_CANCEL = 'Cancelled task {task_id} for node "{node_name}" ({node_id}) in workflow "{workflow_name}" ({workflow_id})'
 LOG_TASK_CANCEL_UNKNOWN = (
     "Received cancel for unknown task: {task_id}. Discarding message."
 )
 LOG_TASK_CANCEL_WAITING = "Cancelled task {task_id} (waiting for settings)"
+LOG_CODE_CACHE_DISABLED = "Disabled code cache on disk: {error}"
+LOG_CODE_CACHE_INVALID_ENTRY = (
+    "Discarded invalid entry {key} of code cache on disk: {error}"
+)
 LOG_SENTRY_MISSING = "Sentry is enabled but sentry-sdk is not installed. Install with: uv sync --all-extras"
 
 # RPC
 RPC_BROWSER_CONSOLE_LOG_METHOD = "logNodeOutput"
+RPC_BROWSER_CONSOLE_LOG_BATCH_METHOD = "logNodeOutputBatch"
+RPC_BROWSER_CONSOLE_LOG_BATCH_SIZE = 25  # print calls per RPC
+
+# Capabilities, offered by the broker in its info request and accepted by the
+# runner in its info, in order of preference
+CAPABILITY_CONSOLE_LOG_IN_TASK_DONE = "consoleLogInTaskDone"
+CAPABILITY_CONSOLE_LOG_BATCH = "consoleLogBatch"
+RUNNER_CAPABILITIES = [
+    CAPABILITY_CONSOLE_LOG_IN_TASK_DONE,
+    CAPABILITY_CONSOLE_LOG_BATCH,
+]
+TASK_DONE_CONSOLE_LOGS_KEY = "consoleLogs"
 
 # Rejection reasons
 TASK_REJECTED_REASON_OFFER_EXPIRED = (
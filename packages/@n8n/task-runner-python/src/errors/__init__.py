@@ -1,3 +1,4 @@
+from .code_validation_timeout_error import CodeValidationTimeoutError
 from .configuration_error import ConfigurationError
 from .invalid_pipe_msg_content_error import InvalidPipeMsgContentError
 from .invalid_pipe_msg_length_error import InvalidPipeMsgLengthError
@@ -8,12 +9,15 @@ from .task_killed_error import TaskKilledError
 from .task_missing_error import TaskMissingError
 from .task_result_missing_error import TaskResultMissingError
 from .task_result_read_error import TaskResultReadError
+from .task_result_too_large_error import TaskResultTooLargeError
+from .task_resource_limit_error import TaskResourceLimitError
 from .task_subprocess_failed_error import TaskSubprocessFailedError
 from .task_runtime_error import TaskRuntimeError
 from .task_timeout_error import TaskTimeoutError
 from .websocket_connection_error import WebsocketConnectionError
 
 __all__ = [
+    "CodeValidationTimeoutError",
     "ConfigurationError",
     "InvalidPipeMsgContentError",
     "InvalidPipeMsgLengthError",
@@ -25,6 +29,8 @@ __all__ = [
     "TaskSubprocessFailedError",
     "TaskResultMissingError",
     "TaskResultReadError",
+    "TaskResultTooLargeError",
+    "TaskResourceLimitError",
     "TaskRuntimeError",
     "TaskTimeoutError",
     "WebsocketConnectionError",
@@ -0,0 +1,8 @@
+class CodeValidationTimeoutError(Exception):
+    def __init__(self, validation_timeout: int):
+        """Raised when validating and compiling the code of a task takes longer
+        than the timeout limit."""
+
+        message = f"Code validation timed out after {validation_timeout} {'second' if validation_timeout == 1 else 'seconds'}"
+        super().__init__(message)
+        self.validation_timeout = validation_timeout
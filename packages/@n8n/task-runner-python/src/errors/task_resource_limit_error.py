@@ -0,0 +1,14 @@
+class TaskResourceLimitError(Exception):
+    """Raised when a task subprocess exceeds its memory or CPU time limit.
+
+    Unlike `TaskKilledError`, the limit is one configured for the task, so the
+    task itself is known to be at fault rather than the host running out.
+    """
+
+    def __init__(self, resource: str, env_var: str):
+        super().__init__(f"Task exceeded its {resource} limit")
+        self.resource = resource
+        self.description = (
+            f"Reduce the {resource} the code uses, e.g. by processing fewer items "
+            f"at once, or raise the limit with {env_var}."
+        )
@@ -0,0 +1,7 @@
+class TaskResultTooLargeError(Exception):
+    def __init__(self, size: int, max_size: int):
+        super().__init__(
+            f"Task result of {size} bytes exceeds the maximum payload size of {max_size} bytes"
+        )
+        self.size = size
+        self.max_size = max_size
@@ -0,0 +1,37 @@
+"""Preloads the allowlisted modules into the forkserver.
+
+Imported by the forkserver on startup, by name, when preloading is enabled, and
+never by the runner itself. See `TaskExecutor.preload_forkserver`.
+"""
+
+import os
+
+from src.config.security_config import SecurityConfig
+from src.config.task_runner_config import parse_allowlist
+from src.constants import (
+    ENV_ALLOW_TRANSITIVE_IMPORTS,
+    ENV_BLOCK_RUNNER_ENV_ACCESS,
+    ENV_EXTERNAL_ALLOW,
+    ENV_STDLIB_ALLOW,
+)
+from src.env import read_bool_env, read_str_env
+from src.task_executor import TaskExecutor
+
+# The forkserver only receives the names of modules to preload, so the allowlists
+# are read from the same environment the runner reads its own config from.
+_security_config = SecurityConfig(
+    stdlib_allow=parse_allowlist(read_str_env(ENV_STDLIB_ALLOW, ""), ENV_STDLIB_ALLOW),
+    external_allow=parse_allowlist(
+        read_str_env(ENV_EXTERNAL_ALLOW, ""), ENV_EXTERNAL_ALLOW
+    ),
+    builtins_deny=set(),
+    runner_env_deny=read_bool_env(ENV_BLOCK_RUNNER_ENV_ACCESS, True),
+    allow_transitive_imports=read_bool_env(ENV_ALLOW_TRANSITIVE_IMPORTS, False),
+)
+
+# Subprocesses would clear the environment before importing anything, so keep it
+# out of reach of whatever preloaded modules capture at import time.
+if _security_config.runner_env_deny:
+    os.environ.clear()
+
+report, imported_modules = TaskExecutor.preload_modules(_security_config)
@@ -1,10 +1,17 @@
+import ast
 import re
 import string
 from typing import Iterator
 
-from src.constants import BLOCKED_ATTRIBUTES, BLOCKED_NAMES
+from src.constants import (
+    BLOCKED_ATTRIBUTES,
+    BLOCKED_NAMES,
+    EXECUTOR_SAFE_FORMAT_KEY,
+    FORMAT_METHOD_NAMES,
+)
 
 _FORMATTER = string.Formatter()
+_LITERAL_TEMPLATE_METHODS = frozenset({"format", "format_map"})
 _FIELD_ATTR_PATTERN = re.compile(r"\.(\w+)")
 _FIELD_SUBSCRIPT_PATTERN = re.compile(r"\[(['\"]?)(\w+)\1\]")
 
@@ -29,3 +36,40 @@ def find_blocked_format_tokens(template: str) -> Iterator[str]:
 
         if format_spec:
             yield from find_blocked_format_tokens(format_spec)
+
+
+def is_format_call(node: ast.Call) -> bool:
+    return (
+        isinstance(node.func, ast.Attribute) and node.func.attr in FORMAT_METHOD_NAMES
+    )
+
+
+def is_safe_literal_format_call(node: ast.Call) -> bool:
+    """Whether a format call is on a string literal free of blocked tokens, e.g.
+    `"{:.2f}".format(x)`, whose template is then known to be safe at compile
+    time, as the template of `str.format` is the string itself."""
+
+    return (
+        isinstance(node.func, ast.Attribute)
+        and node.func.attr in _LITERAL_TEMPLATE_METHODS
+        and isinstance(node.func.value, ast.Constant)
+        and type(node.func.value.value) is str
+        and next(find_blocked_format_tokens(node.func.value.value), None) is None
+    )
+
+
+def guard_format_call(node: ast.Call) -> None:
+    """Rewrite `receiver.format(*args)` in place into
+    `__n8n_internal_safe_format__("format", receiver, *args)`, so that the
+    template is validated at runtime before formatting. Calls on a safe string
+    literal are left as is, having been validated here instead."""
+
+    assert isinstance(node.func, ast.Attribute)
+    if is_safe_literal_format_call(node):
+        return
+
+    method_name = ast.copy_location(ast.Constant(value=node.func.attr), node.func)
+    node.args = [method_name, node.func.value, *node.args]
+    node.func = ast.copy_location(
+        ast.Name(id=EXECUTOR_SAFE_FORMAT_KEY, ctx=ast.Load()), node.func
+    )
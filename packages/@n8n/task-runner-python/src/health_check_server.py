@@ -3,10 +3,14 @@ import errno
 import logging
 
 from src.config.health_check_config import HealthCheckConfig
+from src.metrics import render_metrics
 
 HEALTH_CHECK_RESPONSE = (
     b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 2\r\n\r\nOK"
 )
+METRICS_PATH = "/metrics"
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+REQUEST_TIMEOUT = 5  # seconds to receive the request head
 
 
 class HealthCheckServer:
@@ -38,13 +42,44 @@ class HealthCheckServer:
             self.logger.info("Health check server stopped")
 
     async def _handle_request(
-        self, _reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
     ) -> None:
         try:
-            writer.write(HEALTH_CHECK_RESPONSE)
+            async with asyncio.timeout(REQUEST_TIMEOUT):
+                path = await self._read_request_path(reader)
+
+            if path == METRICS_PATH:
+                writer.write(self._get_metrics_response())
+            else:
+                writer.write(HEALTH_CHECK_RESPONSE)
             await writer.drain()
         except Exception:
             pass
         finally:
             writer.close()
             await writer.wait_closed()
+
+    @staticmethod
+    async def _read_request_path(reader: asyncio.StreamReader) -> str:
+        # Reads the whole request head, as closing the connection with some of it
+        # unread would reset the connection before the client reads the response.
+        request_line = await reader.readline()
+        while (await reader.readline()).strip():
+            pass
+
+        parts = request_line.decode("latin-1").split()
+        if len(parts) < 2:
+            return "/"
+        return parts[1].split("?", 1)[0]
+
+    @staticmethod
+    def _get_metrics_response() -> bytes:
+        # rendered in memory from values recorded as they change, so a scrape
+        # never waits on the runner
+        body = render_metrics().encode("utf-8")
+        head = (
+            "HTTP/1.1 200 OK\r\n"
+            f"Content-Type: {METRICS_CONTENT_TYPE}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        )
+        return head.encode("latin-1") + body
@@ -0,0 +1,135 @@
+"""JSON encoding and decoding through the fastest backend installed.
+
+Encodes with orjson and decodes with msgspec, or else orjson, falling back to
+stdlib `json`, which is the reference: every backend produces the same bytes
+when encoding and the same values when decoding. A fast backend hands over to
+stdlib `json` whenever its output could differ.
+
+Encoding matches `json.dumps(value, default=str, ensure_ascii=False)`. orjson
+only writes compact separators, so it is used for scalars alone, which are
+encoded the same either way.
+
+`json_array_length` checks that data is exactly one well-formed JSON array,
+without building its elements where the backend allows, to pass it on as is.
+"""
+
+import json
+import re
+from typing import Any
+
+try:
+    import orjson
+
+    ORJSON_INSTALLED = True
+except ImportError:
+    ORJSON_INSTALLED = False
+
+try:
+    import msgspec
+
+    MSGSPEC_INSTALLED = True
+except ImportError:
+    MSGSPEC_INSTALLED = False
+
+
+_stdlib_encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+
+
+def _dumps_stdlib(value: Any) -> bytes:
+    return _stdlib_encoder.encode(value).encode("utf-8")
+
+
+def _loads_stdlib(data: str | bytes) -> Any:
+    return json.loads(data)
+
+
+def _array_length_stdlib(data: bytes) -> int:
+    value = json.loads(data)
+    if not isinstance(value, list):
+        raise ValueError(f"Expected a JSON array, got {type(value).__name__}")
+    return len(value)
+
+
+if ORJSON_INSTALLED:
+    # Exact types only, as stdlib `json` encodes e.g. enum members through their
+    # `int` or `str` base. orjson fails on integers past 64 bits and lone surrogates.
+    _ORJSON_TYPES = frozenset({str, int, bool, type(None)})
+
+    # orjson reads integers past 64 bits as floats
+    _LONG_INTEGER_BYTES = re.compile(rb"[0-9]{19}")
+    _LONG_INTEGER_STR = re.compile(r"[0-9]{19}")
+
+    def _dumps_orjson(value: Any) -> bytes:
+        if type(value) not in _ORJSON_TYPES:
+            return _dumps_stdlib(value)
+
+        try:
+            return orjson.dumps(value)
+        except orjson.JSONEncodeError:
+            return _dumps_stdlib(value)
+
+    def _array_length_orjson(data: bytes) -> int:
+        try:
+            value = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # NaN and Infinity tokens, lone surrogates, floats out of range
+            return _array_length_stdlib(data)
+        if not isinstance(value, list):
+            raise ValueError(f"Expected a JSON array, got {type(value).__name__}")
+        return len(value)
+
+    def _loads_orjson(data: str | bytes) -> Any:
+        if isinstance(data, str):
+            has_long_integer = _LONG_INTEGER_STR.search(data) is not None
+        else:
+            has_long_integer = _LONG_INTEGER_BYTES.search(data) is not None
+        if has_long_integer:
+            return _loads_stdlib(data)
+
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # NaN and Infinity tokens, lone surrogates, floats out of range
+            return _loads_stdlib(data)
+
+
+if MSGSPEC_INSTALLED:
+    _msgspec_decoder = msgspec.json.Decoder()
+    # skips over each element without building it, checking its syntax only
+    _msgspec_array_decoder = msgspec.json.Decoder(list[msgspec.Raw])
+
+    def _array_length_msgspec(data: bytes) -> int:
+        data.decode("utf-8")  # not checked when skipping over strings
+        try:
+            return len(_msgspec_array_decoder.decode(data))
+        except msgspec.DecodeError:
+            # NaN and Infinity tokens, lone surrogates, floats out of range
+            return _array_length_stdlib(data)
+
+    def _loads_msgspec(data: str | bytes) -> Any:
+        try:
+            return _msgspec_decoder.decode(data)
+        except msgspec.DecodeError:
+            # NaN and Infinity tokens, lone surrogates, floats out of range
+            return _loads_stdlib(data)
+
+
+if ORJSON_INSTALLED:
+    ENCODER = "orjson"
+    json_dumps = _dumps_orjson
+else:
+    ENCODER = "json"
+    json_dumps = _dumps_stdlib
+
+if MSGSPEC_INSTALLED:
+    DECODER = "msgspec"
+    json_loads = _loads_msgspec
+    json_array_length = _array_length_msgspec
+elif ORJSON_INSTALLED:
+    DECODER = "orjson"
+    json_loads = _loads_orjson
+    json_array_length = _array_length_orjson
+else:
+    DECODER = "json"
+    json_loads = _loads_stdlib
+    json_array_length = _array_length_stdlib
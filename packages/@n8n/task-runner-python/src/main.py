@@ -49,6 +49,8 @@ async def main():
         sys.exit(1)
 
     task_runner = TaskRunner(task_runner_config)
+    if sentry and sentry.is_tracing_enabled:
+        task_runner.on_task_timing = sentry.record_task_timing
     logger.info("Starting runner...")
 
     shutdown = Shutdown(task_runner, health_check_server, sentry)
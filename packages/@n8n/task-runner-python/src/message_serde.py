@@ -1,6 +1,6 @@
 import json
-from dataclasses import asdict
-from typing import cast
+from dataclasses import fields
+from typing import Any, Callable, Iterator, cast, get_args
 
 from src.message_types.broker import NodeMode, TaskSettings
 from src.constants import (
@@ -22,7 +22,10 @@ from src.message_types import (
     BrokerTaskCancel,
     BrokerRpcResponse,
     BrokerDrain,
+    RunnerTaskDone,
 )
+from src.json_codec import json_loads
+from src.result_spool import ResultSpool
 
 
 NODE_MODE_MAP = {
@@ -31,6 +34,11 @@ NODE_MODE_MAP = {
 }
 
 
+def _snake_to_camel_case(snake_case_str: str) -> str:
+    parts = snake_case_str.split("_")
+    return parts[0] + "".join(word.capitalize() for word in parts[1:])
+
+
 def _get_node_mode(node_mode_str: str) -> NodeMode:
     if node_mode_str not in NODE_MODE_MAP:
         raise ValueError(f"Unknown nodeMode: {node_mode_str}")
@@ -72,6 +80,14 @@ def _parse_task_settings(d: dict) -> BrokerTaskSettings:
     )
 
 
+def _parse_info_request(d: dict) -> BrokerInfoRequest:
+    capabilities = d.get("capabilities", [])
+    if not isinstance(capabilities, list):
+        raise ValueError("Capabilities in info request message must be a list")
+
+    return BrokerInfoRequest(capabilities=capabilities)
+
+
 def _parse_task_offer_accept(d: dict) -> BrokerTaskOfferAccept:
     try:
         task_id = d["taskId"]
@@ -104,7 +120,7 @@ def _parse_rpc_response(d: dict) -> BrokerRpcResponse:
 
 
 MESSAGE_TYPE_MAP = {
-    BROKER_INFO_REQUEST: lambda _: BrokerInfoRequest(),
+    BROKER_INFO_REQUEST: _parse_info_request,
     BROKER_RUNNER_REGISTERED: lambda _: BrokerRunnerRegistered(),
     BROKER_TASK_OFFER_ACCEPT: _parse_task_offer_accept,
     BROKER_TASK_SETTINGS: _parse_task_settings,
@@ -114,12 +130,34 @@ MESSAGE_TYPE_MAP = {
 }
 
 
+def _build_runner_message_encoder(
+    message_class: type[RunnerMessage],
+) -> Callable[[RunnerMessage], dict[str, Any]]:
+    # Fields are taken as they are rather than deep-copied like `asdict` would,
+    # as the dict is only serialized, and keys are converted to camel case once.
+    keys = tuple(
+        (field.name, _snake_to_camel_case(field.name))
+        for field in fields(message_class)
+    )
+
+    def encode(message: RunnerMessage) -> dict[str, Any]:
+        return {camel_key: getattr(message, key) for key, camel_key in keys}
+
+    return encode
+
+
+RUNNER_MESSAGE_ENCODERS = {
+    message_class: _build_runner_message_encoder(message_class)
+    for message_class in get_args(RunnerMessage)
+}
+
+
 class MessageSerde:
     """Responsible for deserializing incoming messages and serializing outgoing messages."""
 
     @staticmethod
     def deserialize_broker_message(data: str) -> BrokerMessage:
-        message_dict = json.loads(data)
+        message_dict = json_loads(data)
         message_type = message_dict.get("type")
 
         if message_type not in MESSAGE_TYPE_MAP:
@@ -129,13 +167,19 @@ class MessageSerde:
 
     @staticmethod
     def serialize_runner_message(message: RunnerMessage) -> str:
-        data = asdict(message)
-        camel_case_data = {
-            MessageSerde._snake_to_camel_case(k): v for k, v in data.items()
-        }
-        return json.dumps(camel_case_data)
+        encode = RUNNER_MESSAGE_ENCODERS[type(message)]
+        return json.dumps(encode(message))
 
     @staticmethod
-    def _snake_to_camel_case(snake_case_str: str) -> str:
-        parts = snake_case_str.split("_")
-        return parts[0] + "".join(word.capitalize() for word in parts[1:])
+    def serialize_task_done(message: RunnerTaskDone) -> Iterator[str]:
+        """Serialize a task done message in fragments, streaming the result from
+        its spool instead of holding it in memory whole."""
+
+        result = cast(ResultSpool, message.data["result"])
+        yield f'{{"taskId": {json.dumps(message.task_id)}, "data": {{'
+        for key, value in message.data.items():
+            if key != "result":
+                yield f"{json.dumps({key: value})[1:-1]}, "
+        yield '"result": '
+        yield from result.iter_json()
+        yield f'}}, "type": {json.dumps(message.type)}}}'
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Literal, Any
 
 from src.constants import (
@@ -14,6 +14,7 @@ from src.constants import (
 
 @dataclass
 class BrokerInfoRequest:
+    capabilities: list[str] = field(default_factory=list)
     type: Literal["broker:inforequest"] = BROKER_INFO_REQUEST
 
 
@@ -1,6 +1,5 @@
-from typing import Any, TypedDict
+from typing import Any, NotRequired, TypedDict
 
-from src.message_types.broker import Items
 
 PrintArgs = list[list[Any]]  # Args to all `print()` calls in a Python code task
 
@@ -12,9 +11,29 @@ class TaskErrorInfo(TypedDict):
     stderr: str
 
 
+class TaskUsage(TypedDict):
+    user_cpu: float  # seconds
+    system_cpu: float  # seconds
+    max_rss: int  # bytes
+    voluntary_switches: int  # context switches, on waiting for a resource
+    involuntary_switches: int  # context switches, on being preempted
+
+
+class TaskTimestamps(TypedDict):
+    # on the monotonic clock, which processes on the same host share
+    started: float  # task received by the subprocess
+    code_started: float  # sandbox ready, user code about to run
+    code_finished: float
+    finished: float  # result serialized and written, but for the closing message
+
+
 class PipeResultMessage(TypedDict):
-    result: Items
+    # Only for a result that is not a list of items, which is sent whole.
+    # Items are otherwise sent in chunks ahead of this message.
+    result: NotRequired[Any]
     print_args: PrintArgs
+    usage: NotRequired[TaskUsage]  # of the subprocess, on finishing the task
+    timestamps: NotRequired[TaskTimestamps]
 
 
 class PipeErrorMessage(TypedDict):
@@ -23,3 +42,11 @@ class PipeErrorMessage(TypedDict):
 
 
 PipeMessage = PipeResultMessage | PipeErrorMessage
+
+
+class PreloadReport(TypedDict):
+    modules: list[str]  # allowlisted modules preloaded
+    failed: list[str]  # allowlisted modules that failed to preload
+    imported_count: int  # modules imported, including dependencies
+    duration: float  # seconds
+    memory_bytes: int | None  # resident memory added, if measurable
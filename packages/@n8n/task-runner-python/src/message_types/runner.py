@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Literal, Any
 
 from src.constants import (
@@ -16,6 +16,7 @@ from src.constants import (
 class RunnerInfo:
     name: str
     types: list[str]
+    capabilities: list[str] = field(default_factory=list)
     type: Literal["runner:info"] = RUNNER_INFO
 
 
@@ -0,0 +1,270 @@
+"""Runner metrics, served in the Prometheus text format at `/metrics` by the
+health check server.
+
+Metrics are module-level, as in `prometheus_client`, so that any component can
+record to them without being handed a registry. Recording takes a lock, as
+subprocesses are spawned from threads too, and is cheap enough to do inline.
+Gauges of state held elsewhere, e.g. running tasks, read it through a function
+on rendering instead of being kept in sync.
+"""
+
+import math
+import threading
+from typing import Callable
+
+LabelValues = tuple[str, ...]
+
+DURATION_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+)  # seconds
+SIZE_BUCKETS = tuple(1024 * 4**i for i in range(11))  # bytes, 1 KiB to 1 GiB
+SPAWN_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)  # seconds
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, **extra: str) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _label_values(self, labels: dict[str, str]) -> LabelValues:
+        if labels.keys() != set(self.label_names):
+            raise ValueError(
+                f"Metric {self.name} takes labels {self.label_names}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, label_names: tuple[str, ...] = ()):
+        super().__init__(name, help, label_names)
+        self.values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(self._label_values(labels), 0)
+
+    def render(self) -> list[str]:
+        with self.lock:
+            values = list(self.values.items())
+        return super().render() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.value = 0.0
+        self.function: Callable[[], float] | None = None
+
+    def inc(self, amount: float = 1) -> None:
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self.lock:
+            self.value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value through `function` on rendering."""
+
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function else self.value
+
+    def render(self) -> list[str]:
+        return super().render() + [f"{self.name} {_format_value(self.get())}"]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: tuple[float, ...],
+        label_names: tuple[str, ...] = (),
+    ):
+        super().__init__(name, help, label_names)
+        self.buckets = buckets
+        # per label values, counts per bucket, each not cumulative, then the sum
+        self.values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        index = next(
+            (i for i, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets),
+        )
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            counts, total = self.values[key]
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> list[str]:
+        with self.lock:
+            values = [
+                (key, list(counts), total[0])
+                for key, (counts, total) in self.values.items()
+            ]
+
+        lines = super().render()
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, le=_format_value(bound))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+_REGISTRY: list[_Metric] = []
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ========== Tasks ==========
+
+TASK_DURATION = Histogram(
+    "n8n_runner_task_duration_seconds",
+    "Time from receiving the settings of a task to finishing it, by outcome.",
+    DURATION_BUCKETS,
+    ("outcome",),
+)
+TASK_PHASE_DURATION = Histogram(
+    "n8n_runner_task_phase_duration_seconds",
+    "Time spent in each phase of running a task.",
+    DURATION_BUCKETS,
+    ("phase",),
+)
+TASK_INPUT_SIZE = Histogram(
+    "n8n_runner_task_input_size_bytes",
+    "Size of the input items of a task, as passed to its subprocess.",
+    SIZE_BUCKETS,
+)
+TASK_RESULT_SIZE = Histogram(
+    "n8n_runner_task_result_size_bytes",
+    "Size of the result of a task, as sent to the broker.",
+    SIZE_BUCKETS,
+)
+SUBPROCESS_SPAWN_DURATION = Histogram(
+    "n8n_runner_subprocess_spawn_seconds",
+    "Time to start a subprocess, for a task or ahead of time for the worker pool.",
+    SPAWN_BUCKETS,
+    ("source",),
+)
+RUNNING_TASKS = Gauge("n8n_runner_running_tasks", "Tasks accepted and not finished.")
+TASK_SLOTS = Gauge("n8n_runner_task_slots", "Tasks the runner takes at once.")
+OPEN_OFFERS = Gauge(
+    "n8n_runner_open_offers", "Offers sent to the broker and not accepted or expired."
+)
+TASKS_ACCEPTED = Counter("n8n_runner_tasks_accepted_total", "Tasks accepted.")
+TASKS_REJECTED = Counter(
+    "n8n_runner_tasks_rejected_total", "Tasks rejected, by reason.", ("reason",)
+)
+
+# ========== Broker connection ==========
+
+WEBSOCKET_SEND_QUEUE_DEPTH = Gauge(
+    "n8n_runner_websocket_send_queue_depth",
+    "Messages waiting to be sent to the broker.",
+)
+WEBSOCKET_WRITE_BUFFER_SIZE = Gauge(
+    "n8n_runner_websocket_write_buffer_bytes",
+    "Bytes written to the broker connection and not yet sent.",
+)
+
+# ========== Validation and compilation ==========
+
+VALIDATION_CACHE_LOOKUPS = Counter(
+    "n8n_runner_validation_cache_lookups_total",
+    "Lookups of code validation results, by whether they were cached.",
+    ("result",),
+)
+VALIDATION_CACHE_HIT_RATIO = Gauge(
+    "n8n_runner_validation_cache_hit_ratio",
+    "Share of code validation results found cached since the runner started.",
+)
+
+
+def _get_validation_cache_hit_ratio() -> float:
+    hits = VALIDATION_CACHE_LOOKUPS.get(result="hit")
+    lookups = hits + VALIDATION_CACHE_LOOKUPS.get(result="miss")
+    return hits / lookups if lookups else 0.0
+
+
+VALIDATION_CACHE_HIT_RATIO.set_function(_get_validation_cache_hit_ratio)
+
+COMPILE_CACHE_LOOKUPS = Counter(
+    "n8n_runner_compile_cache_lookups_total",
+    "Lookups of compiled code, by whether it was cached.",
+    ("result",),
+)
+CODE_CACHE_LOOKUPS = Counter(
+    "n8n_runner_code_cache_lookups_total",
+    "Lookups in the code cache on disk, of validation results or compiled code, "
+    "by whether they were cached.",
+    ("cache", "result"),
+)
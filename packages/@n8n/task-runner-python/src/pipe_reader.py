@@ -1,64 +1,156 @@
-import json
-import os
-import threading
-from typing import cast
+import asyncio
+from typing import Awaitable, Callable, cast
 
 from multiprocessing.connection import Connection
 
 from src.errors import (
     InvalidPipeMsgContentError,
     InvalidPipeMsgLengthError,
+    TaskResultTooLargeError,
+)
+from src.json_codec import json_array_length, json_loads
+from src.message_types.pipe import PipeMessage, PrintArgs
+from src.result_spool import ResultSpool
+from src.constants import (
+    PIPE_CHUNK_SIZE,
+    PIPE_FRAME_END,
+    PIPE_FRAME_PRINT,
+    PIPE_FRAME_RESULT_CHUNK,
+    PIPE_MSG_PREFIX_LENGTH,
 )
-from src.message_types.pipe import PipeMessage
-from src.constants import PIPE_MSG_PREFIX_LENGTH
 
 type PipeConnection = Connection
 
 
-class PipeReader(threading.Thread):
-    """Background thread that reads result from pipe."""
+class PipeReader:
+    """Reads result from pipe on the event loop, without holding a thread.
+
+    The result arrives as a sequence of frames, each a length prefix and a frame
+    type followed by the payload: any number of chunks of result items, then a
+    closing message with the print args or the error. Chunks are spooled as they
+    arrive, so a result is never held in memory whole.
 
-    def __init__(self, read_fd: int, read_conn: PipeConnection):
-        super().__init__()
-        self.read_fd = read_fd
+    A subprocess streaming its print output also sends the args of each `print()`
+    call as a frame, before any chunk. These are passed to `on_print` as they
+    arrive, else collected. Reading waits on `on_print`, so that the subprocess is
+    held up once the pipe is full.
+    """
+
+    def __init__(
+        self,
+        read_conn: PipeConnection,
+        max_result_size: int | None = None,
+        on_print: Callable[[list[str]], Awaitable[None]] | None = None,
+    ):
         self.read_conn = read_conn
+        self.max_result_size = max_result_size  # bytes
+        self.on_print = on_print
+        self.print_args: PrintArgs = []  # streamed, when not passed to `on_print`
         self.pipe_message: PipeMessage | None = None
-        self.message_size: int | None = None  # bytes
+        self.result: ResultSpool | None = None
         self.error: Exception | None = None
 
-    def run(self):
+    async def read(self) -> None:
+        """Read until the closing message, then close the connection. Sets
+        `pipe_message` and `result`, or `error` if reading failed."""
+
+        result = ResultSpool()
+        result_size = 0  # bytes, including any past the limit
+        transport: asyncio.ReadTransport | None = None
+
         try:
-            length_bytes = PipeReader._read_exact_bytes(
-                self.read_fd, PIPE_MSG_PREFIX_LENGTH
-            )
-            length_int = int.from_bytes(length_bytes, "big")
-            if length_int <= 0:
-                raise InvalidPipeMsgLengthError(length_int)
-            self.message_size = length_int
-            data = PipeReader._read_exact_bytes(self.read_fd, length_int)
-            parsed_msg = json.loads(data.decode("utf-8"))
-            self.pipe_message = self._validate_pipe_message(parsed_msg)
+            stream, transport = await self._open_stream()
+
+            while True:
+                frame_type, data = await self._read_frame(stream)
+
+                if frame_type == PIPE_FRAME_PRINT:
+                    await self._handle_print(data)
+                    continue
+
+                if frame_type == PIPE_FRAME_RESULT_CHUNK:
+                    self._validate_result_chunk(data)
+                    result_size += len(data) - 2  # brackets
+                    if self._exceeds_max_result_size(result_size):
+                        # keep draining so that the subprocess can finish writing
+                        result.close()
+                        continue
+                    result.append(data[1:-1])
+                    continue
+
+                if frame_type != PIPE_FRAME_END:
+                    raise InvalidPipeMsgContentError(f"Unknown frame type {frame_type}")
+
+                parsed_msg = json_loads(data)
+                self.pipe_message = self._validate_pipe_message(parsed_msg)
+                break
+
+            if "error" not in self.pipe_message:
+                if self._exceeds_max_result_size(result_size):
+                    assert self.max_result_size is not None
+                    raise TaskResultTooLargeError(result_size, self.max_result_size)
+
+                if "result" in self.pipe_message:
+                    result.close()
+                    result = ResultSpool.from_value(self.pipe_message["result"])
+
+                self.result = result
         except Exception as e:
             self.error = e
         finally:
-            self.read_conn.close()
+            if self.result is None:
+                result.close()
+            if transport is None:
+                self.read_conn.close()
+            else:
+                transport.close()  # closes the connection
+
+    async def _open_stream(
+        self,
+    ) -> tuple[asyncio.StreamReader, asyncio.ReadTransport]:
+        # buffers up to about one chunk ahead before pausing reads from the pipe
+        stream = asyncio.StreamReader(limit=PIPE_CHUNK_SIZE)
+        transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(stream), self.read_conn
+        )
+        return stream, transport
 
     @staticmethod
-    def _read_exact_bytes(fd: int, n: int) -> bytes:
-        """Read exactly n bytes from file descriptor.
-
-        Uses os.read() instead of Connection.recv() because recv() pickles.
-        Preallocates bytearray to avoid repeated reallocation.
-        """
-        result = bytearray(n)
-        offset = 0
-        while offset < n:
-            chunk = os.read(fd, n - offset)
-            if not chunk:
-                raise EOFError("Pipe closed before reading all data")
-            result[offset : offset + len(chunk)] = chunk
-            offset += len(chunk)
-        return bytes(result)
+    async def _read_frame(stream: asyncio.StreamReader) -> tuple[int, bytes]:
+        header = await stream.readexactly(PIPE_MSG_PREFIX_LENGTH + 1)
+        length_int = int.from_bytes(header[:PIPE_MSG_PREFIX_LENGTH], "big")
+        if length_int <= 0:
+            raise InvalidPipeMsgLengthError(length_int)
+        data = await stream.readexactly(length_int)
+        return header[PIPE_MSG_PREFIX_LENGTH], data
+
+    async def _handle_print(self, data: bytes) -> None:
+        args = json_loads(data)
+        if not isinstance(args, list) or not all(isinstance(a, str) for a in args):
+            raise InvalidPipeMsgContentError("Print args must be a list of strings")
+
+        if self.on_print is None:
+            self.print_args.append(args)
+        else:
+            await self.on_print(args)
+
+    def _exceeds_max_result_size(self, size: int) -> bool:
+        return self.max_result_size is not None and size > self.max_result_size
+
+    @staticmethod
+    def _validate_result_chunk(data: bytes) -> None:
+        # Chunks are forwarded to the broker as they are, so each must be exactly
+        # a JSON array, with nothing around it that could break out of the result.
+        # Only its structure is checked, as its items are never read here.
+        try:
+            item_count = json_array_length(data)
+        except ValueError:
+            item_count = 0
+
+        if item_count == 0 or data[:1] != b"[" or data[-1:] != b"]":
+            raise InvalidPipeMsgContentError(
+                "Result chunk must be a non-empty JSON array"
+            )
 
     def _validate_pipe_message(self, msg) -> PipeMessage:
         if not isinstance(msg, dict):
@@ -70,16 +162,10 @@ class PipeReader(threading.Thread):
         if not isinstance(msg["print_args"], list):
             raise InvalidPipeMsgContentError("'print_args' must be a list")
 
-        has_result = "result" in msg
-        has_error = "error" in msg
-
-        if not has_result and not has_error:
-            raise InvalidPipeMsgContentError("Msg is missing 'result' or 'error' key")
-
-        if has_result and has_error:
+        if "result" in msg and "error" in msg:
             raise InvalidPipeMsgContentError("Msg has both 'result' and 'error' keys")
 
-        if has_error and not isinstance(msg["error"], dict):
+        if "error" in msg and not isinstance(msg["error"], dict):
             raise InvalidPipeMsgContentError("'error' must be a dict")
 
         return cast(PipeMessage, msg)
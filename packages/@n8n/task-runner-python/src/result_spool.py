@@ -0,0 +1,78 @@
+import json
+import tempfile
+from collections.abc import Iterator
+from typing import Any, Self
+
+from src.constants import PIPE_CHUNK_SIZE
+from src.json_codec import json_loads
+
+
+class ResultSpool:
+    """Result of a task as received from its subprocess, in chunks of serialized
+    items. Spills to disk past one chunk, so that the runner holds at most about
+    one chunk of a result in memory, however large the result is.
+
+    Whoever holds the spool must close it, or use it as a context manager, to
+    remove its file. Closing it again is harmless."""
+
+    def __init__(self, is_array: bool = True):
+        # When set, chunks are JSON arrays stripped of their brackets, to be
+        # joined into a single array. Otherwise holds a single JSON value.
+        self.is_array = is_array
+        # outlives this call, closed along with the spool
+        self.file = tempfile.SpooledTemporaryFile(max_size=PIPE_CHUNK_SIZE)  # noqa: SIM115
+        self.chunk_sizes: list[int] = []
+        self.size = 0  # bytes
+
+    @classmethod
+    def from_value(cls, value: Any) -> "ResultSpool":
+        """Spool a result that is already held in memory whole."""
+
+        spool = cls(is_array=False)
+        spool.append(json.dumps(value).encode("utf-8"))
+        return spool
+
+    def append(self, chunk: bytes) -> None:
+        self.file.write(chunk)
+        self.chunk_sizes.append(len(chunk))
+        self.size += len(chunk)
+
+    def extend(self, other: "ResultSpool") -> None:
+        """Append the items of another array result, one chunk at a time."""
+
+        assert self.is_array and other.is_array
+
+        other.file.seek(0)
+        for chunk_size in other.chunk_sizes:
+            self.append(other.file.read(chunk_size))
+
+    def iter_json(self) -> Iterator[str]:
+        """Serialize the result as JSON, one chunk at a time."""
+
+        self.file.seek(0)
+
+        if not self.is_array:
+            for chunk_size in self.chunk_sizes:
+                yield self.file.read(chunk_size).decode("utf-8")
+            return
+
+        yield "["
+        for index, chunk_size in enumerate(self.chunk_sizes):
+            if index > 0:
+                yield ","
+            yield self.file.read(chunk_size).decode("utf-8")
+        yield "]"
+
+    def to_value(self) -> Any:
+        """Deserialize the whole result. Only for results known to be small."""
+
+        return json_loads("".join(self.iter_json()))
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
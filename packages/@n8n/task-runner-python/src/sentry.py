@@ -1,4 +1,5 @@
 import logging
+from datetime import datetime, timezone
 from typing import Any
 
 from src.config.sentry_config import SentryConfig
@@ -8,7 +9,10 @@ from src.constants import (
     LOG_SENTRY_MISSING,
     SENTRY_TAG_SERVER_TYPE_KEY,
     SENTRY_TAG_SERVER_TYPE_VALUE,
+    SENTRY_TASK_TRANSACTION_NAME,
+    SENTRY_TASK_TRANSACTION_OP,
 )
+from src.task_timing import TaskTiming
 
 
 class TaskRunnerSentry:
@@ -65,6 +69,39 @@ class TaskRunnerSentry:
         sentry_sdk.set_tag(SENTRY_TAG_SERVER_TYPE_KEY, SENTRY_TAG_SERVER_TYPE_VALUE)
         self.logger.info("Sentry ready")
 
+    @property
+    def is_tracing_enabled(self) -> bool:
+        return self.config.traces_sample_rate > 0
+
+    def record_task_timing(
+        self, task_id: str, outcome: str, timing: TaskTiming
+    ) -> None:
+        """Send the timing of a task as a transaction with a span per phase. Phases
+        are laid out one after another from when the task started, as only their
+        durations are known."""
+
+        import sentry_sdk
+
+        transaction = sentry_sdk.start_transaction(
+            op=SENTRY_TASK_TRANSACTION_OP,
+            name=SENTRY_TASK_TRANSACTION_NAME,
+            start_timestamp=_to_datetime(timing.started_at),
+        )
+        transaction.set_tag("task.outcome", outcome)
+        transaction.set_data("task.id", task_id)
+
+        span_start = timing.started_at
+        for phase, duration in timing.phases.items():
+            span = transaction.start_child(
+                op=f"{SENTRY_TASK_TRANSACTION_OP}.{phase}",
+                start_timestamp=_to_datetime(span_start),
+            )
+            span_start += duration
+            span.finish(end_timestamp=_to_datetime(span_start))
+
+        finished_at = max(timing.finished_at or span_start, span_start)
+        transaction.finish(end_timestamp=_to_datetime(finished_at))
+
     def shutdown(self) -> None:
         import sentry_sdk
 
@@ -100,6 +137,10 @@ class TaskRunnerSentry:
         return False
 
 
+def _to_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
 def setup_sentry(sentry_config: SentryConfig) -> TaskRunnerSentry | None:
     if not sentry_config.enabled:
         return None
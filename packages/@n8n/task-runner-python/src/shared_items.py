@@ -0,0 +1,126 @@
+import fcntl
+import mmap
+import os
+import pickle
+from multiprocessing import reduction
+from typing import Any, BinaryIO, Iterator
+
+from src.constants import (
+    SHARED_ITEMS_BATCH_SIZE,
+    SHARED_ITEMS_READ_BUFFER_SIZE,
+    SHARED_ITEMS_WRITE_BUFFER_SIZE,
+)
+from src.message_types.broker import Items
+
+
+class SharedItems:
+    """Input items of a task serialized once into an anonymous in-memory file
+    (memfd), so that a subprocess receives a file descriptor instead of the
+    items pickled through the forkserver along with the rest of its arguments.
+
+    The file is freed once its last descriptor is closed: the runner closes its
+    own when the task finishes, and the subprocess's goes with the subprocess.
+    """
+
+    def __init__(self, fd: int, size: int, by_item: bool = False):
+        self.fd = fd
+        self.size = size  # bytes
+        # Pickled in small batches, to be deserialized a batch at a time as items
+        # are consumed. Otherwise pickled as a whole, to be deserialized at once.
+        self.by_item = by_item
+
+    @staticmethod
+    def is_supported() -> bool:
+        return hasattr(os, "memfd_create")
+
+    @classmethod
+    def create(cls, items: Items, by_item: bool = False) -> "SharedItems":
+        fd = os.memfd_create("n8n-task-items", os.MFD_CLOEXEC | os.MFD_ALLOW_SEALING)
+
+        try:
+            with os.fdopen(
+                fd, "wb", buffering=SHARED_ITEMS_WRITE_BUFFER_SIZE, closefd=False
+            ) as f:
+                if by_item:
+                    SharedItems._dump_batches(f, items)
+                else:
+                    pickle.dump(items, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+
+            # immutable from here on, including to the subprocess holding it
+            fcntl.fcntl(
+                fd,
+                fcntl.F_ADD_SEALS,
+                fcntl.F_SEAL_SHRINK
+                | fcntl.F_SEAL_GROW
+                | fcntl.F_SEAL_WRITE
+                | fcntl.F_SEAL_SEAL,
+            )
+        except BaseException:
+            os.close(fd)
+            raise
+
+        return cls(fd, size, by_item)
+
+    @staticmethod
+    def _dump_batches(f: BinaryIO, items: Items) -> None:
+        # A batch per item would cost more in unpickler setup than in parsing, so
+        # batches are sized from the last one to about SHARED_ITEMS_BATCH_SIZE,
+        # which leaves an item larger than that alone in its batch.
+        pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+        start = 0
+        batch_len = 1
+        while start < len(items):
+            batch = items[start : start + batch_len]
+            offset = f.tell()
+            pickler.dump(batch)
+            pickler.clear_memo()  # keep batches independently loadable
+            written = f.tell() - offset
+            start += len(batch)
+            batch_len = max(1, len(batch) * SHARED_ITEMS_BATCH_SIZE // written)
+
+    def load(self) -> Items:
+        """Deserialize the items straight from the mapped file."""
+
+        if self.by_item:
+            return list(self.iter_items())
+
+        with mmap.mmap(self.fd, self.size, prot=mmap.PROT_READ) as buffer:
+            return pickle.load(buffer)
+
+    def iter_items(self) -> Iterator[dict[str, Any]]:
+        """Deserialize items as they are consumed, so that only the current batch
+        and a small read buffer are held at once. Read rather than mapped, as
+        mapped pages would stay resident once touched."""
+
+        if not self.by_item:
+            yield from self.load()
+            return
+
+        with os.fdopen(
+            self.fd, "rb", buffering=SHARED_ITEMS_READ_BUFFER_SIZE, closefd=False
+        ) as f:
+            f.seek(0)
+            while f.tell() < self.size:
+                yield from pickle.load(f)
+
+    def close(self) -> None:
+        if self.fd == -1:
+            return
+
+        try:
+            os.close(self.fd)
+        finally:
+            self.fd = -1
+
+    def __reduce__(self):
+        # Duplicates the descriptor into the subprocess when pickled for one.
+        return _rebuild_shared_items, (
+            reduction.DupFd(self.fd),
+            self.size,
+            self.by_item,
+        )
+
+
+def _rebuild_shared_items(dup_fd, size: int, by_item: bool) -> SharedItems:
+    return SharedItems(dup_fd.detach(), size, by_item)
@@ -1,11 +1,18 @@
 import ast
 import hashlib
+import threading
 from collections import OrderedDict
 
+from src.code_cache import CodeCache
 from src.errors import SecurityViolationError
-from src.format_validation import find_blocked_format_tokens
+from src.format_validation import (
+    find_blocked_format_tokens,
+    guard_format_call,
+    is_format_call,
+)
 from src.import_validation import validate_module_import
 from src.config.security_config import SecurityConfig
+from src.metrics import VALIDATION_CACHE_LOOKUPS
 from src.constants import (
     MAX_VALIDATION_CACHE_SIZE,
     ERROR_RELATIVE_IMPORT,
@@ -32,12 +39,20 @@ ValidationCache = OrderedDict[CacheKey, CachedViolations]
 
 
 class SecurityValidator(ast.NodeVisitor):
-    """AST visitor that enforces import allowlists and blocks dangerous attribute access."""
+    """AST visitor that enforces import allowlists and blocks dangerous attribute access.
+
+    With `guard_format_calls`, it also rewrites format calls in place to go through
+    the runtime format guard, as `FormatGuardTransformer` does, so that the tree it
+    validated can be compiled as is.
+    """
 
-    def __init__(self, security_config: SecurityConfig):
+    def __init__(
+        self, security_config: SecurityConfig, guard_format_calls: bool = False
+    ):
         self.checked_modules: set[str] = set()
         self.violations: list[str] = []
         self.security_config = security_config
+        self.guard_format_calls = guard_format_calls
         self._call_func_attr_ids: set[int] = set()
 
     # ========== Detection ==========
@@ -106,10 +121,7 @@ class SecurityValidator(ast.NodeVisitor):
     def visit_Call(self, node: ast.Call) -> None:
         """Detect calls to __import__() that could bypass security restrictions."""
 
-        if (
-            isinstance(node.func, ast.Attribute)
-            and node.func.attr in FORMAT_METHOD_NAMES
-        ):
+        if is_format_call(node):
             self._call_func_attr_ids.add(id(node.func))
 
         is_import_call = (
@@ -138,6 +150,10 @@ class SecurityValidator(ast.NodeVisitor):
 
         self.generic_visit(node)
 
+        # after its arguments, whose nested format calls are rewritten first
+        if self.guard_format_calls and is_format_call(node):
+            guard_format_call(node)
+
     def visit_Subscript(self, node: ast.Subscript) -> None:
         """Detect dict access to blocked attributes, e.g. __builtins__['__spec__']"""
 
@@ -322,9 +338,13 @@ class SecurityValidator(ast.NodeVisitor):
 
 class TaskAnalyzer:
     _cache: ValidationCache = OrderedDict()
+    _cache_lock = threading.Lock()  # as code is validated in a thread pool
 
-    def __init__(self, security_config: SecurityConfig):
+    def __init__(
+        self, security_config: SecurityConfig, code_cache: CodeCache | None = None
+    ):
         self._security_config = security_config
+        self._code_cache = code_cache
         self._allowlists = (
             tuple(sorted(security_config.stdlib_allow)),
             tuple(sorted(security_config.external_allow)),
@@ -334,31 +354,71 @@ class TaskAnalyzer:
             and "*" in security_config.external_allow
         )
 
-    def validate(self, code: str) -> None:
+    def validate_cached(self, code: str) -> bool:
+        """Validate code against the verdicts cached in memory only, which is cheap
+        enough to do on the event loop. Returns whether a verdict was cached, and
+        raises if it has violations. If not cached, the code needs `validate`."""
+
         if self._allow_all:
-            return
+            return True
+
+        cached_violations = self._get_from_cache(self._to_cache_key(code))
+        if cached_violations is None:
+            return False
+
+        VALIDATION_CACHE_LOOKUPS.inc(result="hit")
+        if cached_violations:
+            self._raise_security_error(cached_violations)
+
+        return True
+
+    def validate(self, code: str) -> ast.Module | None:
+        """Validate code against the security config. If the code had to be parsed
+        for it, returns its tree with format calls guarded in the same pass, for
+        `TaskExecutor.compile_code` to compile without parsing it again."""
+
+        if self._allow_all:
+            return None
 
         cache_key = self._to_cache_key(code)
-        cached_violations = self._cache.get(cache_key)
+        cached_violations = self._get_from_cache(cache_key)
 
         if cached_violations is not None:
-            self._cache.move_to_end(cache_key)
+            VALIDATION_CACHE_LOOKUPS.inc(result="hit")
 
             if len(cached_violations) == 0:
-                return
+                return None
 
             self._raise_security_error(cached_violations)
 
+        VALIDATION_CACHE_LOOKUPS.inc(result="miss")
+
+        if self._code_cache is not None:
+            cached_violations = self._code_cache.get_violations(*cache_key)
+            if cached_violations is not None:
+                self._set_in_cache(cache_key, cached_violations)
+
+                if len(cached_violations) == 0:
+                    return None
+
+                self._raise_security_error(cached_violations)
+
         tree = ast.parse(code)
 
-        security_validator = SecurityValidator(self._security_config)
+        security_validator = SecurityValidator(
+            self._security_config, guard_format_calls=True
+        )
         security_validator.visit(tree)
 
         self._set_in_cache(cache_key, security_validator.violations)
+        if self._code_cache is not None:
+            self._code_cache.set_violations(*cache_key, security_validator.violations)
 
         if security_validator.violations:
             self._raise_security_error(security_validator.violations)
 
+        return tree
+
     def _raise_security_error(self, violations: CachedViolations) -> None:
         raise SecurityViolationError(
             message="Security violations detected", description="\n".join(violations)
@@ -368,9 +428,19 @@ class TaskAnalyzer:
         code_hash = hashlib.sha256(code.encode()).hexdigest()
         return (code_hash, self._allowlists)
 
+    def _get_from_cache(self, cache_key: CacheKey) -> CachedViolations | None:
+        with self._cache_lock:
+            cached_violations = self._cache.get(cache_key)
+            if cached_violations is not None:
+                self._cache.move_to_end(cache_key)
+            return cached_violations
+
     def _set_in_cache(self, cache_key: CacheKey, violations: CachedViolations) -> None:
-        if len(self._cache) >= MAX_VALIDATION_CACHE_SIZE:
-            self._cache.popitem(last=False)  # FIFO
+        with self._cache_lock:
+            if cache_key not in self._cache and (
+                len(self._cache) >= MAX_VALIDATION_CACHE_SIZE
+            ):
+                self._cache.popitem(last=False)  # FIFO
 
-        self._cache[cache_key] = violations.copy()
-        self._cache.move_to_end(cache_key)
+            self._cache[cache_key] = violations.copy()
+            self._cache.move_to_end(cache_key)
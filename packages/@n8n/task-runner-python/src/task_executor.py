@@ -1,53 +1,91 @@
 import ast
 import builtins
 import collections
+import functools
+import hashlib
 import importlib
+import importlib.util
 import io
 import json
 import logging
+import marshal
 import multiprocessing
+import opcode
 import os
+import re
+import resource
 import sys
-import textwrap
+import threading
+import time
 import traceback
-from typing import cast
+import types
+from typing import Any, Awaitable, Callable, Iterator, cast
 
 from src.errors import (
     TaskCancelledError,
     TaskKilledError,
     TaskResultMissingError,
     TaskResultReadError,
+    TaskResultTooLargeError,
+    TaskResourceLimitError,
     TaskRuntimeError,
     TaskTimeoutError,
     TaskSubprocessFailedError,
     SecurityViolationError,
 )
 from src._sandbox_callables import _SafePrint, _GuardedImport, _SafeFormat
-from src.format_validation import find_blocked_format_tokens
+from src.format_validation import (
+    find_blocked_format_tokens,
+    guard_format_call,
+    is_format_call,
+)
 from src.import_validation import validate_module_import
+from src.code_cache import CodeCache
 from src.config.security_config import SecurityConfig
 
 from src.message_types.broker import NodeMode, Items, Query
 from src.message_types.pipe import (
+    PipeMessage,
     PipeResultMessage,
     PipeErrorMessage,
     TaskErrorInfo,
+    TaskTimestamps,
+    TaskUsage,
     PrintArgs,
+    PreloadReport,
 )
-from src.pipe_reader import PipeReader
+from src.json_codec import json_dumps
+from src.metrics import COMPILE_CACHE_LOOKUPS, SUBPROCESS_SPAWN_DURATION
+from src.task_timing import TaskTiming
+from src.result_spool import ResultSpool
+from src.shared_items import SharedItems
 from src.constants import (
     EXECUTOR_CIRCULAR_REFERENCE_KEY,
     EXECUTOR_SAFE_FORMAT_KEY,
     EXECUTOR_USER_OUTPUT_KEY,
+    EXECUTOR_USER_FUNCTION_NAME,
     EXECUTOR_ALL_ITEMS_FILENAME,
     EXECUTOR_PER_ITEM_FILENAME,
     ERROR_DANGEROUS_STRING_PATTERN,
     SIGTERM_EXIT_CODE,
     SIGKILL_EXIT_CODE,
+    SIGXCPU_EXIT_CODE,
+    MEMORY_LIMIT_EXIT_CODE,
+    CPU_LIMIT_GRACE,
+    ENV_TASK_CPU_LIMIT,
+    ENV_TASK_MEMORY_LIMIT,
     PIPE_MSG_PREFIX_LENGTH,
-    FORMAT_METHOD_NAMES,
+    PIPE_CHUNK_SIZE,
+    PIPE_FRAME_END,
+    PIPE_FRAME_PRINT,
+    PIPE_FRAME_RESULT_CHUNK,
+    FORKSERVER_PRELOAD_MODULE,
+    MAX_CACHED_FORMAT_TEMPLATE_LENGTH,
+    MAX_COMPILE_CACHE_SIZE,
+    MAX_FORMAT_TEMPLATE_CACHE_SIZE,
 )
 
+from multiprocessing import reduction
 from multiprocessing.context import ForkServerProcess
 from multiprocessing.connection import Connection
 
@@ -55,6 +93,10 @@ logger = logging.getLogger(__name__)
 
 MULTIPROCESSING_CONTEXT = multiprocessing.get_context("forkserver")
 MAX_PRINT_ARGS_ALLOWED = 100
+PRINT_ARGS_TRUNCATED = "[Output truncated - {dropped} more print statements]"
+_PRINT_ARGS_TRUNCATED_PATTERN = re.compile(
+    r"\[Output truncated - (\d+) more print statements\]"
+)
 
 # Captured at module load before any allowlist guards are installed, so a
 # fresh wrapper always delegates to the real implementations rather than
@@ -64,31 +106,70 @@ _PRISTINE_DUNDER_IMPORT = importlib.__import__
 
 type PipeConnection = Connection
 
+# code hash, filename and bytecode version, as code objects only load into the
+# Python version that compiled them
+type CompileCacheKey = tuple[str, str, bytes]
+
+
+def _read_rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+_GLOBAL_WRITE_OPCODES = frozenset(
+    {opcode.opmap["STORE_GLOBAL"], opcode.opmap["DELETE_GLOBAL"]}
+)
+# reaching globals, or running code that may write them, e.g. `exec("global x")`
+_GLOBAL_STATE_NAMES = frozenset(
+    {"globals", "vars", "exec", "eval", "compile", EXECUTOR_USER_FUNCTION_NAME}
+)
+
+
+def _may_write_globals(code: types.CodeType) -> bool:
+    """Whether code, or any function or class in it, assigns to or deletes a
+    global name, or reaches its globals in some other way."""
+
+    # opcodes are at even offsets, inline caches in between are zeroed
+    if not _GLOBAL_WRITE_OPCODES.isdisjoint(code.co_code[::2]):
+        return True
+    if not _GLOBAL_STATE_NAMES.isdisjoint(code.co_names):
+        return True
+
+    return any(
+        _may_write_globals(const)
+        for const in code.co_consts
+        if isinstance(const, types.CodeType)
+    )
+
 
 class FormatGuardTransformer(ast.NodeTransformer):
     def visit_Call(self, node: ast.Call) -> ast.AST:
         self.generic_visit(node)
 
-        if (
-            isinstance(node.func, ast.Attribute)
-            and node.func.attr in FORMAT_METHOD_NAMES
-        ):
-            replacement = ast.Call(
-                func=ast.Name(id=EXECUTOR_SAFE_FORMAT_KEY, ctx=ast.Load()),
-                args=[
-                    ast.Constant(value=node.func.attr),
-                    node.func.value,
-                    *node.args,
-                ],
-                keywords=node.keywords,
-            )
-            return ast.copy_location(replacement, node)
+        if is_format_call(node):
+            guard_format_call(node)
 
         return node
 
 
+@functools.lru_cache(maxsize=MAX_FORMAT_TEMPLATE_CACHE_SIZE)
+def _find_blocked_format_token(template: str) -> str | None:
+    return next(find_blocked_format_tokens(template), None)
+
+
 def _validate_format_template(template: str) -> None:
-    token = next(find_blocked_format_tokens(template), None)
+    # Templates formatted over and over, e.g. per item, are only parsed once.
+    # Only exact strings are cached, as a `str` subclass can compare equal to a
+    # cached template while formatting as another, and only short ones, so as not
+    # to hold on to large strings of user data.
+    if type(template) is str and len(template) <= MAX_CACHED_FORMAT_TEMPLATE_LENGTH:
+        token = _find_blocked_format_token(template)
+    else:
+        token = next(find_blocked_format_tokens(template), None)
     if token is not None:
         raise SecurityViolationError(
             description=ERROR_DANGEROUS_STRING_PATTERN.format(attr=token),
@@ -166,30 +247,145 @@ def _safe_format_impl(method_name: str, receiver, /, *args, **kwargs):
 _safe_format = _SafeFormat(_safe_format_impl)
 
 
+class _PrintStream:
+    """Sink for the args of `print()` calls that writes each call to the pipe as
+    it happens, instead of collecting all of them until the task ends. Calls past
+    `MAX_PRINT_ARGS_ALLOWED` are only counted, like when collecting them.
+
+    Writes block while the runner is busy forwarding earlier calls, which holds
+    up user code rather than buffering its output."""
+
+    def __init__(self, write_fd: int):
+        self.write_fd = write_fd
+        self.call_count = 0
+        self.is_closed = False
+        self.lock = threading.Lock()  # user code may print from several threads
+
+    def append(self, args: list[str]) -> None:
+        with self.lock:
+            self.call_count += 1
+            if self.is_closed or self.call_count > MAX_PRINT_ARGS_ALLOWED:
+                return
+            TaskExecutor._write_frame(self.write_fd, PIPE_FRAME_PRINT, json_dumps(args))
+
+    def close(self) -> PrintArgs:
+        """Stop writing to the pipe, so that nothing is written between the frames
+        that follow, and return what is left to send with the closing message."""
+
+        with self.lock:
+            self.is_closed = True
+            dropped = self.call_count - MAX_PRINT_ARGS_ALLOWED
+            if dropped <= 0:
+                return []
+            return [[PRINT_ARGS_TRUNCATED.format(dropped=dropped)]]
+
+
 class TaskExecutor:
     """Responsible for executing Python code tasks in isolated subprocesses."""
 
+    _compile_cache: collections.OrderedDict[CompileCacheKey, bytes] = (
+        collections.OrderedDict()
+    )
+    _compile_cache_lock = threading.Lock()  # as code is compiled in a thread pool
+
+    @staticmethod
+    def get_cached_code(raw_code: str, node_mode: NodeMode) -> bytes | None:
+        """Code as `compile_code` returns it, if cached in memory, which is cheap
+        enough to look up on the event loop."""
+
+        filename = TaskExecutor._get_mode_filename(node_mode)
+        marshalled = TaskExecutor._get_from_compile_cache(
+            TaskExecutor._to_compile_cache_key(raw_code, filename)
+        )
+        if marshalled is not None:
+            COMPILE_CACHE_LOOKUPS.inc(result="hit")
+        return marshalled
+
+    @staticmethod
+    def compile_code(
+        raw_code: str,
+        node_mode: NodeMode,
+        tree: ast.Module | None = None,
+        code_cache: CodeCache | None = None,
+    ) -> bytes:
+        """Wrap, format-guard and compile user code for the given mode, returning
+        the code object marshalled for a subprocess to load without compiling.
+        Cached, as the same node runs the same code over and over, in memory and
+        in `code_cache` if given.
+
+        `tree` is the code as parsed and format-guarded by `TaskAnalyzer.validate`,
+        if it was, so that it is not parsed and walked again.
+        """
+
+        filename = TaskExecutor._get_mode_filename(node_mode)
+        cache_key = TaskExecutor._to_compile_cache_key(raw_code, filename)
+        code_hash = cache_key[0]
+
+        marshalled = TaskExecutor._get_from_compile_cache(cache_key)
+        if marshalled is not None:
+            COMPILE_CACHE_LOOKUPS.inc(result="hit")
+            return marshalled
+
+        COMPILE_CACHE_LOOKUPS.inc(result="miss")
+        if code_cache is not None:
+            marshalled = code_cache.get_code(code_hash, filename)
+
+        if marshalled is None:
+            compiled = TaskExecutor._compile_user_code(raw_code, filename, tree)
+            marshalled = marshal.dumps(compiled)
+            if code_cache is not None:
+                code_cache.set_code(code_hash, filename, marshalled)
+
+        with TaskExecutor._compile_cache_lock:
+            cache = TaskExecutor._compile_cache
+            if cache_key not in cache and len(cache) >= MAX_COMPILE_CACHE_SIZE:
+                cache.popitem(last=False)
+            cache[cache_key] = marshalled
+
+        return marshalled
+
+    @staticmethod
+    def _to_compile_cache_key(raw_code: str, filename: str) -> CompileCacheKey:
+        code_hash = hashlib.sha256(raw_code.encode()).hexdigest()
+        return (code_hash, filename, importlib.util.MAGIC_NUMBER)
+
+    @staticmethod
+    def _get_from_compile_cache(cache_key: CompileCacheKey) -> bytes | None:
+        with TaskExecutor._compile_cache_lock:
+            marshalled = TaskExecutor._compile_cache.get(cache_key)
+            if marshalled is not None:
+                TaskExecutor._compile_cache.move_to_end(cache_key)
+            return marshalled
+
     @staticmethod
     def create_process(
-        code: str,
+        code: bytes,
         node_mode: NodeMode,
-        items: Items,
+        items: Items | SharedItems,
         security_config: SecurityConfig,
         query: Query = None,
+        stream_print: bool = False,
+        item_offset: int = 0,
     ) -> tuple[ForkServerProcess, PipeConnection, PipeConnection]:
-        """Create a subprocess for executing a Python code task and a pipe for communication."""
+        """Create a subprocess for executing a Python code task and a pipe for communication.
 
-        fn = (
-            TaskExecutor._all_items
-            if node_mode == "all_items"
-            else TaskExecutor._per_item
-        )
+        Takes `code` as compiled by `compile_code` for the same `node_mode`.
+
+        With `stream_print`, the args of each `print()` call are sent as it happens,
+        to be passed to the `on_print` callback of `execute_process`.
+
+        Pass `item_offset` for per-item mode on a shard of the items of a task, as
+        the index of its first item, to pair output items with input items by."""
 
         # thread in runner process reads, subprocess writes
         read_conn, write_conn = MULTIPROCESSING_CONTEXT.Pipe(duplex=False)
 
+        kwargs: dict[str, Any] = {"stream_print": stream_print}
+        if item_offset:
+            kwargs["item_offset"] = item_offset  # only taken in per-item mode
+
         process = MULTIPROCESSING_CONTEXT.Process(
-            target=fn,
+            target=TaskExecutor._get_mode_fn(node_mode),
             args=(
                 code,
                 items,
@@ -197,37 +393,100 @@ class TaskExecutor:
                 security_config,
                 query,
             ),
+            kwargs=kwargs,
         )
 
         return process, read_conn, write_conn
 
     @staticmethod
-    def execute_process(
+    def create_pooled_process(
+        security_config: SecurityConfig,
+    ) -> tuple[
+        ForkServerProcess,
+        PipeConnection,
+        PipeConnection,
+        PipeConnection,
+        PipeConnection,
+    ]:
+        """Create a subprocess that hardens itself and then waits for a task to be
+        dispatched to it, plus a pipe for the task and a pipe for the result."""
+
+        # runner process writes the task, subprocess reads; duplex to be a socket,
+        # which can carry the file descriptor of items shared in memory
+        task_read_conn, task_write_conn = MULTIPROCESSING_CONTEXT.Pipe(duplex=True)
+
+        # thread in runner process reads, subprocess writes
+        read_conn, write_conn = MULTIPROCESSING_CONTEXT.Pipe(duplex=False)
+
+        process = MULTIPROCESSING_CONTEXT.Process(
+            target=TaskExecutor._pooled,
+            args=(task_read_conn, write_conn, security_config),
+        )
+
+        return process, task_read_conn, task_write_conn, read_conn, write_conn
+
+    @staticmethod
+    async def execute_process(
         process: ForkServerProcess,
         read_conn: PipeConnection,
         write_conn: PipeConnection,
         task_timeout: int,
         continue_on_fail: bool,
-    ) -> tuple[Items, PrintArgs, int]:
-        """Execute a subprocess for a Python code task."""
+        dispatch: Callable[[], None] | None = None,
+        max_result_size: int | None = None,
+        on_print: Callable[[list[str]], Awaitable[None]] | None = None,
+        timing: TaskTiming | None = None,
+    ) -> tuple[ResultSpool, PrintArgs, int, TaskUsage | None]:
+        """Execute a subprocess for a Python code task.
+
+        The subprocess is supervised from the event loop, which watches for its
+        exit and reads its pipe, so that a running task holds no thread.
+
+        Pass `dispatch` for a subprocess that is already running and waiting for
+        its task, in which case it is called instead of starting the subprocess.
+
+        Pass `on_print` for a subprocess streaming its print output. It is awaited
+        with the args of each `print()` call as it is received, and the subprocess
+        waits on it once the pipe is full.
+
+        Pass `timing` to record the phases of the subprocess in, once it returns
+        its result.
+
+        Returns the result with its size, the print args and the resource usage
+        of the subprocess, if reported. The caller owns the returned result and
+        must close it once sent.
+        """
+
+        # imported here rather than at module level, as subprocesses import this
+        # module too and have no use for an event loop
+        import asyncio
+        from src.pipe_reader import PipeReader
 
         print_args: PrintArgs = []
 
-        pipe_reader = PipeReader(read_conn.fileno(), read_conn)
-        pipe_reader.start()
+        pipe_reader = PipeReader(read_conn, max_result_size, on_print)
+        read_task = asyncio.create_task(pipe_reader.read())
 
         try:
+            spawn_started = time.monotonic()
             try:
-                process.start()
+                if dispatch is None:
+                    await asyncio.to_thread(process.start)
+                    SUBPROCESS_SPAWN_DURATION.observe(
+                        time.monotonic() - spawn_started, source="task"
+                    )
+                else:
+                    await asyncio.to_thread(dispatch)
             except Exception as e:
                 raise TaskSubprocessFailedError(-1, e)
             finally:
                 write_conn.close()
 
-            process.join(timeout=task_timeout)
-
-            if process.is_alive():
-                TaskExecutor.stop_process(process)
+            try:
+                async with asyncio.timeout(task_timeout):
+                    await TaskExecutor._wait_for_exit(process)
+            except TimeoutError:
+                await asyncio.to_thread(TaskExecutor.stop_process, process)
                 raise TaskTimeoutError(task_timeout)
 
             if process.exitcode == SIGTERM_EXIT_CODE:
@@ -236,21 +495,27 @@ class TaskExecutor:
             if process.exitcode == SIGKILL_EXIT_CODE:
                 raise TaskKilledError()
 
+            if process.exitcode == SIGXCPU_EXIT_CODE:
+                raise TaskResourceLimitError("CPU time", ENV_TASK_CPU_LIMIT)
+
+            if process.exitcode == MEMORY_LIMIT_EXIT_CODE:
+                raise TaskResourceLimitError("memory", ENV_TASK_MEMORY_LIMIT)
+
             if process.exitcode != 0:
                 assert process.exitcode is not None
                 raise TaskSubprocessFailedError(process.exitcode)
 
-            pipe_reader.join(timeout=task_timeout)
-
-            if pipe_reader.is_alive():
-                try:
-                    read_conn.close()
-                except Exception:
-                    pass
+            try:
+                async with asyncio.timeout(task_timeout):
+                    await asyncio.shield(read_task)
+            except TimeoutError:
                 raise TaskResultReadError(
                     TimeoutError(f"Pipe reader timed out after {task_timeout}s")
                 )
 
+            if isinstance(pipe_reader.error, TaskResultTooLargeError):
+                raise pipe_reader.error
+
             if pipe_reader.error:
                 raise TaskResultReadError(pipe_reader.error)
 
@@ -263,22 +528,193 @@ class TaskExecutor:
                 error_msg = cast(PipeErrorMessage, returned)
                 raise TaskRuntimeError(error_msg["error"])
 
-            if "result" not in returned:
+            if pipe_reader.result is None:
                 raise TaskResultMissingError()
 
-            result_msg = cast(PipeResultMessage, returned)
-            result = result_msg["result"]
-            print_args = result_msg.get("print_args", [])
-            assert pipe_reader.message_size is not None
-            result_size_bytes = pipe_reader.message_size
+            result = pipe_reader.result
+            print_args = pipe_reader.print_args + returned.get("print_args", [])
+
+            if timing is not None and "timestamps" in returned:
+                timing.record_subprocess(
+                    spawn_started, returned["timestamps"], time.monotonic()
+                )
+
+            return result, print_args, result.size, returned.get("usage")
+
+        except Exception as e:
+            if pipe_reader.result is not None and read_task.done():
+                pipe_reader.result.close()
+            if continue_on_fail:
+                return (
+                    ResultSpool.from_value([{"json": {"error": str(e)}}]),
+                    print_args,
+                    0,
+                    None,
+                )
+            raise
+
+        finally:
+            # stops reading, which closes the pipe, if the task did not get that far
+            read_task.cancel()
+
+    @staticmethod
+    def shard_items(items: Items, shard_count: int) -> list[tuple[int, Items]]:
+        """Split items into `shard_count` contiguous shards of near-equal size, each
+        with the index of its first item."""
+
+        bounds = [len(items) * i // shard_count for i in range(shard_count + 1)]
+        return [(start, items[start:end]) for start, end in zip(bounds, bounds[1:])]
+
+    @staticmethod
+    async def execute_sharded(
+        shards: list[tuple[ForkServerProcess, PipeConnection, PipeConnection]],
+        task_timeout: int,
+        continue_on_fail: bool,
+        max_result_size: int | None = None,
+        timing: TaskTiming | None = None,
+    ) -> tuple[ResultSpool, PrintArgs, int, TaskUsage | None]:
+        """Execute the subprocesses of a per-item task sharded by `create_process`
+        with `item_offset`, all at once, and merge their results in shard order.
+
+        The outcome is that of running all items in a single subprocess: the result
+        items and print args are in item order, whichever shard finishes first, and
+        the error is that of the first shard to fail, on which later shards are
+        stopped. Subprocesses must not stream their print output.
+
+        Returns as `execute_process` does, with the resource usage of all shards
+        and each phase of their subprocesses timed as the longest across shards.
+        """
+
+        import asyncio
+
+        shard_timings = [TaskTiming() for _ in shards]
+        executions = [
+            asyncio.create_task(
+                TaskExecutor.execute_process(
+                    process=process,
+                    read_conn=read_conn,
+                    write_conn=write_conn,
+                    task_timeout=task_timeout,
+                    continue_on_fail=False,
+                    max_result_size=max_result_size,
+                    timing=shard_timing,
+                )
+            )
+            for (process, read_conn, write_conn), shard_timing in zip(
+                shards, shard_timings
+            )
+        ]
 
-            return result, print_args, result_size_bytes
+        try:
+            results = []
+            for index, execution in enumerate(executions):
+                try:
+                    results.append(await execution)
+                except Exception:
+                    await asyncio.gather(
+                        *(
+                            asyncio.to_thread(TaskExecutor.stop_process, process)
+                            for process, _, _ in shards[index + 1 :]
+                        )
+                    )
+                    raise
+
+            if timing is not None:
+                timing.record_concurrent(shard_timings)
+
+            return await asyncio.to_thread(
+                TaskExecutor._merge_shard_results, results, max_result_size
+            )
 
         except Exception as e:
             if continue_on_fail:
-                return [{"json": {"error": str(e)}}], print_args, 0
+                return (
+                    ResultSpool.from_value([{"json": {"error": str(e)}}]),
+                    [],
+                    0,
+                    None,
+                )
             raise
 
+        finally:
+            # shards are merged into a result of their own, or stopped
+            for outcome in await asyncio.gather(*executions, return_exceptions=True):
+                if isinstance(outcome, tuple):
+                    outcome[0].close()
+
+    @staticmethod
+    def _merge_shard_results(
+        results: list[tuple[ResultSpool, PrintArgs, int, TaskUsage | None]],
+        max_result_size: int | None,
+    ) -> tuple[ResultSpool, PrintArgs, int, TaskUsage | None]:
+        merged = ResultSpool()
+        try:
+            for result, _, _, _ in results:
+                merged.extend(result)
+                if max_result_size is not None and merged.size > max_result_size:
+                    raise TaskResultTooLargeError(merged.size, max_result_size)
+        except BaseException:
+            merged.close()
+            raise
+
+        print_args = TaskExecutor._merge_print_args(
+            [shard_args for _, shard_args, _, _ in results]
+        )
+
+        usages = [usage for _, _, _, usage in results if usage is not None]
+        usage: TaskUsage | None = None
+        if len(usages) == len(results):
+            usage = {
+                "user_cpu": sum(u["user_cpu"] for u in usages),
+                "system_cpu": sum(u["system_cpu"] for u in usages),
+                "max_rss": max(u["max_rss"] for u in usages),
+                "voluntary_switches": sum(u["voluntary_switches"] for u in usages),
+                "involuntary_switches": sum(u["involuntary_switches"] for u in usages),
+            }
+
+        return merged, print_args, merged.size, usage
+
+    @staticmethod
+    def _merge_print_args(shard_print_args: list[PrintArgs]) -> PrintArgs:
+        """Print args of shards in order, truncated as those of a single subprocess
+        would be, counting the print statements each shard truncated."""
+
+        merged: PrintArgs = []
+        count = 0
+        for print_args in shard_print_args:
+            if len(print_args) > MAX_PRINT_ARGS_ALLOWED:
+                # truncated in the subprocess, ending in the count of those dropped
+                match = _PRINT_ARGS_TRUNCATED_PATTERN.fullmatch(
+                    print_args[MAX_PRINT_ARGS_ALLOWED][0]
+                )
+                assert match is not None
+                print_args = print_args[:MAX_PRINT_ARGS_ALLOWED]
+                count += int(match.group(1))
+            merged.extend(print_args)
+            count += len(print_args)
+
+        return TaskExecutor._truncate_print_args(merged, count)
+
+    @staticmethod
+    async def _wait_for_exit(process: ForkServerProcess) -> None:
+        """Wait for a subprocess to exit, without blocking the event loop. Its
+        sentinel becomes readable on exit, after which `exitcode` is set."""
+
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+
+        def on_exit():
+            if not exited.done():
+                exited.set_result(None)
+
+        loop.add_reader(process.sentinel, on_exit)
+        try:
+            await exited
+        finally:
+            loop.remove_reader(process.sentinel)
+
     @staticmethod
     def stop_process(process: ForkServerProcess | None):
         """Stop a running subprocess, gracefully else force-killing."""
@@ -297,119 +733,434 @@ class TaskExecutor:
             # subprocess is dead or unreachable
             pass
 
+    @staticmethod
+    def preload_forkserver() -> PreloadReport | None:
+        """Have the forkserver preload the allowlisted modules, so that subprocesses
+        forked from it inherit them instead of importing them per task. Reports on
+        the preload, or `None` if the forkserver was already running without it.
+
+        Must be called before any subprocess is started, as the forkserver is
+        started with the first subprocess and only preloads on startup.
+        """
+
+        MULTIPROCESSING_CONTEXT.set_forkserver_preload(
+            ["__main__", FORKSERVER_PRELOAD_MODULE]
+        )
+
+        read_conn, write_conn = MULTIPROCESSING_CONTEXT.Pipe(duplex=False)
+        process = MULTIPROCESSING_CONTEXT.Process(
+            target=TaskExecutor._report_preload, args=(write_conn,)
+        )
+
+        try:
+            process.start()
+        finally:
+            write_conn.close()
+
+        try:
+            return read_conn.recv()
+        except EOFError:
+            return None
+        finally:
+            read_conn.close()
+            process.join()
+
+    @staticmethod
+    def preload_modules(
+        security_config: SecurityConfig,
+    ) -> tuple[PreloadReport, frozenset[str]]:
+        """Import the allowlisted modules under the same import guard a task runs
+        with, so that a module a task could not import is not preloaded either.
+        Returns a report and the names of all modules imported along the way."""
+
+        modules_before = set(sys.modules)
+        memory_before = _read_rss_bytes()
+        start_time = time.perf_counter()
+
+        names = TaskExecutor._get_preload_names(security_config)
+        failed = TaskExecutor._find_unimportable(names, security_config)
+        modules = [name for name in names if name not in failed]
+
+        for module_name in TaskExecutor._import_guarded(modules, security_config):
+            modules.remove(module_name)
+            failed.append(module_name)
+
+        duration = time.perf_counter() - start_time
+        memory_after = _read_rss_bytes()
+
+        # Dependencies of allowlisted modules, so that subprocesses keep those too
+        # instead of importing them again, which extension modules like numpy do
+        # not support once loaded into a process.
+        imported = frozenset(sys.modules.keys() - modules_before)
+
+        report: PreloadReport = {
+            "modules": modules,
+            "failed": sorted(failed),
+            "imported_count": len(imported),
+            "duration": duration,
+            "memory_bytes": memory_after - memory_before
+            if memory_before is not None and memory_after is not None
+            else None,
+        }
+
+        return report, imported
+
+    @staticmethod
+    def _find_unimportable(
+        names: list[str], security_config: SecurityConfig
+    ) -> list[str]:
+        """Try importing the modules in a forked process first, as a failed import
+        can leave behind a partially initialized module that cannot be imported
+        again, which would break the module for every subprocess."""
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+
+        if pid == 0:
+            os.close(read_fd)
+            exit_code = 1
+            try:
+                failed = TaskExecutor._import_guarded(names, security_config)
+                TaskExecutor._write_bytes(write_fd, json.dumps(failed).encode("utf-8"))
+                exit_code = 0
+            finally:
+                os._exit(exit_code)
+
+        os.close(write_fd)
+        with os.fdopen(read_fd, "rb") as read_file:
+            data = read_file.read()
+        os.waitpid(pid, 0)
+
+        return json.loads(data) if data else list(names)
+
+    @staticmethod
+    def _import_guarded(names: list[str], security_config: SecurityConfig) -> list[str]:
+        """Import the modules with importlib hardened as in a subprocess, so that
+        package-initiated imports are validated the same way. Returns the names
+        of those that failed to import."""
+
+        failed: list[str] = []
+
+        TaskExecutor._harden_importlib(security_config)
+        try:
+            for module_name in names:
+                try:
+                    _PRISTINE_IMPORT_MODULE(module_name)
+                except Exception:
+                    failed.append(module_name)
+        finally:
+            setattr(importlib, "import_module", _PRISTINE_IMPORT_MODULE)
+            setattr(importlib, "__import__", _PRISTINE_DUNDER_IMPORT)
+
+        return failed
+
+    @staticmethod
+    def _get_preload_names(security_config: SecurityConfig) -> list[str]:
+        """Allowlisted modules to preload. Wildcard allowlists are not preloaded."""
+
+        names: set[str] = set()
+        for allowlist in (security_config.stdlib_allow, security_config.external_allow):
+            if "*" not in allowlist:
+                names.update(allowlist)
+
+        return sorted(names)
+
+    @staticmethod
+    def _report_preload(write_conn: PipeConnection):
+        preload = sys.modules.get(FORKSERVER_PRELOAD_MODULE)
+
+        try:
+            if preload is not None:
+                write_conn.send(preload.report)
+        finally:
+            write_conn.close()
+
     @staticmethod
     def _all_items(
-        raw_code: str,
-        items: Items,
+        code: bytes,
+        items: Items | SharedItems,
         write_conn,
         security_config: SecurityConfig,
         query: Query = None,
+        sandbox_ready: bool = False,
+        stream_print: bool = False,
     ):
         """Execute a Python code task in all-items mode."""
 
-        if security_config.runner_env_deny:
-            os.environ.clear()
+        timestamps = TaskExecutor._start_timestamps()
 
-        TaskExecutor._sanitize_sys_modules(security_config)
-        TaskExecutor._harden_importlib(security_config)
+        if not sandbox_ready:
+            TaskExecutor._prepare_sandbox(security_config)
 
-        print_args: PrintArgs = []
+        print_args = TaskExecutor._create_print_args(write_conn, stream_print)
         sys.stderr = stderr_capture = io.StringIO()
 
         try:
-            compiled_code = TaskExecutor._compile_user_code(
-                raw_code, EXECUTOR_ALL_ITEMS_FILENAME
-            )
+            compiled_code = marshal.loads(code)
 
+            allowed_builtins = TaskExecutor._get_allowed_builtins(security_config)
             globals = {
-                "__builtins__": TaskExecutor._filter_builtins(security_config),
-                "_items": items,
+                "__builtins__": TaskExecutor._make_read_only(allowed_builtins),
+                "_items": TaskExecutor._load_items(items),
                 "_query": query,
                 "print": TaskExecutor._create_custom_print(print_args),
                 EXECUTOR_SAFE_FORMAT_KEY: _safe_format,
             }
+            user_function = TaskExecutor._create_user_function(
+                compiled_code, globals, allowed_builtins
+            )
 
-            exec(compiled_code, globals)
+            timestamps["code_started"] = time.monotonic()
+            result = cast(Items, user_function())
+            timestamps["code_finished"] = time.monotonic()
 
-            result = cast(Items, globals[EXECUTOR_USER_OUTPUT_KEY])
-            TaskExecutor._put_result(write_conn.fileno(), result, print_args)
+            TaskExecutor._put_result(
+                write_conn.fileno(), result, print_args, timestamps
+            )
 
         except BaseException as e:
+            TaskExecutor._exit_on_memory_limit(e, security_config)
             TaskExecutor._put_error(
                 write_conn.fileno(), e, stderr_capture.getvalue(), print_args
             )
 
     @staticmethod
     def _per_item(
-        raw_code: str,
-        items: Items,
+        code: bytes,
+        items: Items | SharedItems,
         write_conn,
         security_config: SecurityConfig,
         _query: Query = None,  # unused, only to keep signatures consistent across modes
+        sandbox_ready: bool = False,
+        stream_print: bool = False,
+        item_offset: int = 0,
     ):
-        """Execute a Python code task in per-item mode."""
+        """Execute a Python code task in per-item mode. With `item_offset`, the items
+        are a shard of those of the task, starting at that index."""
 
-        if security_config.runner_env_deny:
-            os.environ.clear()
+        timestamps = TaskExecutor._start_timestamps()
 
-        TaskExecutor._sanitize_sys_modules(security_config)
-        TaskExecutor._harden_importlib(security_config)
+        if not sandbox_ready:
+            TaskExecutor._prepare_sandbox(security_config)
 
-        print_args: PrintArgs = []
+        print_args = TaskExecutor._create_print_args(write_conn, stream_print)
         sys.stderr = stderr_capture = io.StringIO()
 
         try:
-            compiled_code = TaskExecutor._compile_user_code(
-                raw_code, EXECUTOR_PER_ITEM_FILENAME
-            )
+            compiled_code = marshal.loads(code)
 
-            filtered_builtins = TaskExecutor._filter_builtins(security_config)
+            allowed_builtins = TaskExecutor._get_allowed_builtins(security_config)
+            read_only_builtins = TaskExecutor._make_read_only(allowed_builtins)
             custom_print = TaskExecutor._create_custom_print(print_args)
 
-            result: Items = []
-            for index, item in enumerate(items):
+            def create_user_function(item) -> types.FunctionType:
                 globals = {
-                    "__builtins__": filtered_builtins,
+                    "__builtins__": read_only_builtins,
                     "_item": item,
                     "print": custom_print,
                     EXECUTOR_SAFE_FORMAT_KEY: _safe_format,
                 }
+                return TaskExecutor._create_user_function(
+                    compiled_code, globals, allowed_builtins
+                )
 
-                exec(compiled_code, globals)
+            # Called per item on shared globals, rather than executing the whole
+            # module per item, unless the code could keep state in its globals from
+            # one item to the next, e.g. with a `global` statement, as every item
+            # runs on fresh ones.
+            user_function = create_user_function(None)
+            if _may_write_globals(user_function.__code__):
 
-                user_output = globals[EXECUTOR_USER_OUTPUT_KEY]
+                def run_per_item(item):
+                    return create_user_function(item)()
+
+            else:
+                shared_globals = user_function.__globals__
+                function_builtins = user_function.__builtins__
+
+                def run_per_item(item):
+                    shared_globals["_item"] = item
+                    try:
+                        return user_function()
+                    finally:
+                        # Undo any change the item made to builtins through its
+                        # frame. Refilling the dict costs about as much as copying
+                        # it, and less than any check for changes that values
+                        # overriding `__eq__` couldn't defeat.
+                        function_builtins.clear()
+                        function_builtins.update(allowed_builtins)
+
+            # timed as a whole, items being loaded as they are iterated over
+            timestamps["code_started"] = time.monotonic()
+            result: Items = []
+            for index, item in enumerate(TaskExecutor._iter_items(items)):
+                user_output = run_per_item(item)
 
                 if user_output is None:
                     continue
 
                 json_data = TaskExecutor._extract_json_data_per_item(user_output)
 
-                output_item = {"json": json_data, "pairedItem": {"item": index}}
+                output_item = {
+                    "json": json_data,
+                    "pairedItem": {"item": item_offset + index},
+                }
 
                 if isinstance(user_output, dict) and "binary" in user_output:
                     output_item["binary"] = user_output["binary"]
 
                 result.append(output_item)
+            timestamps["code_finished"] = time.monotonic()
 
-            TaskExecutor._put_result(write_conn.fileno(), result, print_args)
+            TaskExecutor._put_result(
+                write_conn.fileno(), result, print_args, timestamps
+            )
 
         except BaseException as e:
+            TaskExecutor._exit_on_memory_limit(e, security_config)
             TaskExecutor._put_error(
                 write_conn.fileno(), e, stderr_capture.getvalue(), print_args
             )
 
     @staticmethod
-    def _wrap_code(raw_code: str) -> str:
-        indented_code = textwrap.indent(raw_code, "    ")
-        return f"def _user_function():\n{indented_code}\n\n{EXECUTOR_USER_OUTPUT_KEY} = _user_function()"
+    def _create_user_function(
+        compiled_code: types.CodeType,
+        globals: dict[str, Any],
+        builtins: dict[str, Any],
+    ) -> types.FunctionType:
+        """The user function of compiled code, bound to `globals` as if defined by
+        executing the code, to be called instead of executing it.
+
+        The function looks up builtins in a copy of `builtins`, captured on creating
+        it, so that CPython specializes those lookups, as it only does for an exact
+        dict. The copy is its own, so that code reaching it, e.g. through the frame
+        of the function, can only change its own lookups. Its globals keep the
+        read-only view of builtins, for code to reach instead, and for functions
+        defined by its code to look them up in."""
+
+        function_code = next(
+            const
+            for const in compiled_code.co_consts
+            if isinstance(const, types.CodeType)
+            and const.co_name == EXECUTOR_USER_FUNCTION_NAME
+        )
+
+        read_only_builtins = globals["__builtins__"]
+        globals["__builtins__"] = dict(builtins)
+        try:
+            function = types.FunctionType(function_code, globals)
+        finally:
+            globals["__builtins__"] = read_only_builtins
+
+        globals[EXECUTOR_USER_FUNCTION_NAME] = function
+        return function
+
+    @staticmethod
+    def _pooled(
+        task_conn: PipeConnection,
+        write_conn,
+        security_config: SecurityConfig,
+    ):
+        """Harden the subprocess ahead of time, then wait for a single task to be
+        dispatched and execute it in the mode it requests."""
+
+        TaskExecutor._prepare_sandbox(security_config)
+
+        try:
+            code, node_mode, items, query, stream_print = task_conn.recv()
+            if isinstance(items, tuple):
+                # items were shared in memory, their layout is sent ahead of the fd
+                size, by_item = items
+                items = SharedItems(reduction.recv_handle(task_conn), size, by_item)
+        except EOFError:
+            return  # pool shut down before a task was dispatched
+        finally:
+            task_conn.close()
+
+        fn = TaskExecutor._get_mode_fn(node_mode)
+        fn(
+            code,
+            items,
+            write_conn,
+            security_config,
+            query,
+            sandbox_ready=True,
+            stream_print=stream_print,
+        )
+
+    @staticmethod
+    def _load_items(items: Items | SharedItems) -> Items:
+        if not isinstance(items, SharedItems):
+            return items
+
+        try:
+            return items.load()
+        finally:
+            items.close()
+
+    @staticmethod
+    def _iter_items(items: Items | SharedItems) -> Iterator[dict[str, Any]]:
+        if not isinstance(items, SharedItems):
+            yield from items
+            return
+
+        try:
+            yield from items.iter_items()
+        finally:
+            items.close()
+
+    @staticmethod
+    def _get_mode_fn(node_mode: NodeMode):
+        return (
+            TaskExecutor._all_items
+            if node_mode == "all_items"
+            else TaskExecutor._per_item
+        )
 
     @staticmethod
-    def _compile_user_code(raw_code: str, filename: str):
-        wrapped_code = TaskExecutor._wrap_code(raw_code)
-        tree = ast.parse(wrapped_code, filename, "exec")
-        tree = FormatGuardTransformer().visit(tree)
-        ast.fix_missing_locations(tree)
-        return compile(tree, filename, "exec")
+    def _get_mode_filename(node_mode: NodeMode) -> str:
+        return (
+            EXECUTOR_ALL_ITEMS_FILENAME
+            if node_mode == "all_items"
+            else EXECUTOR_PER_ITEM_FILENAME
+        )
+
+    @staticmethod
+    def _wrap_tree(tree: ast.Module) -> ast.Module:
+        """Wrap the statements of user code into `def _user_function(): ...` and
+        an assignment of its return value to the output key. Wrapping the tree
+        rather than indenting the source keeps line and column numbers in
+        tracebacks those of the user code, and multiline strings unchanged."""
+
+        user_function = ast.FunctionDef(
+            name=EXECUTOR_USER_FUNCTION_NAME,
+            args=ast.arguments(
+                posonlyargs=[], args=[], kwonlyargs=[], kw_defaults=[], defaults=[]
+            ),
+            body=tree.body or [ast.Pass()],
+            decorator_list=[],
+            type_params=[],
+        )
+        output = ast.Assign(
+            targets=[ast.Name(id=EXECUTOR_USER_OUTPUT_KEY, ctx=ast.Store())],
+            value=ast.Call(
+                func=ast.Name(id=EXECUTOR_USER_FUNCTION_NAME, ctx=ast.Load()),
+                args=[],
+                keywords=[],
+            ),
+        )
+        return ast.Module(body=[user_function, output], type_ignores=[])
+
+    @staticmethod
+    def _compile_user_code(
+        raw_code: str, filename: str, tree: ast.Module | None = None
+    ):
+        if tree is None:
+            tree = ast.parse(raw_code, filename, "exec")
+            tree = FormatGuardTransformer().visit(tree)
+        wrapped_tree = TaskExecutor._wrap_tree(tree)
+        ast.fix_missing_locations(wrapped_tree)
+        return compile(wrapped_tree, filename, "exec")
 
     @staticmethod
     def _extract_json_data_per_item(user_output):
@@ -425,30 +1176,44 @@ class TaskExecutor:
         return user_output
 
     @staticmethod
-    def _put_result(write_fd: int, result: Items, print_args: PrintArgs):
-        message: PipeResultMessage = {
-            "result": result,
-            "print_args": TaskExecutor._truncate_print_args(print_args),
+    def _start_timestamps() -> TaskTimestamps:
+        started = time.monotonic()
+        return {
+            "started": started,
+            "code_started": started,
+            "code_finished": started,
+            "finished": started,
         }
 
-        data = json.dumps(message, default=str, ensure_ascii=False).encode("utf-8")
-        length_bytes = len(data).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
+    @staticmethod
+    def _put_result(
+        write_fd: int,
+        result: Items,
+        print_args: PrintArgs | _PrintStream,
+        timestamps: TaskTimestamps,
+    ):
+        # truncated first, which stops a print stream from writing between frames
+        truncated_print_args = TaskExecutor._truncate_print_args(print_args)
+
+        if isinstance(result, list):
+            for chunk in TaskExecutor._serialize_result_chunks(result):
+                TaskExecutor._write_frame(write_fd, PIPE_FRAME_RESULT_CHUNK, chunk)
+            message: PipeResultMessage = {"print_args": truncated_print_args}
+        else:
+            message = {"result": result, "print_args": truncated_print_args}
 
-        try:
-            TaskExecutor._write_bytes(write_fd, length_bytes)
-            TaskExecutor._write_bytes(write_fd, data)
-        finally:
-            try:
-                os.close(write_fd)
-            except Exception:
-                pass
+        message["usage"] = TaskExecutor._get_usage()
+        timestamps["finished"] = time.monotonic()
+        message["timestamps"] = timestamps
+
+        TaskExecutor._put_message(write_fd, message)
 
     @staticmethod
     def _put_error(
         write_fd: int,
         e: BaseException,
         stderr: str = "",
-        print_args: PrintArgs | None = None,
+        print_args: PrintArgs | _PrintStream | None = None,
     ):
         if print_args is None:
             print_args = []
@@ -467,22 +1232,71 @@ class TaskExecutor:
             "print_args": TaskExecutor._truncate_print_args(print_args),
         }
 
-        data = json.dumps(message, default=str, ensure_ascii=False).encode("utf-8")
-        length_bytes = len(data).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
+        TaskExecutor._put_message(write_fd, message)
+
+    @staticmethod
+    def _exit_on_memory_limit(e: BaseException, security_config: SecurityConfig):
+        # Exits rather than reporting the error, as there may be no memory left
+        # to report it with, and so that the runner tells it apart from a
+        # `MemoryError` raised by user code, e.g. on an oversized allocation.
+        if isinstance(e, MemoryError) and security_config.memory_limit > 0:
+            os._exit(MEMORY_LIMIT_EXIT_CODE)
+
+    @staticmethod
+    def _get_usage() -> TaskUsage:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # in kilobytes on Linux, in bytes on macOS
+        max_rss_unit = 1 if sys.platform == "darwin" else 1024
+
+        return {
+            "user_cpu": usage.ru_utime,
+            "system_cpu": usage.ru_stime,
+            "max_rss": usage.ru_maxrss * max_rss_unit,
+            "voluntary_switches": usage.ru_nvcsw,
+            "involuntary_switches": usage.ru_nivcsw,
+        }
+
+    @staticmethod
+    def _put_message(write_fd: int, message: PipeMessage):
+        data = json_dumps(message)
 
         try:
-            TaskExecutor._write_bytes(write_fd, length_bytes)
-            TaskExecutor._write_bytes(write_fd, data)
+            TaskExecutor._write_frame(write_fd, PIPE_FRAME_END, data)
         finally:
             try:
                 os.close(write_fd)
             except Exception:
                 pass
 
+    @staticmethod
+    def _serialize_result_chunks(result: Items) -> Iterator[bytes]:
+        """Serialize result items into JSON arrays of about `PIPE_CHUNK_SIZE` bytes,
+        or of a single item if larger."""
+
+        chunk: list[bytes] = []
+        chunk_size = 0
+
+        for item in result:
+            data = json_dumps(item)
+            chunk.append(data)
+            chunk_size += len(data) + 1  # separator
+
+            if chunk_size >= PIPE_CHUNK_SIZE:
+                yield b"[" + b",".join(chunk) + b"]"
+                chunk = []
+                chunk_size = 0
+
+        if chunk:
+            yield b"[" + b",".join(chunk) + b"]"
+
     # ========== print() ==========
 
     @staticmethod
-    def _create_custom_print(print_args: PrintArgs):
+    def _create_print_args(write_conn, stream_print: bool) -> PrintArgs | _PrintStream:
+        return _PrintStream(write_conn.fileno()) if stream_print else []
+
+    @staticmethod
+    def _create_custom_print(print_args: PrintArgs | _PrintStream):
         return _SafePrint(print_args, TaskExecutor._format_print_args)
 
     @staticmethod
@@ -512,26 +1326,97 @@ class TaskExecutor:
         return formatted
 
     @staticmethod
-    def _truncate_print_args(print_args: PrintArgs) -> PrintArgs:
-        """Truncate print_args to prevent pipe buffer overflow."""
+    def _truncate_print_args(
+        print_args: PrintArgs | _PrintStream, count: int | None = None
+    ) -> PrintArgs:
+        """Truncate print_args to prevent pipe buffer overflow. Pass `count` for
+        print args standing for more print statements than they hold."""
+
+        if isinstance(print_args, _PrintStream):
+            return print_args.close()
+
+        if count is None:
+            count = len(print_args)
 
-        if not print_args or len(print_args) <= MAX_PRINT_ARGS_ALLOWED:
+        if not print_args or count <= MAX_PRINT_ARGS_ALLOWED:
             return print_args
 
         truncated = print_args[:MAX_PRINT_ARGS_ALLOWED]
         truncated.append(
-            [
-                f"[Output truncated - {len(print_args) - MAX_PRINT_ARGS_ALLOWED} more print statements]"
-            ]
+            [PRINT_ARGS_TRUNCATED.format(dropped=count - MAX_PRINT_ARGS_ALLOWED)]
         )
 
         return truncated
 
     # ========== security ==========
 
+    @staticmethod
+    def _prepare_sandbox(security_config: SecurityConfig):
+        """Harden the subprocess before it runs any user code."""
+
+        if security_config.runner_env_deny:
+            os.environ.clear()
+
+        TaskExecutor._sanitize_sys_modules(security_config)
+        TaskExecutor._harden_importlib(security_config)
+        TaskExecutor._apply_resource_limits(security_config)
+
+    @staticmethod
+    def _apply_resource_limits(security_config: SecurityConfig):
+        """Limit the memory and CPU time of the subprocess, last in preparing it so
+        that only the task counts against them.
+
+        The memory limit caps the address space at what the subprocess starts
+        with, e.g. modules inherited from the forkserver, plus the limit, so that
+        allocating past it raises `MemoryError`. The CPU time limit has the kernel
+        send `SIGXCPU`, and `SIGKILL` if that is ignored.
+        """
+
+        if security_config.memory_limit > 0:
+            address_space = TaskExecutor._read_address_space_bytes()
+            max_address_space = address_space + security_config.memory_limit
+            TaskExecutor._set_limit(
+                resource.RLIMIT_AS, max_address_space, max_address_space
+            )
+
+        if security_config.cpu_limit > 0:
+            cpu_time = resource.getrusage(resource.RUSAGE_SELF)
+            used = int(cpu_time.ru_utime + cpu_time.ru_stime)
+            soft_limit = used + security_config.cpu_limit
+            TaskExecutor._set_limit(
+                resource.RLIMIT_CPU, soft_limit, soft_limit + CPU_LIMIT_GRACE
+            )
+            # `SIGXCPU` dumps core by default, which tasks have no use for
+            TaskExecutor._set_limit(resource.RLIMIT_CORE, 0, 0)
+
+    @staticmethod
+    def _set_limit(limit: int, soft: int, hard: int):
+        # hard limits too, so that user code may not raise them again
+        _, current_hard = resource.getrlimit(limit)
+        if current_hard != resource.RLIM_INFINITY:
+            # only root may raise a hard limit
+            soft = min(soft, current_hard)
+            hard = min(hard, current_hard)
+        resource.setrlimit(limit, (soft, hard))
+
+    @staticmethod
+    def _read_address_space_bytes() -> int:
+        with open("/proc/self/statm") as f:
+            size_pages = int(f.read().split()[0])
+        return size_pages * os.sysconf("SC_PAGE_SIZE")
+
     @staticmethod
     def _filter_builtins(security_config: SecurityConfig):
-        """Get __builtins__ with denied ones removed."""
+        """Get __builtins__ with denied ones removed, as a read-only view."""
+
+        return TaskExecutor._make_read_only(
+            TaskExecutor._get_allowed_builtins(security_config)
+        )
+
+    @staticmethod
+    def _get_allowed_builtins(security_config: SecurityConfig) -> dict[str, Any]:
+        """Get __builtins__ with denied ones removed, as a dict for user functions
+        to look them up in. Must not be reachable from user code."""
 
         if len(security_config.builtins_deny) == 0:
             filtered = dict(__builtins__)
@@ -543,7 +1428,10 @@ class TaskExecutor:
             }
 
         filtered["__import__"] = TaskExecutor._create_safe_import(security_config)
+        return filtered
 
+    @staticmethod
+    def _make_read_only(filtered: dict[str, Any]):
         class _ImmutableBuiltins:
             __slots__ = ()
 
@@ -614,12 +1502,20 @@ class TaskExecutor:
         else:
             safe_modules.update(security_config.external_allow)
 
+        # keep modules preloaded by the forkserver, which includes dependencies of
+        # allowlisted modules, as a module cannot always be imported a second time
+        preload = sys.modules.get(FORKSERVER_PRELOAD_MODULE)
+        preloaded_modules: frozenset[str] = (
+            preload.imported_modules if preload is not None else frozenset()
+        )
+
         # keep modules marked as safe and submodules of those
         safe_prefixes = [safe + "." for safe in safe_modules]
         modules_to_remove = [
             name
             for name in sys.modules.keys()
             if name not in safe_modules
+            and name not in preloaded_modules
             and not any(name.startswith(prefix) for prefix in safe_prefixes)
         ]
 
@@ -662,6 +1558,14 @@ class TaskExecutor:
 
     # ========== pipe I/O ==========
 
+    @staticmethod
+    def _write_frame(fd: int, frame_type: int, data: bytes):
+        header = len(data).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big") + bytes(
+            (frame_type,)
+        )
+        TaskExecutor._write_bytes(fd, header)
+        TaskExecutor._write_bytes(fd, data)
+
     @staticmethod
     def _write_bytes(fd: int, data: bytes):
         total_written = 0
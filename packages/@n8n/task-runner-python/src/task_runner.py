@@ -1,7 +1,10 @@
 import asyncio
+import heapq
 import logging
 import time
-from typing import Callable, Awaitable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Awaitable
 from dataclasses import dataclass
 from urllib.parse import urlparse
 import websockets
@@ -13,25 +16,47 @@ from src.errors import TaskCancelledError
 
 from src.config.task_runner_config import TaskRunnerConfig
 from src.errors import (
+    CodeValidationTimeoutError,
     NoIdleTimeoutHandlerError,
+    SecurityViolationError,
+    TaskKilledError,
     TaskMissingError,
+    TaskResourceLimitError,
+    TaskTimeoutError,
     WebsocketConnectionError,
 )
-from src.message_types.broker import TaskSettings
+from src import metrics
+from src.message_types.broker import Items, TaskSettings
+from src.message_types.pipe import PrintArgs, TaskUsage
+from src.result_spool import ResultSpool
 from src.nanoid import nanoid
 
 from src.constants import (
+    PER_ITEM_SHARD_MIN_ITEMS,
     RUNNER_NAME,
     TASK_REJECTED_REASON_AT_CAPACITY,
     TASK_REJECTED_REASON_OFFER_EXPIRED,
     TASK_TYPE_PYTHON,
-    OFFER_INTERVAL,
+    VALIDATION_POOL_SIZE,
+    VALIDATION_TIMEOUT,
+    OFFER_RETRY_INTERVAL,
     OFFER_VALIDITY,
+    OFFER_VALIDITY_MAX,
     OFFER_VALIDITY_MAX_JITTER,
+    OFFER_VALIDITY_RTT_MULTIPLIER,
     OFFER_VALIDITY_LATENCY_BUFFER,
+    OFFER_VALIDITY_LATENCY_BUFFER_RTT_MULTIPLIER,
     TASK_BROKER_WS_PATH,
     RPC_BROWSER_CONSOLE_LOG_METHOD,
+    RPC_BROWSER_CONSOLE_LOG_BATCH_METHOD,
+    RPC_BROWSER_CONSOLE_LOG_BATCH_SIZE,
+    CAPABILITY_CONSOLE_LOG_BATCH,
+    CAPABILITY_CONSOLE_LOG_IN_TASK_DONE,
+    RUNNER_CAPABILITIES,
+    TASK_DONE_CONSOLE_LOGS_KEY,
     LOG_TASK_COMPLETE,
+    LOG_FORKSERVER_PRELOAD,
+    LOG_FORKSERVER_PRELOAD_FAILED,
     LOG_TASK_CANCEL,
     LOG_TASK_CANCEL_UNKNOWN,
     LOG_TASK_CANCEL_WAITING,
@@ -55,9 +80,14 @@ from src.message_types import (
     RunnerRpcCall,
 )
 from src.message_serde import MessageSerde
+from src.task_timing import TaskTiming
 from src.task_state import TaskState, TaskStatus
 from src.task_executor import TaskExecutor
 from src.task_analyzer import TaskAnalyzer
+from src.code_cache import CodeCache
+from src.worker_pool import WorkerPool
+from src.adaptive_concurrency import AdaptiveConcurrency
+from src.shared_items import SharedItems
 from src.config.security_config import SecurityConfig
 
 
@@ -82,11 +112,14 @@ class TaskRunner:
 
         self.websocket_connection: ClientConnection | None = None
         self.can_send_offers = False
+        self.capabilities: list[str] = []  # agreed with the broker
 
         self.open_offers: dict[str, TaskOffer] = {}
+        self.offer_expiries: list[tuple[float, str]] = []  # heap, may hold stale
         self.running_tasks: dict[str, TaskState] = {}
 
         self.offers_coroutine: asyncio.Task | None = None
+        self.offers_needed = asyncio.Event()
         self.serde = MessageSerde()
         self.executor = TaskExecutor()
         self.security_config = SecurityConfig(
@@ -95,12 +128,51 @@ class TaskRunner:
             builtins_deny=config.builtins_deny,
             runner_env_deny=config.env_deny,
             allow_transitive_imports=config.allow_transitive_imports,
+            memory_limit=config.task_memory_limit,
+            cpu_limit=config.task_cpu_limit,
+        )
+        self.code_cache = (
+            CodeCache(
+                config.code_cache_dir,
+                config.code_cache_max_size,
+                config.code_cache_secret,
+            )
+            if config.is_code_cache_enabled
+            else None
+        )
+        self.analyzer = TaskAnalyzer(self.security_config, self.code_cache)
+        self.validation_pool = ThreadPoolExecutor(
+            max_workers=VALIDATION_POOL_SIZE, thread_name_prefix="validation"
+        )
+        self.worker_pool = (
+            WorkerPool(
+                self.security_config,
+                size=config.worker_pool_size,
+                refill_rate=config.worker_pool_refill_rate,
+            )
+            if config.is_worker_pool_enabled
+            else None
+        )
+        self.concurrency = (
+            AdaptiveConcurrency(
+                get_task_pids=self._get_task_pids,
+                get_running_count=lambda: self.used_slots,
+                on_change=self.offers_needed.set,
+            )
+            if config.adaptive_concurrency
+            else None
         )
-        self.analyzer = TaskAnalyzer(self.security_config)
         self.logger = logging.getLogger(__name__)
 
+        metrics.RUNNING_TASKS.set_function(lambda: self.running_tasks_count)
+        metrics.TASK_SLOTS.set_function(lambda: self.max_concurrency)
+        metrics.OPEN_OFFERS.set_function(self._get_open_offers_count)
+        metrics.WEBSOCKET_WRITE_BUFFER_SIZE.set_function(self._get_write_buffer_size)
+
         self.idle_coroutine: asyncio.Task | None = None
         self.on_idle_timeout: Callable[[], Awaitable[None]] | None = None
+        # called with the task ID, outcome and timing of every finished task
+        self.on_task_timing: Callable[[str, str, TaskTiming], None] | None = None
         self.last_activity_time = time.time()
         self.is_shutting_down = False
 
@@ -114,10 +186,47 @@ class TaskRunner:
     def running_tasks_count(self) -> int:
         return len(self.running_tasks)
 
+    @property
+    def used_slots(self) -> int:
+        """Task slots taken, by a task each and by the extra shards of sharded ones."""
+
+        return sum(task_state.slots for task_state in self.running_tasks.values())
+
+    @property
+    def max_concurrency(self) -> int:
+        if self.concurrency:
+            return self.concurrency.limit
+        return self.config.max_concurrency
+
+    def _get_open_offers_count(self) -> int:
+        return sum(1 for offer in self.open_offers.values() if not offer.has_expired)
+
+    def _get_write_buffer_size(self) -> int:
+        if self.websocket_connection is None:
+            return 0
+        return self.websocket_connection.transport.get_write_buffer_size()
+
+    def _get_task_pids(self) -> list[int]:
+        return [
+            process.pid
+            for task_state in self.running_tasks.values()
+            for process in task_state.processes
+            if process.pid is not None
+        ]
+
     async def start(self) -> None:
         if self.config.is_auto_shutdown_enabled and not self.on_idle_timeout:
             raise NoIdleTimeoutHandlerError(self.config.auto_shutdown_timeout)
 
+        if self.config.forkserver_preload:
+            await self._preload_forkserver()
+
+        if self.worker_pool:
+            self.worker_pool.start()
+
+        if self.concurrency:
+            self.concurrency.start()
+
         headers = {"Authorization": f"Bearer {self.config.grant_token}"}
 
         while not self.is_shutting_down:
@@ -147,6 +256,32 @@ class TaskRunner:
                 await self._cancel_coroutine(self.idle_coroutine)
                 await asyncio.sleep(5)
 
+    async def _preload_forkserver(self) -> None:
+        report = await asyncio.to_thread(TaskExecutor.preload_forkserver)
+
+        if report is None:
+            self.logger.warning("Forkserver was already running, skipped preload")
+            return
+
+        memory_bytes = report["memory_bytes"]
+        self.logger.info(
+            LOG_FORKSERVER_PRELOAD.format(
+                module_count=len(report["modules"]),
+                imported_count=report["imported_count"],
+                duration=f"{int(report['duration'] * 1000)}ms",
+                memory="unknown"
+                if memory_bytes is None
+                else self._get_result_size(memory_bytes),
+            )
+        )
+
+        if report["failed"]:
+            self.logger.warning(
+                LOG_FORKSERVER_PRELOAD_FAILED.format(
+                    modules=", ".join(report["failed"])
+                )
+            )
+
     async def _cancel_coroutine(self, coroutine: asyncio.Task | None) -> None:
         if coroutine and not coroutine.done():
             coroutine.cancel()
@@ -164,6 +299,12 @@ class TaskRunner:
         await self._cancel_coroutine(self.offers_coroutine)
         await self._cancel_coroutine(self.idle_coroutine)
 
+        if self.concurrency:
+            await self.concurrency.stop()
+
+        if self.worker_pool:
+            await self.worker_pool.stop()
+
         await self._wait_for_tasks()
         await self._terminate_tasks()
 
@@ -171,6 +312,11 @@ class TaskRunner:
             await self.websocket_connection.close()
             self.logger.info("Disconnected from broker")
 
+        self.validation_pool.shutdown(wait=False, cancel_futures=True)
+
+        if self.code_cache:
+            self.code_cache.close()
+
         self.logger.info("Runner stopped")
 
     async def _wait_for_tasks(self):
@@ -198,9 +344,9 @@ class TaskRunner:
         self.logger.warning(f"Terminating {self.running_tasks_count} tasks...")
 
         tasks_to_terminate = [
-            asyncio.to_thread(self.executor.stop_process, task_state.process)
+            asyncio.to_thread(self.executor.stop_process, process)
             for task_state in self.running_tasks.values()
-            if task_state.process
+            for process in task_state.processes
         ]
 
         if tasks_to_terminate:
@@ -230,7 +376,7 @@ class TaskRunner:
     async def _handle_message(self, message: BrokerMessage) -> None:
         match message:
             case BrokerInfoRequest():
-                await self._handle_info_request()
+                await self._handle_info_request(message)
             case BrokerRunnerRegistered():
                 await self._handle_runner_registered()
             case BrokerTaskOfferAccept():
@@ -246,8 +392,15 @@ class TaskRunner:
             case _:
                 self.logger.warning(f"Unhandled message type: {type(message)}")
 
-    async def _handle_info_request(self) -> None:
-        response = RunnerInfo(name=self.name, types=[TASK_TYPE_PYTHON])
+    async def _handle_info_request(self, message: BrokerInfoRequest) -> None:
+        self.capabilities = [
+            capability
+            for capability in RUNNER_CAPABILITIES
+            if capability in message.capabilities
+        ]
+        response = RunnerInfo(
+            name=self.name, types=[TASK_TYPE_PYTHON], capabilities=self.capabilities
+        )
         await self._send_message(response)
 
     async def _handle_drain(self) -> None:
@@ -261,10 +414,16 @@ class TaskRunner:
         self.logger.info("Registered with broker")
         self._reset_idle_timer()
 
+        if self.websocket_connection is not None:
+            # measures the round trip to the broker, to time offers by, without
+            # waiting for the first keepalive ping
+            await self.websocket_connection.ping()
+
     async def _handle_task_offer_accept(self, message: BrokerTaskOfferAccept) -> None:
         offer = self.open_offers.get(message.offer_id)
 
         if offer is None or offer.has_expired:
+            metrics.TASKS_REJECTED.inc(reason="offer_expired")
             response = RunnerTaskRejected(
                 task_id=message.task_id,
                 reason=TASK_REJECTED_REASON_OFFER_EXPIRED,
@@ -272,7 +431,8 @@ class TaskRunner:
             await self._send_message(response)
             return
 
-        if self.running_tasks_count >= self.config.max_concurrency:
+        if self.used_slots >= self.max_concurrency:
+            metrics.TASKS_REJECTED.inc(reason="at_capacity")
             response = RunnerTaskRejected(
                 task_id=message.task_id,
                 reason=TASK_REJECTED_REASON_AT_CAPACITY,
@@ -284,6 +444,7 @@ class TaskRunner:
 
         task_state = TaskState(message.task_id)
         self.running_tasks[message.task_id] = task_state
+        metrics.TASKS_ACCEPTED.inc()
 
         response = RunnerTaskAccepted(task_id=message.task_id)
         await self._send_message(response)
@@ -312,6 +473,8 @@ class TaskRunner:
 
     async def _execute_task(self, task_id: str, task_settings: TaskSettings) -> None:
         start_time = time.time()
+        outcome = "error"
+        timing = TaskTiming()
 
         try:
             task_state = self.running_tasks.get(task_id)
@@ -319,55 +482,58 @@ class TaskRunner:
             if task_state is None:
                 raise TaskMissingError(task_id)
 
-            self.analyzer.validate(task_settings.code)
-
-            process, read_conn, write_conn = self.executor.create_process(
-                code=task_settings.code,
-                node_mode=task_settings.node_mode,
-                items=task_settings.items,
-                security_config=self.security_config,
-                query=task_settings.query,
-            )
-
-            task_state.process = process
-
-            result, print_args, result_size_bytes = await asyncio.to_thread(
-                self.executor.execute_process,
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=self.config.task_timeout,
-                continue_on_fail=task_settings.continue_on_fail,
-            )
+            code = await self._validate_and_compile(task_settings, timing)
 
-            for print_args_per_call in print_args:
-                await self._send_rpc_message(
-                    task_id, RPC_BROWSER_CONSOLE_LOG_METHOD, print_args_per_call
+            shard_count = self._get_shard_count(task_settings)
+            if shard_count > 1:
+                execution = self._execute_sharded(
+                    task_state, task_settings, code, shard_count, timing
                 )
-
-            response = RunnerTaskDone(task_id=task_id, data={"result": result})
-            await self._send_message(response)
-
+            else:
+                execution = self._execute_unsharded(
+                    task_state, task_settings, code, timing
+                )
+            result, print_args, result_size_bytes, usage = await execution
+
+            phase_start = time.monotonic()
+            with result:
+                data: dict[str, Any] = {"result": result}
+                if CAPABILITY_CONSOLE_LOG_IN_TASK_DONE in self.capabilities:
+                    data[TASK_DONE_CONSOLE_LOGS_KEY] = print_args
+                else:
+                    await self._send_print_args(task_id, print_args)
+
+                response = RunnerTaskDone(task_id=task_id, data=data)
+                await self._send_message(response)
+            timing.record("send", phase_start)
+
+            outcome = "success"
+            metrics.TASK_RESULT_SIZE.observe(result_size_bytes)
             self.logger.info(
                 LOG_TASK_COMPLETE.format(
                     task_id=task_id,
                     duration=self._get_duration(start_time),
                     result_size=self._get_result_size(result_size_bytes),
+                    usage=self._get_usage_summary(usage),
+                    timing=timing.summary(),
                     **task_state.context(),
                 )
             )
 
         except TaskCancelledError as e:
+            outcome = "cancelled"
             response = RunnerTaskError(task_id=task_id, error={"message": str(e)})
             await self._send_message(response)
 
         except SyntaxError as e:
+            outcome = "invalid_code"
             self.logger.warning(f"Task {task_id} failed syntax validation")
             error = {"message": str(e)}
             response = RunnerTaskError(task_id=task_id, error=error)
             await self._send_message(response)
 
         except Exception as e:
+            outcome = self._get_error_outcome(e)
             self.logger.error(f"Task {task_id} failed", exc_info=True)
             error = {
                 "message": getattr(e, "message", str(e)),
@@ -377,9 +543,237 @@ class TaskRunner:
             await self._send_message(response)
 
         finally:
+            metrics.TASK_DURATION.observe(time.time() - start_time, outcome=outcome)
+            self._report_timing(task_id, outcome, timing)
             self.running_tasks.pop(task_id, None)
+            self.offers_needed.set()
             self._reset_idle_timer()
 
+    async def _execute_unsharded(
+        self,
+        task_state: TaskState,
+        task_settings: TaskSettings,
+        code: bytes,
+        timing: TaskTiming,
+    ) -> tuple[ResultSpool, PrintArgs, int, TaskUsage | None]:
+        shared_items: SharedItems | None = None
+
+        try:
+            phase_start = time.monotonic()
+            if SharedItems.is_supported():
+                shared_items = await asyncio.to_thread(
+                    SharedItems.create,
+                    task_settings.items,
+                    by_item=task_settings.node_mode == "per_item",
+                )
+                metrics.TASK_INPUT_SIZE.observe(shared_items.size)
+                items = shared_items
+            else:
+                items = task_settings.items
+            timing.record("items", phase_start)
+
+            worker = self.worker_pool.acquire() if self.worker_pool else None
+
+            if worker is None:
+                process, read_conn, write_conn = self.executor.create_process(
+                    code=code,
+                    node_mode=task_settings.node_mode,
+                    items=items,
+                    security_config=self.security_config,
+                    query=task_settings.query,
+                    stream_print=self.config.stream_print_output,
+                )
+                dispatch = None
+            else:
+                process, read_conn, write_conn = (
+                    worker.process,
+                    worker.read_conn,
+                    worker.write_conn,
+                )
+                dispatch = partial(
+                    worker.dispatch,
+                    code,
+                    task_settings.node_mode,
+                    items,
+                    task_settings.query,
+                    self.config.stream_print_output,
+                )
+
+            task_state.processes = [process]
+            on_print = (
+                partial(self._forward_print, task_state.task_id)
+                if self.config.stream_print_output
+                else None
+            )
+
+            return await self.executor.execute_process(
+                process=process,
+                read_conn=read_conn,
+                write_conn=write_conn,
+                task_timeout=self.config.task_timeout,
+                continue_on_fail=task_settings.continue_on_fail,
+                dispatch=dispatch,
+                max_result_size=self.config.max_payload_size,
+                on_print=on_print,
+                timing=timing,
+            )
+
+        finally:
+            if shared_items is not None:
+                shared_items.close()
+
+    def _get_shard_count(self, task_settings: TaskSettings) -> int:
+        """Subprocesses to run a task across: one per per-item shard, as many as
+        configured, have enough items and fit in the task slots that are free."""
+
+        if task_settings.node_mode != "per_item" or not self.config.is_sharding_enabled:
+            return 1
+
+        free_slots = self.max_concurrency - self.used_slots
+        return max(
+            1,
+            min(
+                self.config.per_item_max_shards,
+                1 + free_slots,  # the slot of the task itself
+                len(task_settings.items) // PER_ITEM_SHARD_MIN_ITEMS,
+            ),
+        )
+
+    async def _execute_sharded(
+        self,
+        task_state: TaskState,
+        task_settings: TaskSettings,
+        code: bytes,
+        shard_count: int,
+        timing: TaskTiming,
+    ) -> tuple[ResultSpool, PrintArgs, int, TaskUsage | None]:
+        """Run a per-item task with its items split across `shard_count` fresh
+        subprocesses, which take as many task slots until it finishes. Print output
+        is not streamed, to be sent in item order once all shards are done."""
+
+        task_state.slots = shard_count
+        shared_items: list[SharedItems] = []
+
+        try:
+            phase_start = time.monotonic()
+            item_shards = self.executor.shard_items(task_settings.items, shard_count)
+            shards: list[tuple[int, Items | SharedItems]] = list(item_shards)
+            if SharedItems.is_supported():
+
+                def share_items():
+                    for _, items in item_shards:
+                        shared_items.append(SharedItems.create(items, by_item=True))
+
+                await asyncio.to_thread(share_items)
+                metrics.TASK_INPUT_SIZE.observe(sum(s.size for s in shared_items))
+                shards = [
+                    (offset, shared)
+                    for (offset, _), shared in zip(item_shards, shared_items)
+                ]
+            timing.record("items", phase_start)
+
+            processes = [
+                self.executor.create_process(
+                    code=code,
+                    node_mode=task_settings.node_mode,
+                    items=items,
+                    security_config=self.security_config,
+                    item_offset=offset,
+                )
+                for offset, items in shards
+            ]
+            task_state.processes = [process for process, _, _ in processes]
+
+            return await self.executor.execute_sharded(
+                processes,
+                task_timeout=self.config.task_timeout,
+                continue_on_fail=task_settings.continue_on_fail,
+                max_result_size=self.config.max_payload_size,
+                timing=timing,
+            )
+
+        finally:
+            for shared in shared_items:
+                shared.close()
+
+    async def _validate_and_compile(
+        self, task_settings: TaskSettings, timing: TaskTiming
+    ) -> bytes:
+        """Validate and compile the code of a task. Code cached in memory is served
+        on the event loop, other code in the validation pool, so that parsing and
+        walking it does not stall the connection for all other tasks."""
+
+        phase_start = time.monotonic()
+        validated = self.analyzer.validate_cached(task_settings.code)
+        if validated:
+            code = self.executor.get_cached_code(
+                task_settings.code, task_settings.node_mode
+            )
+            if code is not None:
+                timing.record("validation", phase_start)
+                return code
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self.validation_pool,
+            partial(
+                self._validate_and_compile_uncached,
+                task_settings,
+                validated,
+                phase_start,
+            ),
+        )
+        try:
+            code, phases = await asyncio.wait_for(future, VALIDATION_TIMEOUT)
+        except asyncio.TimeoutError:
+            # the thread runs on to completion, its result is cached for next time
+            raise CodeValidationTimeoutError(VALIDATION_TIMEOUT)
+
+        timing.phases.update(phases)
+        return code
+
+    def _validate_and_compile_uncached(
+        self, task_settings: TaskSettings, validated: bool, phase_start: float
+    ) -> tuple[bytes, dict[str, float]]:
+        # Timed separately, to be merged on the event loop only if not timed out.
+        # From `phase_start`, to include any wait for a thread in the pool.
+        timing = TaskTiming()
+
+        tree = None if validated else self.analyzer.validate(task_settings.code)
+        phase_start = timing.record("validation", phase_start)
+
+        code = self.executor.compile_code(
+            task_settings.code, task_settings.node_mode, tree, self.code_cache
+        )
+        timing.record("compile", phase_start)
+        return code, timing.phases
+
+    def _report_timing(self, task_id: str, outcome: str, timing: TaskTiming) -> None:
+        timing.finish()
+
+        for phase, duration in timing.phases.items():
+            metrics.TASK_PHASE_DURATION.observe(duration, phase=phase)
+
+        if self.on_task_timing is None:
+            return
+
+        try:
+            self.on_task_timing(task_id, outcome, timing)
+        except Exception as e:
+            self.logger.warning(f"Failed to report timing of task {task_id}: {e}")
+
+    @staticmethod
+    def _get_error_outcome(e: Exception) -> str:
+        if isinstance(e, (TaskTimeoutError, CodeValidationTimeoutError)):
+            return "timeout"
+        if isinstance(e, TaskKilledError):
+            return "killed"
+        if isinstance(e, TaskResourceLimitError):
+            return "resource_limit"
+        if isinstance(e, SecurityViolationError):
+            return "invalid_code"
+        return "error"
+
     async def _handle_task_cancel(self, message: BrokerTaskCancel) -> None:
         task_id = message.task_id
         task_state = self.running_tasks.get(task_id)
@@ -391,16 +785,46 @@ class TaskRunner:
         if task_state.status == TaskStatus.WAITING_FOR_SETTINGS:
             self.running_tasks.pop(task_id, None)
             self.logger.info(LOG_TASK_CANCEL_WAITING.format(task_id=task_id))
-            await self._send_offers()
+            self.offers_needed.set()
             return
 
         if task_state.status == TaskStatus.RUNNING:
             task_state.status = TaskStatus.ABORTING
-            await asyncio.to_thread(self.executor.stop_process, task_state.process)
+            await asyncio.gather(
+                *(
+                    asyncio.to_thread(self.executor.stop_process, process)
+                    for process in task_state.processes
+                )
+            )
             self.logger.info(
                 LOG_TASK_CANCEL.format(task_id=task_id, **task_state.context())
             )
 
+    async def _forward_print(self, task_id: str, args: list[str]) -> None:
+        # Awaited by the pipe reader before it reads on, so that a subprocess
+        # printing faster than the connection can send is held up by the pipe
+        # filling rather than buffered here.
+        try:
+            await self._send_rpc_message(task_id, RPC_BROWSER_CONSOLE_LOG_METHOD, args)
+        except Exception as e:
+            self.logger.warning(
+                f"Failed to forward print output of task {task_id}: {e}"
+            )
+
+    async def _send_print_args(self, task_id: str, print_args: PrintArgs) -> None:
+        if CAPABILITY_CONSOLE_LOG_BATCH in self.capabilities:
+            for start in range(0, len(print_args), RPC_BROWSER_CONSOLE_LOG_BATCH_SIZE):
+                batch = print_args[start : start + RPC_BROWSER_CONSOLE_LOG_BATCH_SIZE]
+                await self._send_rpc_message(
+                    task_id, RPC_BROWSER_CONSOLE_LOG_BATCH_METHOD, batch
+                )
+            return
+
+        for print_args_per_call in print_args:
+            await self._send_rpc_message(
+                task_id, RPC_BROWSER_CONSOLE_LOG_METHOD, print_args_per_call
+            )
+
     async def _send_rpc_message(self, task_id: str, method_name: str, params: list):
         message = RunnerRpcCall(
             call_id=nanoid(), task_id=task_id, name=method_name, params=params
@@ -412,8 +836,20 @@ class TaskRunner:
         if self.websocket_connection is None:
             raise WebsocketConnectionError(self.task_broker_uri)
 
-        serialized = self.serde.serialize_runner_message(message)
-        await self.websocket_connection.send(serialized)
+        # sends queue up behind one another, as a fragmented message holds the
+        # connection until its last fragment is sent
+        metrics.WEBSOCKET_SEND_QUEUE_DEPTH.inc()
+        try:
+            if isinstance(message, RunnerTaskDone):
+                # sent as a fragmented message, so the result is never held whole
+                fragments = self.serde.serialize_task_done(message)
+                await self.websocket_connection.send(fragments)
+                return
+
+            serialized = self.serde.serialize_runner_message(message)
+            await self.websocket_connection.send(serialized)
+        finally:
+            metrics.WEBSOCKET_SEND_QUEUE_DEPTH.dec()
 
     # ========== Formatting ==========
 
@@ -436,45 +872,72 @@ class TaskRunner:
         else:
             return f"{size_bytes / (1024 * 1024):.1f} MB"
 
+    def _get_usage_summary(self, usage: TaskUsage | None) -> str:
+        if usage is None:
+            return "no resource usage reported"
+
+        return (
+            f"CPU {usage['user_cpu']:.2f}s user, {usage['system_cpu']:.2f}s sys, "
+            f"max RSS {usage['max_rss'] / (1024 * 1024):.1f} MB, "
+            f"context switches {usage['voluntary_switches']} voluntary, "
+            f"{usage['involuntary_switches']} involuntary"
+        )
+
     # ========== Offers ==========
 
     async def _send_offers_loop(self) -> None:
+        """Send offers whenever a slot frees up or an open offer expires."""
+
         while self.can_send_offers:
             try:
+                self.offers_needed.clear()
                 await self._send_offers()
-                await asyncio.sleep(OFFER_INTERVAL)
+                await self._wait_for_offers_needed()
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 self.logger.error(f"Error sending offers: {e}")
+                await asyncio.sleep(OFFER_RETRY_INTERVAL)
+
+    async def _wait_for_offers_needed(self) -> None:
+        timeout = None
+        if self.offer_expiries:
+            timeout = max(0.0, self.offer_expiries[0][0] - time.time())
+
+        try:
+            async with asyncio.timeout(timeout):
+                await self.offers_needed.wait()
+        except TimeoutError:
+            pass  # an open offer expired
 
     async def _send_offers(self) -> None:
         if not self.can_send_offers:
             return
 
-        expired_offer_ids = [
-            offer_id
-            for offer_id, offer in self.open_offers.items()
-            if offer.has_expired
-        ]
+        now = time.time()
 
-        for offer_id in expired_offer_ids:
-            self.open_offers.pop(offer_id, None)
+        while self.offer_expiries and self.offer_expiries[0][0] <= now:
+            _, offer_id = heapq.heappop(self.offer_expiries)
+            self.open_offers.pop(offer_id, None)  # unless already accepted
 
-        offers_to_send = self.config.max_concurrency - (
-            len(self.open_offers) + self.running_tasks_count
+        offers_to_send = self.max_concurrency - (
+            len(self.open_offers) + self.used_slots
         )
 
+        if offers_to_send <= 0:
+            return
+
+        validity, latency_buffer = self._get_offer_timing()
+
         for _ in range(offers_to_send):
             offer_id = nanoid()
 
-            valid_for_ms = OFFER_VALIDITY + random.randint(0, OFFER_VALIDITY_MAX_JITTER)
+            valid_for_ms = validity + random.randint(0, OFFER_VALIDITY_MAX_JITTER)
 
-            valid_until = (
-                time.time() + (valid_for_ms / 1000) + OFFER_VALIDITY_LATENCY_BUFFER
-            )
+            valid_until = time.time() + (valid_for_ms / 1000) + latency_buffer
 
             self.open_offers[offer_id] = TaskOffer(offer_id, valid_until)
+            heapq.heappush(self.offer_expiries, (valid_until, offer_id))
 
             message = RunnerTaskOffer(
                 offer_id=offer_id, task_type=TASK_TYPE_PYTHON, valid_for=valid_for_ms
@@ -482,6 +945,23 @@ class TaskRunner:
 
             await self._send_message(message)
 
+    def _get_offer_timing(self) -> tuple[int, float]:
+        """Offer validity in ms, and how long past it to still accept the offer
+        in seconds, scaled to the round trip to the broker as last measured by a
+        websocket ping. Longer round trips get longer lived offers, so that fewer
+        of them expire in transit, and more time for acceptances to arrive."""
+
+        rtt = self.websocket_connection.latency if self.websocket_connection else 0.0
+
+        validity = int(rtt * 1000 * OFFER_VALIDITY_RTT_MULTIPLIER)
+        validity = min(max(validity, OFFER_VALIDITY), OFFER_VALIDITY_MAX)
+        latency_buffer = max(
+            rtt * OFFER_VALIDITY_LATENCY_BUFFER_RTT_MULTIPLIER,
+            OFFER_VALIDITY_LATENCY_BUFFER,
+        )
+
+        return validity, latency_buffer
+
     # ========== Inactivity ==========
 
     def _reset_idle_timer(self):
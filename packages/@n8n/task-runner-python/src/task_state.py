@@ -13,7 +13,9 @@ class TaskStatus(Enum):
 class TaskState:
     task_id: str
     status: TaskStatus
-    process: ForkServerProcess | None = None
+    # subprocesses running the task, one per shard of its items if sharded
+    processes: list[ForkServerProcess]
+    slots: int  # task slots taken, one more per shard beyond the first
     workflow_name: str | None = None
     workflow_id: str | None = None
     node_name: str | None = None
@@ -22,7 +24,8 @@ class TaskState:
     def __init__(self, task_id: str):
         self.task_id = task_id
         self.status = TaskStatus.WAITING_FOR_SETTINGS
-        self.process = None
+        self.processes = []
+        self.slots = 1
         self.workflow_name = None
         self.workflow_id = None
         self.node_name = None
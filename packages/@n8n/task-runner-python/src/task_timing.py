@@ -0,0 +1,73 @@
+import time
+from dataclasses import dataclass, field
+
+from src.message_types.pipe import TaskTimestamps
+
+
+@dataclass
+class TaskTiming:
+    """Time spent in each phase of running a task, in seconds, in the order the
+    phases ran, for as far as the task got:
+
+    - `validation`: checking the code for security violations
+    - `compile`: compiling the code, unless cached
+    - `items`: passing the input items to shared memory
+    - `spawn`: starting the subprocess, or dispatching to a pooled one
+    - `sandbox`: hardening the subprocess and loading items
+    - `user_code`: running the code
+    - `serialization`: serializing the result and writing it to the pipe
+    - `pipe_transfer`: the runner receiving the rest of the result
+    - `send`: sending the result to the broker
+
+    Phases are timed on the monotonic clock, which the subprocess shares, so
+    that it can send back timestamps of its phases with its result.
+    """
+
+    started_at: float = field(default_factory=time.time)  # wall clock, for tracing
+    finished_at: float | None = None  # wall clock
+    phases: dict[str, float] = field(default_factory=dict)
+
+    def record(self, phase: str, since: float) -> float:
+        """Record a phase that ran from `since` until now, returning now as the
+        start of the next phase."""
+
+        now = time.monotonic()
+        self.phases[phase] = max(0.0, now - since)
+        return now
+
+    def record_subprocess(
+        self, spawn_started: float, timestamps: TaskTimestamps, received: float
+    ) -> None:
+        """Record the phases of the subprocess, from when the runner started it
+        until it received the whole result."""
+
+        boundaries = {
+            "spawn": (spawn_started, timestamps["started"]),
+            "sandbox": (timestamps["started"], timestamps["code_started"]),
+            "user_code": (timestamps["code_started"], timestamps["code_finished"]),
+            "serialization": (timestamps["code_finished"], timestamps["finished"]),
+            "pipe_transfer": (timestamps["finished"], received),
+        }
+
+        for phase, (start, end) in boundaries.items():
+            self.phases[phase] = max(0.0, end - start)
+
+    def record_concurrent(self, timings: list["TaskTiming"]) -> None:
+        """Record the phases of subprocesses that ran at the same time, each as the
+        longest across them, as that is how long the task waited on it."""
+
+        for timing in timings:
+            for phase, duration in timing.phases.items():
+                self.phases[phase] = max(duration, self.phases.get(phase, 0.0))
+
+    def finish(self) -> None:
+        self.finished_at = time.time()
+
+    def summary(self) -> str:
+        if not self.phases:
+            return "no phases timed"
+
+        return ", ".join(
+            f"{phase.replace('_', ' ')} {duration * 1000:.1f}ms"
+            for phase, duration in self.phases.items()
+        )
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing import reduction
+from multiprocessing.context import ForkServerProcess
+
+from src.config.security_config import SecurityConfig
+from src.message_types.broker import Items, NodeMode, Query
+from src.metrics import SUBPROCESS_SPAWN_DURATION
+from src.shared_items import SharedItems
+from src.task_executor import PipeConnection, TaskExecutor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PooledWorker:
+    process: ForkServerProcess
+    task_conn: PipeConnection
+    read_conn: PipeConnection
+    write_conn: PipeConnection
+
+    def dispatch(
+        self,
+        code: bytes,
+        node_mode: NodeMode,
+        items: Items | SharedItems,
+        query: Query = None,
+        stream_print: bool = False,
+    ) -> None:
+        """Hand a task to the waiting subprocess, which starts executing it on receipt.
+        Takes `code` as compiled by `TaskExecutor.compile_code`."""
+
+        try:
+            if isinstance(items, SharedItems):
+                shared = (items.size, items.by_item)
+                self.task_conn.send((code, node_mode, shared, query, stream_print))
+                reduction.send_handle(self.task_conn, items.fd, self.process.pid)
+            else:
+                self.task_conn.send((code, node_mode, items, query, stream_print))
+        finally:
+            self.task_conn.close()
+
+    def close(self) -> None:
+        for conn in (self.task_conn, self.read_conn, self.write_conn):
+            try:
+                conn.close()
+            except OSError as e:
+                logger.warning(f"Failed to close pipe of pooled worker: {e}")
+
+
+class WorkerPool:
+    """Keeps hardened subprocesses spawned ahead of time, so that spawning is off
+    the critical path of a task. Each worker serves exactly one task and is
+    replaced in the background, at most `refill_rate` workers per second."""
+
+    def __init__(self, security_config: SecurityConfig, size: int, refill_rate: int):
+        self.security_config = security_config
+        self.size = size
+        self.refill_interval = 1 / refill_rate
+        self.idle_workers: deque[PooledWorker] = deque()
+        self.refill_needed = asyncio.Event()
+        self.refill_coroutine: asyncio.Task | None = None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def idle_count(self) -> int:
+        return len(self.idle_workers)
+
+    def start(self) -> None:
+        if self.refill_coroutine is None:
+            self.refill_coroutine = asyncio.create_task(self._refill_loop())
+
+    async def stop(self) -> None:
+        if self.refill_coroutine and not self.refill_coroutine.done():
+            self.refill_coroutine.cancel()
+            try:
+                await self.refill_coroutine
+            except asyncio.CancelledError:
+                pass
+        self.refill_coroutine = None
+
+        workers = list(self.idle_workers)
+        self.idle_workers.clear()
+
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._discard, worker) for worker in workers),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                self.logger.error("Error stopping pooled worker", exc_info=result)
+
+    def acquire(self) -> PooledWorker | None:
+        """Take an idle worker out of the pool, or `None` if none is ready."""
+
+        self.refill_needed.set()
+
+        while self.idle_workers:
+            worker = self.idle_workers.popleft()
+            if worker.process.is_alive():
+                return worker
+            self.logger.warning(
+                f"Discarding pooled worker that exited with code {worker.process.exitcode}"
+            )
+            self._discard(worker)
+
+        return None
+
+    async def _refill_loop(self) -> None:
+        while True:
+            try:
+                if self.idle_count >= self.size:
+                    self.refill_needed.clear()
+                    await self.refill_needed.wait()
+                    continue
+
+                worker = await asyncio.to_thread(self._spawn)
+                self.idle_workers.append(worker)
+                await asyncio.sleep(self.refill_interval)
+            except asyncio.CancelledError:
+                break
+            except (OSError, EOFError) as e:
+                self.logger.error(f"Error spawning pooled worker: {e}")
+                await asyncio.sleep(self.refill_interval)
+            except Exception:
+                self.logger.exception("Unexpected error spawning pooled worker")
+                await asyncio.sleep(self.refill_interval)
+
+    def _spawn(self) -> PooledWorker:
+        process, task_read_conn, task_write_conn, read_conn, write_conn = (
+            TaskExecutor.create_pooled_process(self.security_config)
+        )
+
+        try:
+            spawn_start = time.perf_counter()
+            process.start()
+            SUBPROCESS_SPAWN_DURATION.observe(
+                time.perf_counter() - spawn_start, source="pool"
+            )
+        except Exception:
+            for conn in (task_write_conn, read_conn, write_conn):
+                conn.close()
+            raise
+        finally:
+            task_read_conn.close()  # subprocess holds its own end
+
+        return PooledWorker(process, task_write_conn, read_conn, write_conn)
+
+    def _discard(self, worker: PooledWorker) -> None:
+        worker.close()  # subprocess sees EOF on the task pipe and exits
+        TaskExecutor.stop_process(worker.process)
@@ -23,7 +23,8 @@ class ActiveTask:
 
 
 class LocalTaskBroker:
-    def __init__(self):
+    def __init__(self, capabilities: list[str] | None = None):
+        self.capabilities = capabilities  # offered to runners, if any
         self.port: int | None = None
         self.app = web.Application()
         self.runner: web.AppRunner | None = None
@@ -70,7 +71,10 @@ class LocalTaskBroker:
         sender_coroutine = asyncio.create_task(self._message_sender(connection_id, ws))
 
         try:
-            await self.send_to_connection(connection_id, {"type": "broker:inforequest"})
+            info_request: WebsocketMessage = {"type": "broker:inforequest"}
+            if self.capabilities is not None:
+                info_request["capabilities"] = self.capabilities
+            await self.send_to_connection(connection_id, info_request)
 
             async for message in ws:
                 if message.type == web_ws.WSMsgType.TEXT:
@@ -12,8 +12,9 @@ NODE_MODE_TO_BROKER_STYLE = {v: k for k, v in NODE_MODE_MAP.items()}
 
 
 @pytest_asyncio.fixture
-async def broker():
-    broker = LocalTaskBroker()
+async def broker(request):
+    # capabilities to offer can be passed with indirect parametrization
+    broker = LocalTaskBroker(capabilities=getattr(request, "param", None))
     await broker.start()
     yield broker
     await broker.stop()
@@ -40,6 +41,19 @@ async def manager_with_stdlib_wildcard(broker):
     await manager.stop()
 
 
+@pytest_asyncio.fixture
+async def manager_with_small_max_payload(broker):
+    manager = TaskRunnerManager(
+        task_broker_url=broker.get_url(),
+        custom_env={
+            "N8N_RUNNERS_MAX_PAYLOAD": "65536",
+        },
+    )
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
 @pytest_asyncio.fixture
 async def manager_with_env_access_blocked(broker):
     manager = TaskRunnerManager(
@@ -101,6 +115,79 @@ async def manager_pandas_transitive(broker):
     await manager.stop()
 
 
+@pytest_asyncio.fixture
+async def manager_pandas_strict_preloaded(broker):
+    manager = TaskRunnerManager(
+        task_broker_url=broker.get_url(),
+        custom_env={
+            "N8N_RUNNERS_STDLIB_ALLOW": "*",
+            "N8N_RUNNERS_EXTERNAL_ALLOW": "pandas",
+            "N8N_RUNNERS_TASK_TIMEOUT": "30",
+            "N8N_RUNNERS_FORKSERVER_PRELOAD": "true",
+        },
+    )
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
+@pytest_asyncio.fixture
+async def manager_pandas_transitive_preloaded(broker):
+    manager = TaskRunnerManager(
+        task_broker_url=broker.get_url(),
+        custom_env={
+            "N8N_RUNNERS_STDLIB_ALLOW": "*",
+            "N8N_RUNNERS_EXTERNAL_ALLOW": "pandas",
+            "N8N_RUNNERS_TASK_TIMEOUT": "30",
+            "N8N_RUNNERS_ALLOW_TRANSITIVE_IMPORTS": "true",
+            "N8N_RUNNERS_FORKSERVER_PRELOAD": "true",
+        },
+    )
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
+@pytest_asyncio.fixture
+async def manager_with_worker_pool(broker):
+    manager = TaskRunnerManager(
+        task_broker_url=broker.get_url(),
+        custom_env={
+            "N8N_RUNNERS_WORKER_POOL_SIZE": "2",
+        },
+    )
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
+@pytest_asyncio.fixture
+async def manager_with_sharding(broker):
+    manager = TaskRunnerManager(
+        task_broker_url=broker.get_url(),
+        custom_env={
+            "N8N_RUNNERS_PER_ITEM_MAX_SHARDS": "3",
+        },
+    )
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
+@pytest_asyncio.fixture
+async def manager_with_print_streaming(broker):
+    manager = TaskRunnerManager(
+        task_broker_url=broker.get_url(),
+        custom_env={
+            "N8N_RUNNERS_STDLIB_ALLOW": "time",
+            "N8N_RUNNERS_STREAM_PRINT_OUTPUT": "true",
+        },
+    )
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
 def create_task_settings(
     code: str,
     node_mode: str,
@@ -138,4 +225,11 @@ def get_browser_console_msgs(broker: LocalTaskBroker, task_id: str) -> list[list
     for msg in broker.get_task_rpc_messages(task_id):
         if msg.get("method") == "logNodeOutput":
             console_msgs.append(msg.get("params", []))
+        elif msg.get("method") == "logNodeOutputBatch":
+            console_msgs.extend(msg.get("params", []))
+
+    for msg in broker.get_messages_of_type("runner:taskdone"):
+        if msg.get("taskId") == task_id:
+            console_msgs.extend(msg["data"].get("consoleLogs", []))
+
     return console_msgs
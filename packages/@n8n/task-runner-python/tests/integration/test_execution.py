@@ -75,6 +75,47 @@ async def test_all_items_with_continue_on_fail(broker, manager):
     assert "Intentional error" in str(done_msg["data"]["result"][0]["json"]["error"])
 
 
+@pytest.mark.asyncio
+async def test_all_items_with_result_over_several_chunks(broker, manager):
+    task_id = nanoid()
+    code = "return [{'json': {'index': i, 'text': 'é' * 250}} for i in range(3000)]"
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id)
+
+    result = done_msg["data"]["result"]
+    assert len(result) == 3000
+    assert [item["json"]["index"] for item in result] == list(range(3000))
+    assert result[-1]["json"]["text"] == "é" * 250
+
+
+@pytest.mark.asyncio
+async def test_all_items_with_non_list_result(broker, manager):
+    task_id = nanoid()
+    code = "return {'json': {'single': True}}"
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id)
+
+    assert done_msg["data"]["result"] == {"json": {"single": True}}
+
+
+@pytest.mark.asyncio
+async def test_all_items_with_result_over_max_payload(
+    broker, manager_with_small_max_payload
+):
+    task_id = nanoid()
+    code = "return [{'json': {'text': 'x' * 1000}} for _ in range(100)]"
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    error_msg = await wait_for_task_error(broker, task_id)
+
+    assert "exceeds the maximum payload size" in error_msg["error"]["message"]
+
+
 # ========== per_item mode ==========
 
 
@@ -607,3 +648,91 @@ async def test_user_code_import_still_gated_with_opt_in(
 
     assert error_msg["taskId"] == task_id
     assert "security violation" in str(error_msg["error"]["message"]).lower()
+
+
+# ========== forkserver preload (N8N_RUNNERS_FORKSERVER_PRELOAD) ==========
+
+
+@pytest.mark.asyncio
+async def test_preloaded_package_transitive_import_rejected_by_default(
+    broker, manager_pandas_strict_preloaded
+):
+    # Preloading runs under the same import guard as a task, so a package that
+    # a task could not import does not become importable by being preloaded.
+    pytest.importorskip("pandas")
+    task_id = nanoid()
+    code = "import pandas\nreturn [{'json': {'ok': True}}]"
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    error_msg = await wait_for_task_error(broker, task_id, timeout=30)
+
+    assert error_msg["taskId"] == task_id
+    assert "security violation" in str(error_msg["error"]["message"]).lower()
+
+
+@pytest.mark.asyncio
+async def test_preloaded_package_usable_when_opted_in(
+    broker, manager_pandas_transitive_preloaded
+):
+    pytest.importorskip("pandas")
+    task_id = nanoid()
+    code = (
+        "import pandas\nreturn [{'json': {'sum': int(pandas.Series([1, 2, 3]).sum())}}]"
+    )
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    result = await wait_for_task_done(broker, task_id, timeout=30)
+
+    assert result["data"]["result"] == [{"json": {"sum": 6}}]
+
+
+# ========== sharding (N8N_RUNNERS_PER_ITEM_MAX_SHARDS) ==========
+
+
+@pytest.mark.asyncio
+async def test_per_item_sharded_across_subprocesses(broker, manager_with_sharding):
+    task_id = nanoid()
+    items = [{"json": {"value": i}} for i in range(3000)]
+    code = "if _item['json']['value'] % 2:\n    return None\nreturn _item"
+    task_settings = create_task_settings(code=code, node_mode="per_item", items=items)
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    result = await wait_for_task_done(broker, task_id)
+
+    assert result["data"]["result"] == [
+        {"json": {"value": i}, "pairedItem": {"item": i}} for i in range(0, 3000, 2)
+    ]
+
+
+# ========== worker pool (N8N_RUNNERS_WORKER_POOL_SIZE) ==========
+
+
+@pytest.mark.asyncio
+async def test_all_items_with_worker_pool(broker, manager_with_worker_pool):
+    task_id = nanoid()
+    items = [{"json": {}}, {"json": {}}]
+    code = "print('pooled')\nreturn [{'json': {'count': len(_items)}}]"
+    task_settings = create_task_settings(code=code, node_mode="all_items", items=items)
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    result = await wait_for_task_done(broker, task_id)
+
+    assert result["data"]["result"] == [{"json": {"count": 2}}]
+
+
+@pytest.mark.asyncio
+async def test_per_item_with_worker_pool(broker, manager_with_worker_pool):
+    task_id = nanoid()
+    items = [{"json": {"value": 1}}, {"json": {"value": 2}}]
+    code = "return {'value': _item['json']['value'] + 1}"
+    task_settings = create_task_settings(code=code, node_mode="per_item", items=items)
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    result = await wait_for_task_done(broker, task_id)
+
+    assert result["data"]["result"] == [
+        {"json": {"value": 2}, "pairedItem": {"item": 0}},
+        {"json": {"value": 3}, "pairedItem": {"item": 1}},
+    ]
@@ -5,7 +5,7 @@ import aiohttp
 import pytest
 from src.nanoid import nanoid
 
-from tests.integration.conftest import create_task_settings
+from tests.integration.conftest import create_task_settings, wait_for_task_done
 
 
 @pytest.mark.asyncio
@@ -38,3 +38,42 @@ async def test_health_check_server_ressponds_mid_execution(broker, manager):
         response = await session.get(manager.get_health_check_url())
         assert response.status == 200
         assert await response.text() == "OK"
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_completed_task(broker, manager):
+    task_id = nanoid()
+    task_settings = create_task_settings(
+        code="return [{'a': 1}]", node_mode="all_items", items=[{"json": {}}]
+    )
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+    await wait_for_task_done(broker, task_id)
+
+    async with aiohttp.ClientSession() as session:
+        response = await session.get(f"{manager.get_health_check_url()}/metrics")
+        assert response.status == 200
+        assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        metrics = await response.text()
+
+    assert 'n8n_runner_task_duration_seconds_count{outcome="success"} 1' in metrics
+    for phase in (
+        "validation",
+        "compile",
+        "items",
+        "spawn",
+        "sandbox",
+        "user_code",
+        "serialization",
+        "pipe_transfer",
+        "send",
+    ):
+        assert f'n8n_runner_task_phase_duration_seconds_count{{phase="{phase}"}} 1' in (
+            metrics
+        )
+    assert "n8n_runner_task_result_size_bytes_count 1" in metrics
+    assert "n8n_runner_task_input_size_bytes_count 1" in metrics
+    assert 'n8n_runner_subprocess_spawn_seconds_count{source="task"} 1' in metrics
+    assert "n8n_runner_tasks_accepted_total 1" in metrics
+    assert "n8n_runner_running_tasks 0" in metrics
+    assert "n8n_runner_websocket_send_queue_depth 0" in metrics
+    assert 'n8n_runner_validation_cache_lookups_total{result="miss"} 1' in metrics
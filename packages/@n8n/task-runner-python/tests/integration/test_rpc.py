@@ -114,3 +114,99 @@ async def test_print_edge_cases(broker, manager):
     expected = ["世界", "🌍", "🚀", "你好", "[]", "{}"]
     for item in expected:
         assert item in all_output, f"Expected '{item}' not found in console output"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("broker", [["consoleLogBatch"]], indirect=True)
+async def test_print_batched_when_broker_offers_console_log_batch(broker, manager):
+    task_id = nanoid()
+    code = textwrap.dedent("""
+        for i in range(60):
+            print("line", i)
+        return [{"printed": "ok"}]
+    """)
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id, timeout=5.0)
+
+    assert done_msg["data"]["result"] == [{"printed": "ok"}]
+    assert broker.get_messages_of_type("runner:info")[0]["capabilities"] == [
+        "consoleLogBatch"
+    ]
+    rpc_msgs = broker.get_task_rpc_messages(task_id)
+    assert [msg["method"] for msg in rpc_msgs] == ["logNodeOutputBatch"] * 3
+    assert get_browser_console_msgs(broker, task_id) == [
+        ["'line'", str(i)] for i in range(60)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "broker", [["consoleLogBatch", "consoleLogInTaskDone"]], indirect=True
+)
+async def test_print_in_task_done_when_broker_offers_it(broker, manager):
+    task_id = nanoid()
+    code = textwrap.dedent("""
+        print("first")
+        print("second", 2)
+        return [{"printed": "ok"}]
+    """)
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id, timeout=5.0)
+
+    assert done_msg["data"]["result"] == [{"printed": "ok"}]
+    assert done_msg["data"]["consoleLogs"] == [["'first'"], ["'second'", "2"]]
+    assert broker.get_task_rpc_messages(task_id) == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("broker", [["unknownCapability"]], indirect=True)
+async def test_print_per_call_when_broker_offers_no_known_capability(broker, manager):
+    task_id = nanoid()
+    code = "print('a')\nprint('b')\nreturn []"
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    await wait_for_task_done(broker, task_id, timeout=5.0)
+
+    assert broker.get_messages_of_type("runner:info")[0]["capabilities"] == []
+    assert broker.get_task_rpc_messages(task_id) == [
+        {"method": "logNodeOutput", "params": ["'a'"]},
+        {"method": "logNodeOutput", "params": ["'b'"]},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_print_streamed_while_task_runs(broker, manager_with_print_streaming):
+    task_id = nanoid()
+    code = textwrap.dedent("""
+        import time
+        print("started")
+        time.sleep(1)
+        for i in range(105):
+            print(i)
+        return [{"printed": "ok"}]
+    """)
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    rpc_msg = await broker.wait_for_msg(
+        "runner:rpc",
+        timeout=0.8,
+        predicate=lambda msg: msg.get("taskId") == task_id,
+    )
+
+    assert rpc_msg is not None, "print output should arrive before the task ends"
+    assert broker.get_messages_of_type("runner:taskdone") == []
+
+    done_msg = await wait_for_task_done(broker, task_id, timeout=5.0)
+
+    assert done_msg["data"]["result"] == [{"printed": "ok"}]
+    assert get_browser_console_msgs(broker, task_id) == [
+        ["'started'"],
+        *[[str(i)] for i in range(99)],
+        ["[Output truncated - 6 more print statements]"],
+    ]
@@ -0,0 +1,170 @@
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.adaptive_concurrency import (
+    AdaptiveConcurrency,
+    read_cpu_limit,
+    read_memory_limit,
+    read_pressure,
+)
+
+MB = 1024 * 1024
+
+PRESSURE = """some avg10={avg10} avg60=1.00 avg300=0.50 total=123456
+full avg10=0.00 avg60=0.00 avg300=0.00 total=0
+"""
+
+
+@pytest.fixture(autouse=True)
+def cpus_available():
+    with patch("os.sched_getaffinity", return_value=set(range(16))):
+        yield
+
+
+def make_cgroup(path: Path, cpu_max: str = "max 100000", memory_max: str = "max"):
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "cpu.max").write_text(f"{cpu_max}\n")
+    (path / "memory.max").write_text(f"{memory_max}\n")
+    return path
+
+
+def make_concurrency(
+    tmp_path: Path,
+    cpu_max: str = "400000 100000",
+    memory_max: str = "max",
+    running_count: int = 0,
+) -> AdaptiveConcurrency:
+    make_cgroup(tmp_path / "cgroup", cpu_max, memory_max)
+    (tmp_path / "pressure").mkdir()
+    set_pressure(tmp_path, cpu=0.0, memory=0.0)
+
+    return AdaptiveConcurrency(
+        get_task_pids=lambda: [],
+        get_running_count=lambda: running_count,
+        on_change=Mock(),
+        cgroup_root=tmp_path / "cgroup",
+        pressure_dir=tmp_path / "pressure",
+    )
+
+
+def set_pressure(tmp_path: Path, cpu: float, memory: float):
+    (tmp_path / "pressure" / "cpu").write_text(PRESSURE.format(avg10=cpu))
+    (tmp_path / "pressure" / "memory").write_text(PRESSURE.format(avg10=memory))
+
+
+class TestReadLimits:
+    def test_cpu_limit_from_quota(self, tmp_path):
+        cgroup = make_cgroup(tmp_path, cpu_max="150000 100000")
+
+        assert read_cpu_limit([cgroup]) == 1.5
+
+    def test_cpu_limit_from_tightest_quota(self, tmp_path):
+        inner = make_cgroup(tmp_path / "inner", cpu_max="400000 100000")
+        outer = make_cgroup(tmp_path, cpu_max="50000 100000")
+
+        assert read_cpu_limit([inner, outer]) == 0.5
+
+    def test_cpu_limit_without_quota_is_cpus_available(self, tmp_path):
+        cgroup = make_cgroup(tmp_path, cpu_max="max 100000")
+
+        assert read_cpu_limit([cgroup]) == 16
+
+    def test_memory_limit_from_tightest_limit(self, tmp_path):
+        inner = make_cgroup(tmp_path / "inner", memory_max=str(512 * MB))
+        outer = make_cgroup(tmp_path, memory_max=str(256 * MB))
+
+        assert read_memory_limit([inner, outer]) == 256 * MB
+
+    def test_memory_limit_unlimited(self, tmp_path):
+        cgroup = make_cgroup(tmp_path, memory_max="max")
+
+        assert read_memory_limit([cgroup]) is None
+        assert read_memory_limit([]) is None
+
+    def test_pressure(self, tmp_path):
+        (tmp_path / "cpu").write_text(PRESSURE.format(avg10=12.5))
+
+        assert read_pressure(tmp_path / "cpu") == 12.5
+        assert read_pressure(tmp_path / "missing") is None
+
+
+class TestAdaptiveConcurrency:
+    def test_sized_from_cpu_quota(self, tmp_path):
+        concurrency = make_concurrency(tmp_path, cpu_max="400000 100000")
+
+        assert concurrency.limit == 8
+
+    def test_sized_from_memory_limit(self, tmp_path):
+        concurrency = make_concurrency(tmp_path, memory_max=str(128 * MB + 192 * MB))
+
+        assert concurrency.limit == 3
+
+    def test_shrinks_under_cpu_pressure(self, tmp_path):
+        concurrency = make_concurrency(tmp_path)
+        set_pressure(tmp_path, cpu=75.0, memory=0.0)
+
+        with patch.object(concurrency, "logger") as mock_logger:
+            concurrency.adjust()
+
+        assert concurrency.limit == 7
+        concurrency.on_change.assert_called_once()  # type: ignore[attr-defined]
+        assert "CPU pressure at 75.0%" in mock_logger.info.call_args[0][0]
+
+    def test_shrinks_under_memory_pressure(self, tmp_path):
+        concurrency = make_concurrency(tmp_path)
+        set_pressure(tmp_path, cpu=0.0, memory=15.0)
+
+        concurrency.adjust()
+
+        assert concurrency.limit == 7
+
+    def test_never_shrinks_below_one_slot(self, tmp_path):
+        concurrency = make_concurrency(tmp_path, cpu_max="10000 100000")
+        set_pressure(tmp_path, cpu=90.0, memory=0.0)
+
+        concurrency.adjust()
+
+        assert concurrency.limit == 1
+        concurrency.on_change.assert_not_called()  # type: ignore[attr-defined]
+
+    @pytest.mark.parametrize(
+        "running_count,cpu_pressure,expected",
+        [
+            (7, 0.0, 8),  # all slots busy, low pressure
+            (6, 0.0, 7),  # idle slot left
+            (7, 30.0, 7),  # pressure neither low nor high
+        ],
+    )
+    def test_grows_back_while_busy_at_low_pressure(
+        self, tmp_path, running_count, cpu_pressure, expected
+    ):
+        concurrency = make_concurrency(tmp_path, running_count=running_count)
+        concurrency.limit = 7
+        set_pressure(tmp_path, cpu=cpu_pressure, memory=0.0)
+
+        concurrency.adjust()
+
+        assert concurrency.limit == expected
+
+    def test_never_grows_past_cpu_quota(self, tmp_path):
+        concurrency = make_concurrency(tmp_path, running_count=8)
+
+        concurrency.adjust()
+
+        assert concurrency.limit == 8
+
+    def test_shrinks_to_fit_observed_task_memory(self, tmp_path):
+        concurrency = make_concurrency(
+            tmp_path, memory_max=str(128 * MB + 1024 * MB), running_count=8
+        )
+        concurrency.get_task_pids = lambda: [1, 2]
+
+        assert concurrency.limit == 8
+
+        with patch("src.adaptive_concurrency.read_process_rss", return_value=256 * MB):
+            concurrency.adjust()
+
+        assert concurrency.task_memory == 256 * MB
+        assert concurrency.limit == 4
@@ -0,0 +1,222 @@
+import collections
+import marshal
+import os
+import sqlite3
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from src.code_cache import CodeCache
+from src.config.security_config import SecurityConfig
+from src.errors import SecurityViolationError
+from src.task_analyzer import TaskAnalyzer
+from src.task_executor import TaskExecutor
+from src.constants import (
+    CODE_CACHE_FILENAME,
+    EXECUTOR_ALL_ITEMS_FILENAME,
+    EXECUTOR_USER_OUTPUT_KEY,
+)
+
+ALLOWLISTS = (("json",), ())
+SECRET = "secret"
+CODE = marshal.dumps(compile("x = 1", EXECUTOR_ALL_ITEMS_FILENAME, "exec"))
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "code-cache")
+
+
+@pytest.fixture
+def code_cache(cache_dir):
+    code_cache = CodeCache(cache_dir, max_size=1024 * 1024, secret=SECRET)
+    yield code_cache
+    code_cache.close()
+
+
+class TestCodeCache:
+    def test_returns_none_when_not_cached(self, code_cache):
+        assert code_cache.get_violations("hash", ALLOWLISTS) is None
+        assert code_cache.get_code("hash", EXECUTOR_ALL_ITEMS_FILENAME) is None
+
+    def test_returns_cached_violations_and_code(self, code_cache):
+        code_cache.set_violations("a", ALLOWLISTS, ["Line 1: no"])
+        code_cache.set_violations("b", ALLOWLISTS, [])
+        code_cache.set_code("a", EXECUTOR_ALL_ITEMS_FILENAME, CODE)
+
+        assert code_cache.get_violations("a", ALLOWLISTS) == ["Line 1: no"]
+        assert code_cache.get_violations("b", ALLOWLISTS) == []
+        assert code_cache.get_violations("a", (("json", "re"), ())) is None
+        assert code_cache.get_code("a", EXECUTOR_ALL_ITEMS_FILENAME) == CODE
+
+    def test_persists_across_instances(self, code_cache, cache_dir):
+        code_cache.set_code("a", EXECUTOR_ALL_ITEMS_FILENAME, CODE)
+
+        other = CodeCache(cache_dir, max_size=1024 * 1024, secret=SECRET)
+        try:
+            assert other.get_code("a", EXECUTOR_ALL_ITEMS_FILENAME) == CODE
+        finally:
+            other.close()
+
+    @pytest.mark.parametrize("secret", ["other", ""])
+    def test_ignores_entries_signed_with_other_secrets(
+        self, code_cache, cache_dir, secret
+    ):
+        code_cache.set_code("a", EXECUTOR_ALL_ITEMS_FILENAME, CODE)
+
+        other = CodeCache(cache_dir, max_size=1024 * 1024, secret=secret)
+        try:
+            assert other.get_code("a", EXECUTOR_ALL_ITEMS_FILENAME) is None
+        finally:
+            other.close()
+
+    def test_ignores_entries_of_other_runner_versions(self, code_cache, cache_dir):
+        code_cache.set_code("a", EXECUTOR_ALL_ITEMS_FILENAME, CODE)
+
+        with patch("src.code_cache.get_runner_version", return_value="other"):
+            other = CodeCache(cache_dir, max_size=1024 * 1024, secret=SECRET)
+        try:
+            assert other.get_code("a", EXECUTOR_ALL_ITEMS_FILENAME) is None
+        finally:
+            other.close()
+
+    def test_evicts_least_recently_used_when_full(self, cache_dir):
+        # 100 bytes of violations plus a 32-byte signature per entry
+        code_cache = CodeCache(cache_dir, max_size=400)
+        try:
+            with patch("src.code_cache.time.time", side_effect=range(100)):
+                for key in ["a", "b", "c"]:
+                    code_cache.set_violations(key, ALLOWLISTS, ["x" * 96])
+                code_cache.get_violations("a", ALLOWLISTS)
+                code_cache.set_violations("d", ALLOWLISTS, ["x" * 96])
+
+                cached = [
+                    key
+                    for key in ["a", "b", "c", "d"]
+                    if code_cache.get_violations(key, ALLOWLISTS)
+                ]
+        finally:
+            code_cache.close()
+
+        assert cached == ["a", "d"]
+
+    def test_disables_itself_when_unusable(self, tmp_path):
+        not_a_dir = tmp_path / "file"
+        not_a_dir.write_text("")
+
+        code_cache = CodeCache(str(not_a_dir), max_size=1024)
+
+        code_cache.set_code("a", EXECUTOR_ALL_ITEMS_FILENAME, CODE)
+        assert code_cache.get_code("a", EXECUTOR_ALL_ITEMS_FILENAME) is None
+
+
+def entry_keys(cache_dir: str) -> list[str]:
+    with sqlite3.connect(os.path.join(cache_dir, CODE_CACHE_FILENAME)) as connection:
+        return [key for (key,) in connection.execute("SELECT key FROM entries")]
+
+
+class TestCodeCacheIntegrity:
+    def test_discards_entries_written_by_another_process(self, code_cache, cache_dir):
+        code_cache.set_violations("clean", ALLOWLISTS, [])
+        code_cache.set_violations("bad", ALLOWLISTS, ["Line 1: no"])
+        code_cache.set_code("a", EXECUTOR_ALL_ITEMS_FILENAME, CODE)
+        # e.g. a subprocess running user code, as the same user as the runner
+        forge = """
+import sqlite3, sys
+connection = sqlite3.connect(sys.argv[1], isolation_level=None)
+clean = connection.execute(
+    "SELECT value FROM entries WHERE key LIKE 'validation/%/clean/%'"
+).fetchone()[0]
+connection.execute(
+    "UPDATE entries SET value = ? WHERE key LIKE 'validation/%/bad/%'", (clean,)
+)
+connection.execute(
+    "UPDATE entries SET value = substr(value, 1, 32) || ? WHERE key LIKE 'compile/%'",
+    (b"forged",),
+)
+"""
+        subprocess.run(
+            [sys.executable, "-c", forge, os.path.join(cache_dir, CODE_CACHE_FILENAME)],
+            check=True,
+        )
+
+        assert code_cache.get_violations("clean", ALLOWLISTS) == []
+        assert code_cache.get_violations("bad", ALLOWLISTS) is None
+        assert code_cache.get_code("a", EXECUTOR_ALL_ITEMS_FILENAME) is None
+        assert len(entry_keys(cache_dir)) == 1
+
+    @pytest.mark.parametrize(
+        "value", [b'["Line 1', b"{}", b"[1]"], ids=["truncated", "dict", "int"]
+    )
+    def test_discards_undecodable_violations(self, code_cache, cache_dir, value):
+        code_cache._set("validation", f"a/{ALLOWLISTS!r}", value)
+
+        assert code_cache.get_violations("a", ALLOWLISTS) is None
+        assert entry_keys(cache_dir) == []
+
+    @pytest.mark.parametrize(
+        "value", [CODE[:-1], marshal.dumps("code")], ids=["truncated", "str"]
+    )
+    def test_discards_undecodable_code(self, code_cache, cache_dir, value):
+        code_cache._set("compile", f"a/{EXECUTOR_ALL_ITEMS_FILENAME}", value)
+
+        assert code_cache.get_code("a", EXECUTOR_ALL_ITEMS_FILENAME) is None
+        assert entry_keys(cache_dir) == []
+
+    def test_discards_truncated_entries(self, code_cache, cache_dir):
+        code_cache.set_violations("a", ALLOWLISTS, ["Line 1: no"])
+        with sqlite3.connect(
+            os.path.join(cache_dir, CODE_CACHE_FILENAME)
+        ) as connection:
+            connection.execute("UPDATE entries SET value = substr(value, 1, 10)")
+
+        assert code_cache.get_violations("a", ALLOWLISTS) is None
+        assert entry_keys(cache_dir) == []
+
+
+class TestCodeCacheUsage:
+    @pytest.fixture(autouse=True)
+    def empty_memory_caches(self, monkeypatch):
+        monkeypatch.setattr(TaskAnalyzer, "_cache", collections.OrderedDict())
+        monkeypatch.setattr(TaskExecutor, "_compile_cache", collections.OrderedDict())
+
+    @pytest.fixture
+    def security_config(self):
+        return SecurityConfig(
+            stdlib_allow={"json"},
+            external_allow=set(),
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+
+    def test_analyzer_reads_verdicts_from_disk(self, code_cache, security_config):
+        TaskAnalyzer(security_config, code_cache).validate("return 1")
+        with pytest.raises(SecurityViolationError):
+            TaskAnalyzer(security_config, code_cache).validate("import os")
+        TaskAnalyzer._cache.clear()
+
+        with patch("src.task_analyzer.ast.parse") as parse:
+            assert (
+                TaskAnalyzer(security_config, code_cache).validate("return 1") is None
+            )
+            with pytest.raises(SecurityViolationError):
+                TaskAnalyzer(security_config, code_cache).validate("import os")
+
+        parse.assert_not_called()
+
+    def test_compile_reads_code_from_disk(self, code_cache):
+        first = TaskExecutor.compile_code("return 1", "all_items", None, code_cache)
+        TaskExecutor._compile_cache.clear()
+
+        with patch.object(TaskExecutor, "_compile_user_code") as compile_user_code:
+            second = TaskExecutor.compile_code(
+                "return 1", "all_items", None, code_cache
+            )
+
+        compile_user_code.assert_not_called()
+        assert second == first
+        ns = {"__builtins__": __builtins__}
+        exec(marshal.loads(second), ns)
+        assert ns[EXECUTOR_USER_OUTPUT_KEY] == 1
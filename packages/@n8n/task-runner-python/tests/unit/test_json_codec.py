@@ -0,0 +1,205 @@
+import dataclasses
+import datetime
+import enum
+import json
+import random
+import struct
+import uuid
+from decimal import Decimal
+
+import pytest
+
+from src import json_codec
+
+
+class Color(enum.Enum):
+    RED = 1
+
+
+class Size(str, enum.Enum):
+    SMALL = "s"
+
+
+class Float(float):
+    pass
+
+
+class Int(int):
+    pass
+
+
+class Str(str):
+    pass
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+
+
+def nested(depth: int) -> list:
+    value: list = []
+    for _ in range(depth):
+        value = [value]
+    return value
+
+
+ENCODERS = [json_codec._dumps_stdlib]
+DECODERS = [json_codec._loads_stdlib]
+ARRAY_LENGTHS = [json_codec._array_length_stdlib]
+if json_codec.ORJSON_INSTALLED:
+    ENCODERS.append(json_codec._dumps_orjson)
+    DECODERS.append(json_codec._loads_orjson)
+    ARRAY_LENGTHS.append(json_codec._array_length_orjson)
+if json_codec.MSGSPEC_INSTALLED:
+    DECODERS.append(json_codec._loads_msgspec)
+    ARRAY_LENGTHS.append(json_codec._array_length_msgspec)
+
+
+VALUES = [
+    None,
+    True,
+    0,
+    -(2**63),
+    2**64,
+    -(10**30),
+    0.1,
+    -0.0,
+    1e16,
+    1e-7,
+    1.5e-5,
+    1e-10,
+    5e-324,
+    "plain",
+    'quote " backslash \\ slash /',
+    "\x00\x1f\x7f\b\f\n\r\t",
+    "é 日本 🎉  ",
+    [1, "two", [3.5, None]],
+    (1, 2),
+    {"nested": {"list": [{"a": 1}], "unicode": "ü"}},
+    {1: "int key", None: "none key", 2.5: "float key"},
+    datetime.datetime(2024, 1, 2, 3, 4, 5, 678),
+    datetime.date(2024, 1, 2),
+    datetime.time(1, 2),
+    uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    Decimal("1.10"),
+    b"bytes",
+    {1, 2},
+    Point(1),
+    Color.RED,
+    Size.SMALL,
+    Float(1.5),
+    [Float(-0.25), {"a": Float(1e-7)}],
+    Int(2),
+    Str("sub"),
+    nested(300),  # deeper than orjson supports
+]
+
+
+def expected_encoding(value) -> bytes:
+    return json.dumps(value, default=str, ensure_ascii=False).encode("utf-8")
+
+
+class TestJsonCodec:
+    @pytest.mark.parametrize("dumps", ENCODERS)
+    @pytest.mark.parametrize("value", VALUES, ids=repr)
+    def test_encodes_like_stdlib(self, dumps, value):
+        assert dumps(value) == expected_encoding(value)
+
+    @pytest.mark.parametrize("dumps", ENCODERS)
+    def test_encodes_floats_like_stdlib(self, dumps):
+        rng = random.Random(0)
+        floats = [
+            struct.unpack("d", struct.pack("Q", rng.getrandbits(64)))[0]
+            for _ in range(5000)
+        ] + [rng.uniform(-10, 10) * 10 ** rng.randint(-25, 25) for _ in range(5000)]
+        floats = [f for f in floats if f == f and abs(f) != float("inf")]
+
+        assert dumps(floats) == expected_encoding(floats)
+
+    @pytest.mark.parametrize("dumps", ENCODERS)
+    @pytest.mark.parametrize(
+        "value,expected",
+        [
+            (float("nan"), b"NaN"),
+            (
+                {"list": [float("inf"), -float("inf"), 1.0]},
+                b'{"list": [Infinity, -Infinity, 1.0]}',
+            ),
+            ([Float("nan"), Float(1.0)], b"[NaN, 1.0]"),
+        ],
+    )
+    def test_encodes_non_finite_floats_as_tokens(self, dumps, value, expected):
+        assert dumps(value) == expected
+
+    @pytest.mark.parametrize("dumps", ENCODERS)
+    def test_encodes_numpy_scalars_like_stdlib(self, dumps):
+        numpy = pytest.importorskip("numpy")
+        value = {"float": numpy.float64(1.5), "nan": numpy.float64("nan")}
+
+        assert dumps(value) == b'{"float": 1.5, "nan": NaN}'
+
+    @pytest.mark.parametrize("dumps", ENCODERS)
+    def test_encoding_circular_reference_raises(self, dumps):
+        value: list = []
+        value.append(value)
+
+        with pytest.raises(ValueError):
+            dumps(value)
+
+    @pytest.mark.parametrize("loads", DECODERS)
+    @pytest.mark.parametrize(
+        "data",
+        [
+            '{"a": 1, "b": [true, false, null], "c": "é\\n\\u00e9"}',
+            "12345678901234567890123",
+            "-9999999999999999999",
+            "[0.1, 1e400, -1e400, 1E5]",
+            "[NaN, Infinity]",
+            '"\\ud800"',
+            '{"a": 1, "a": 2}',
+            "[1.0000000000000000000001]",
+        ],
+    )
+    def test_decodes_like_stdlib(self, loads, data):
+        expected = json.loads(data)
+
+        assert repr(loads(data)) == repr(expected)
+        assert repr(loads(data.encode("utf-8"))) == repr(expected)
+
+    @pytest.mark.parametrize("loads", DECODERS)
+    @pytest.mark.parametrize("data", ["", "{", "[1,]", b"\xff"])
+    def test_decoding_invalid_json_raises_like_stdlib(self, loads, data):
+        with pytest.raises(ValueError):
+            loads(data)
+
+    @pytest.mark.parametrize("array_length", ARRAY_LENGTHS)
+    @pytest.mark.parametrize(
+        "data,expected",
+        [
+            (b"[]", 0),
+            (b'[1, "]", {"a": [null, {"b": "}"}]}]', 3),
+            ('["é", "日本"]'.encode("utf-8"), 2),
+            (b"[NaN, -Infinity, 1e400]", 3),
+        ],
+    )
+    def test_array_length(self, array_length, data, expected):
+        assert array_length(data) == expected
+
+    @pytest.mark.parametrize("array_length", ARRAY_LENGTHS)
+    @pytest.mark.parametrize(
+        "data",
+        [
+            b'{"a": 1}',
+            b'[1]},{"a":[2]',
+            b"[1] [2]",
+            b"[1,]",
+            b'[{"a" 1}]',
+            b'["\\x"]',
+            b'["\xff"]',
+            b"",
+        ],
+    )
+    def test_array_length_rejects_anything_but_one_array(self, array_length, data):
+        with pytest.raises(ValueError):
+            array_length(data)
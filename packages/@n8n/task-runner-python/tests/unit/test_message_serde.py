@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from src.message_serde import MessageSerde
+from src.message_types import (
+    BrokerInfoRequest,
+    RunnerInfo,
+    RunnerRpcCall,
+    RunnerTaskAccepted,
+    RunnerTaskDone,
+    RunnerTaskError,
+    RunnerTaskOffer,
+    RunnerTaskRejected,
+)
+
+
+class TestSerializeRunnerMessage:
+    @pytest.mark.parametrize(
+        "message,expected",
+        [
+            (
+                RunnerInfo(name="runner", types=["python"], capabilities=["a"]),
+                {
+                    "name": "runner",
+                    "types": ["python"],
+                    "capabilities": ["a"],
+                    "type": "runner:info",
+                },
+            ),
+            (
+                RunnerTaskOffer(offer_id="o1", task_type="python", valid_for=5000),
+                {
+                    "offerId": "o1",
+                    "taskType": "python",
+                    "validFor": 5000,
+                    "type": "runner:taskoffer",
+                },
+            ),
+            (
+                RunnerTaskAccepted(task_id="t1"),
+                {"taskId": "t1", "type": "runner:taskaccepted"},
+            ),
+            (
+                RunnerTaskRejected(task_id="t1", reason="busy"),
+                {"taskId": "t1", "reason": "busy", "type": "runner:taskrejected"},
+            ),
+            (
+                RunnerTaskDone(task_id="t1", data={"result": [{"json": {"a": 1}}]}),
+                {
+                    "taskId": "t1",
+                    "data": {"result": [{"json": {"a": 1}}]},
+                    "type": "runner:taskdone",
+                },
+            ),
+            (
+                RunnerTaskError(task_id="t1", error={"message": "boom"}),
+                {
+                    "taskId": "t1",
+                    "error": {"message": "boom"},
+                    "type": "runner:taskerror",
+                },
+            ),
+            (
+                RunnerRpcCall(
+                    call_id="c1", task_id="t1", name="logNodeOutput", params=["'hi'"]
+                ),
+                {
+                    "callId": "c1",
+                    "taskId": "t1",
+                    "name": "logNodeOutput",
+                    "params": ["'hi'"],
+                    "type": "runner:rpc",
+                },
+            ),
+        ],
+    )
+    def test_serializes_fields_in_camel_case(self, message, expected):
+        serialized = MessageSerde.serialize_runner_message(message)
+
+        assert json.loads(serialized) == expected
+        assert list(json.loads(serialized)) == list(expected)
+
+    def test_does_not_copy_or_modify_payload(self):
+        error = {"message": "boom", "nested": {"stack": ["line"]}}
+        message = RunnerTaskError(task_id="t1", error=error)
+
+        MessageSerde.serialize_runner_message(message)
+
+        assert message.error is error
+        assert error == {"message": "boom", "nested": {"stack": ["line"]}}
+
+
+class TestDeserializeBrokerMessage:
+    def test_info_request_with_capabilities(self):
+        message = MessageSerde.deserialize_broker_message(
+            '{"type": "broker:inforequest", "capabilities": ["consoleLogBatch"]}'
+        )
+
+        assert message == BrokerInfoRequest(capabilities=["consoleLogBatch"])
+
+    def test_info_request_without_capabilities(self):
+        message = MessageSerde.deserialize_broker_message(
+            '{"type": "broker:inforequest"}'
+        )
+
+        assert message == BrokerInfoRequest(capabilities=[])
+
+    def test_info_request_with_invalid_capabilities(self):
+        with pytest.raises(ValueError):
+            MessageSerde.deserialize_broker_message(
+                '{"type": "broker:inforequest", "capabilities": "consoleLogBatch"}'
+            )
@@ -0,0 +1,95 @@
+import pytest
+
+from src import metrics
+from src.metrics import Counter, Gauge, Histogram
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    # metrics created in tests are rendered on their own
+    monkeypatch.setattr(metrics, "_REGISTRY", [])
+
+
+class TestCounter:
+    def test_renders_value_per_label(self):
+        counter = Counter("test_total", "Things counted.", ("kind",))
+        counter.inc(kind="a")
+        counter.inc(2, kind="b")
+        counter.inc(kind="a")
+
+        assert metrics.render_metrics() == (
+            "# HELP test_total Things counted.\n"
+            "# TYPE test_total counter\n"
+            'test_total{kind="a"} 2\n'
+            'test_total{kind="b"} 2\n'
+        )
+
+    def test_rejects_wrong_labels(self):
+        counter = Counter("test_total", "Things counted.", ("kind",))
+
+        with pytest.raises(ValueError):
+            counter.inc(other="a")
+
+    def test_escapes_label_values(self):
+        counter = Counter("test_total", "Things counted.", ("kind",))
+        counter.inc(kind='a "b"\\\n')
+
+        assert 'test_total{kind="a \\"b\\"\\\\\\n"} 1' in metrics.render_metrics()
+
+
+class TestGauge:
+    def test_renders_value(self):
+        gauge = Gauge("test_depth", "Things waiting.")
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        assert "test_depth 1\n" in metrics.render_metrics()
+
+    def test_reads_value_through_function(self):
+        gauge = Gauge("test_ratio", "Share of things.")
+        gauge.set_function(lambda: 0.25)
+
+        assert "test_ratio 0.25\n" in metrics.render_metrics()
+
+
+class TestHistogram:
+    def test_renders_cumulative_buckets_sum_and_count(self):
+        histogram = Histogram("test_seconds", "Time taken.", (0.1, 1), ("phase",))
+        histogram.observe(0.05, phase="a")
+        histogram.observe(0.1, phase="a")
+        histogram.observe(0.5, phase="a")
+        histogram.observe(5, phase="a")
+
+        assert metrics.render_metrics() == (
+            "# HELP test_seconds Time taken.\n"
+            "# TYPE test_seconds histogram\n"
+            'test_seconds_bucket{phase="a",le="0.1"} 2\n'
+            'test_seconds_bucket{phase="a",le="1"} 3\n'
+            'test_seconds_bucket{phase="a",le="+Inf"} 4\n'
+            'test_seconds_sum{phase="a"} 5.65\n'
+            'test_seconds_count{phase="a"} 4\n'
+        )
+
+    def test_renders_without_labels(self):
+        histogram = Histogram("test_bytes", "Size.", (1024,))
+        histogram.observe(2048)
+
+        rendered = metrics.render_metrics()
+
+        assert 'test_bytes_bucket{le="1024"} 0\n' in rendered
+        assert 'test_bytes_bucket{le="+Inf"} 1\n' in rendered
+        assert "test_bytes_count 1\n" in rendered
+
+
+class TestValidationCacheHitRatio:
+    def test_ratio_of_hits_to_lookups(self, monkeypatch):
+        lookups = Counter("test_lookups_total", "Lookups.", ("result",))
+        monkeypatch.setattr(metrics, "VALIDATION_CACHE_LOOKUPS", lookups)
+
+        assert metrics._get_validation_cache_hit_ratio() == 0.0
+
+        lookups.inc(3, result="hit")
+        lookups.inc(result="miss")
+
+        assert metrics._get_validation_cache_hit_ratio() == 0.75
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from src.constants import PIPE_CHUNK_SIZE
+from src.message_serde import MessageSerde
+from src.message_types import RunnerTaskDone
+from src.result_spool import ResultSpool
+
+
+class TestResultSpool:
+    def test_joins_chunks_into_json_array(self):
+        spool = ResultSpool()
+        spool.append(b'{"json": {"n": 1}},{"json": {"n": 2}}')
+        spool.append(b'{"json": {"n": 3}}')
+
+        assert spool.to_value() == [{"json": {"n": n}} for n in (1, 2, 3)]
+        assert spool.size == len('{"json": {"n": 1}},{"json": {"n": 2}}') + len(
+            '{"json": {"n": 3}}'
+        )
+
+    def test_empty_spool_is_empty_array(self):
+        assert ResultSpool().to_value() == []
+
+    def test_from_value_holds_any_json_value(self):
+        assert ResultSpool.from_value({"json": {}}).to_value() == {"json": {}}
+
+    def test_extend_appends_items_of_other_spools_in_order(self):
+        spool = ResultSpool()
+        for values in ([1, 2], [], [3]):
+            other = ResultSpool()
+            for n in values:
+                other.append(f'{{"json": {{"n": {n}}}}}'.encode())
+            spool.extend(other)
+            other.close()
+
+        assert spool.to_value() == [{"json": {"n": n}} for n in (1, 2, 3)]
+        assert spool.size == 3 * len('{"json": {"n": 1}}')
+
+    def test_spills_to_disk_past_one_chunk(self):
+        spool = ResultSpool()
+        chunk = b'"' + b"x" * PIPE_CHUNK_SIZE + b'"'
+        spool.append(chunk)
+        spool.append(chunk)
+
+        assert spool.file._rolled  # type: ignore[attr-defined]
+        assert len(spool.to_value()) == 2
+
+        spool.close()
+
+    def test_closes_on_leaving_context_even_on_error(self):
+        with pytest.raises(ValueError):
+            with ResultSpool() as spool:
+                spool.append(b"1")
+                raise ValueError()
+
+        assert spool.file.closed
+        spool.close()
+
+
+class TestSerializeTaskDone:
+    def test_fragments_form_task_done_message(self):
+        spool = ResultSpool()
+        spool.append(b'{"json": {"text": "\xc3\xa9"}}')
+        message = RunnerTaskDone(task_id="task-1", data={"result": spool})
+
+        fragments = list(MessageSerde.serialize_task_done(message))
+
+        assert len(fragments) > 1
+        assert json.loads("".join(fragments)) == {
+            "taskId": "task-1",
+            "data": {"result": [{"json": {"text": "é"}}]},
+            "type": "runner:taskdone",
+        }
+
+    def test_includes_other_data_alongside_result(self):
+        spool = ResultSpool()
+        spool.append(b'{"json": {}}')
+        message = RunnerTaskDone(
+            task_id="task-1",
+            data={"result": spool, "consoleLogs": [["'hi'"], ["1", "'é'"]]},
+        )
+
+        fragments = list(MessageSerde.serialize_task_done(message))
+
+        assert json.loads("".join(fragments))["data"] == {
+            "result": [{"json": {}}],
+            "consoleLogs": [["'hi'"], ["1", "'é'"]],
+        }
+
+    def test_envelope_is_encoded_like_other_runner_messages(self):
+        spool = ResultSpool()
+        spool.append(b'{"json": {"a": 1}}')
+        message = RunnerTaskDone(task_id="task-1", data={"result": spool})
+
+        fragments = list(MessageSerde.serialize_task_done(message))
+
+        assert "".join(fragments) == json.dumps(
+            {
+                "taskId": "task-1",
+                "data": {"result": [{"json": {"a": 1}}]},
+                "type": "runner:taskdone",
+            }
+        )
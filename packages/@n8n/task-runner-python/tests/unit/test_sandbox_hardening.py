@@ -397,6 +397,55 @@ class TestImportAllowlistCoverage:
         assert received["name"] == "type_adapter"
         assert received["args"] == ({"__package__": "pydantic"}, None, ("X",), 1)
 
+    def test_safe_import_validates_each_target_once(self):
+        config = SecurityConfig(
+            stdlib_allow=set(),
+            external_allow={"pydantic"},
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+        validated = []
+
+        def validate(name, config, package=None):
+            validated.append((name, package))
+            return validate_module_import(name, config, package)
+
+        guard = _GuardedImport(config, validate, lambda *a, **k: "imported")
+        for _ in range(3):
+            guard("pydantic")
+            guard("sub", {"__package__": "pydantic"}, None, ("X",), 1)
+            with pytest.raises(SecurityViolationError):
+                guard("sub", {"__package__": "requests"}, None, ("X",), 1)
+
+        assert validated == [
+            ("pydantic", None),
+            (".sub", "pydantic"),
+            (".sub", "requests"),
+        ]
+
+    def test_str_subclass_does_not_match_cached_decision(self):
+        config = SecurityConfig(
+            stdlib_allow={"importlib", "json"},
+            external_allow=set(),
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+        code = """
+import importlib
+importlib.import_module("json")
+
+class S(str):
+    def __hash__(self):
+        return hash("json")
+
+    def __eq__(self, other):
+        return True
+
+importlib.import_module(S("os")).getcwd()
+"""
+        with pytest.raises(SecurityViolationError):
+            _run(code, config)
+
 
 class TestIntrospectionDeniedOnHardenedCallables:
     """Regression tests covering the indirect-attribute-access surface.
@@ -7,6 +7,7 @@ pytest.importorskip("sentry_sdk")
 
 from src.config.sentry_config import SentryConfig
 from src.sentry import TaskRunnerSentry, setup_sentry
+from src.task_timing import TaskTiming
 from src.constants import (
     EXECUTOR_ALL_ITEMS_FILENAME,
     EXECUTOR_PER_ITEM_FILENAME,
@@ -78,6 +79,28 @@ class TestTaskRunnerSentry:
 
             mock_flush.assert_called_once_with(timeout=2.0)
 
+    def test_record_task_timing_sends_span_per_phase(self, sentry_config):
+        timing = TaskTiming(started_at=1000.0)
+        timing.phases = {"validation": 0.5, "user_code": 1.0}
+        timing.finished_at = 1002.0
+
+        with patch("sentry_sdk.start_transaction") as mock_start_transaction:
+            transaction = mock_start_transaction.return_value
+            sentry = TaskRunnerSentry(sentry_config)
+
+            sentry.record_task_timing("task-1", "success", timing)
+
+            assert mock_start_transaction.call_args.kwargs["op"] == "task"
+            transaction.set_tag.assert_called_once_with("task.outcome", "success")
+            spans = transaction.start_child.call_args_list
+            assert [span.kwargs["op"] for span in spans] == [
+                "task.validation",
+                "task.user_code",
+            ]
+            assert spans[1].kwargs["start_timestamp"].timestamp() == 1000.5
+            end = transaction.finish.call_args.kwargs["end_timestamp"]
+            assert end.timestamp() == 1002.0
+
     @pytest.mark.parametrize(
         "error_type",
         IGNORED_ERROR_TYPES,
@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from src.config.security_config import SecurityConfig
+from src.shared_items import SharedItems
+from src.task_executor import TaskExecutor
+
+pytestmark = pytest.mark.skipif(
+    not SharedItems.is_supported(), reason="memfd is not supported on this platform"
+)
+
+
+def make_security_config() -> SecurityConfig:
+    return SecurityConfig(
+        stdlib_allow=set(),
+        external_allow=set(),
+        builtins_deny=set(),
+        runner_env_deny=True,
+    )
+
+
+class TestSharedItems:
+    def test_round_trips_items(self):
+        items = [
+            {"json": {"text": "line\nbreak", "unicode": "é "}},
+            {"json": {"nested": [1, 2.5, None, True]}},
+        ]
+        shared = SharedItems.create(items)
+
+        try:
+            assert shared.load() == items
+        finally:
+            shared.close()
+
+    @pytest.mark.parametrize("by_item", [False, True])
+    def test_empty_items(self, by_item):
+        shared = SharedItems.create([], by_item=by_item)
+
+        try:
+            assert shared.load() == []
+            assert list(shared.iter_items()) == []
+        finally:
+            shared.close()
+
+    def test_iterates_items_written_by_item(self):
+        shared_value = {"shared": "across items"}
+        items = [{"json": {"i": i, "ref": shared_value}} for i in range(1000)]
+        items[500]["json"]["large"] = "x" * (1024 * 1024)
+        shared = SharedItems.create(items, by_item=True)
+
+        try:
+            iterator = shared.iter_items()
+            first = next(iterator)
+            assert first == items[0]
+            assert list(iterator) == items[1:]
+            assert shared.load() == items
+        finally:
+            shared.close()
+
+    def test_iterates_items_written_as_whole(self):
+        items = [{"json": {"i": i}} for i in range(10)]
+        shared = SharedItems.create(items)
+
+        try:
+            assert list(shared.iter_items()) == items
+        finally:
+            shared.close()
+
+    def test_is_sealed_against_writes(self):
+        shared = SharedItems.create([{"json": {}}])
+
+        try:
+            with pytest.raises(PermissionError):
+                os.pwrite(shared.fd, b"x", 0)
+        finally:
+            shared.close()
+
+    def test_close_is_idempotent(self):
+        shared = SharedItems.create([{"json": {}}])
+
+        shared.close()
+        shared.close()
+
+        assert shared.fd == -1
+
+    @pytest.mark.parametrize(
+        "node_mode,code,expected",
+        [
+            (
+                "all_items",
+                "return [{'json': {'n': len(_items)}}]",
+                [{"json": {"n": 2}}],
+            ),
+            (
+                "per_item",
+                "return {'v': _item['json']['v'] * 2}",
+                [
+                    {"json": {"v": 2}, "pairedItem": {"item": 0}},
+                    {"json": {"v": 4}, "pairedItem": {"item": 1}},
+                ],
+            ),
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_delivered_to_subprocess(self, node_mode, code, expected):
+        shared = SharedItems.create(
+            [{"json": {"v": 1}}, {"json": {"v": 2}}],
+            by_item=node_mode == "per_item",
+        )
+
+        try:
+            process, read_conn, write_conn = TaskExecutor.create_process(
+                TaskExecutor.compile_code(code, node_mode),
+                node_mode,
+                shared,
+                make_security_config(),
+            )
+            result, _, _, _ = await TaskExecutor.execute_process(
+                process, read_conn, write_conn, task_timeout=10, continue_on_fail=False
+            )
+        finally:
+            shared.close()
+
+        assert result.to_value() == expected
@@ -1,3 +1,7 @@
+import ast
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from src.errors.security_violation_error import SecurityViolationError
@@ -786,3 +790,70 @@ class TestAllowAll(TestTaskAnalyzer):
 
         for code in unsafe_allowed_code:
             analyzer.validate(code)
+
+
+class TestValidatedTree(TestTaskAnalyzer):
+    @pytest.fixture(autouse=True)
+    def empty_cache(self, monkeypatch):
+        monkeypatch.setattr(TaskAnalyzer, "_cache", OrderedDict())
+
+    def test_returns_tree_with_format_calls_guarded(
+        self, analyzer: TaskAnalyzer
+    ) -> None:
+        tree = analyzer.validate("return template.format(a, template.format(b))")
+
+        assert tree is not None
+        rendered = ast.unparse(tree)
+        assert rendered.count(EXECUTOR_SAFE_FORMAT_KEY) == 2
+        assert ".format(" not in rendered
+
+    def test_returns_none_when_cached(self, analyzer: TaskAnalyzer) -> None:
+        analyzer.validate("return 1")
+
+        assert analyzer.validate("return 1") is None
+
+    def test_returns_none_when_allowing_all(self) -> None:
+        security_config = SecurityConfig(
+            stdlib_allow={"*"},
+            external_allow={"*"},
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+
+        assert TaskAnalyzer(security_config).validate("return 1") is None
+
+    def test_validate_cached_only_reads_cache(self, analyzer: TaskAnalyzer) -> None:
+        assert analyzer.validate_cached("return 1") is False
+
+        analyzer.validate("return 1")
+        with pytest.raises(SecurityViolationError):
+            analyzer.validate("import os")
+
+        assert analyzer.validate_cached("return 1") is True
+        with pytest.raises(SecurityViolationError):
+            analyzer.validate_cached("import os")
+
+
+class TestCacheConcurrency:
+    def test_concurrent_validation_keeps_cache_consistent(self, monkeypatch):
+        monkeypatch.setattr(TaskAnalyzer, "_cache", OrderedDict())
+        monkeypatch.setattr("src.task_analyzer.MAX_VALIDATION_CACHE_SIZE", 10)
+        analyzer = TaskAnalyzer(
+            SecurityConfig(
+                stdlib_allow={"json"},
+                external_allow=set(),
+                builtins_deny=set(),
+                runner_env_deny=True,
+            )
+        )
+
+        def validate_many(offset: int) -> None:
+            for i in range(200):
+                code = f"return {(offset + i) % 30}"
+                if not analyzer.validate_cached(code):
+                    analyzer.validate(code)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(validate_many, range(0, 40, 10)))
+
+        assert len(TaskAnalyzer._cache) == 10
@@ -1,147 +1,763 @@
 import ast
+import collections
+import hashlib
+import marshal
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
 import pytest
 import json
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from src.task_executor import (
+    MAX_PRINT_ARGS_ALLOWED,
     TaskExecutor,
     FormatGuardTransformer,
+    _find_blocked_format_token,
+    _may_write_globals,
     _safe_format,
     _validate_format_template,
 )
-from src.pipe_reader import PipeReader
+from src.result_spool import ResultSpool
+from src.task_timing import TaskTiming
 from src.errors import (
     SecurityViolationError,
     TaskCancelledError,
     TaskKilledError,
+    TaskResourceLimitError,
+    TaskResultTooLargeError,
+    TaskRuntimeError,
     TaskSubprocessFailedError,
+    TaskTimeoutError,
 )
 from src.constants import (
+    EXECUTOR_ALL_ITEMS_FILENAME,
+    EXECUTOR_PER_ITEM_FILENAME,
     EXECUTOR_SAFE_FORMAT_KEY,
+    EXECUTOR_USER_OUTPUT_KEY,
+    PIPE_CHUNK_SIZE,
+    PIPE_FRAME_END,
+    PIPE_FRAME_PRINT,
+    PIPE_FRAME_RESULT_CHUNK,
     PIPE_MSG_PREFIX_LENGTH,
+    MEMORY_LIMIT_EXIT_CODE,
     SIGKILL_EXIT_CODE,
     SIGTERM_EXIT_CODE,
+    SIGXCPU_EXIT_CODE,
 )
 from src.config.security_config import SecurityConfig
 from src.message_types.pipe import (
+    PrintArgs,
+    TaskUsage,
     PipeResultMessage,
     PipeErrorMessage,
     TaskErrorInfo,
 )
 
 
-class TestTaskExecutorProcessExitHandling:
-    def test_sigterm_raises_task_cancelled_error(self):
-        process = MagicMock()
-        process.is_alive.return_value = False
-        process.exitcode = SIGTERM_EXIT_CODE
+def make_exited_process(exitcode: int) -> MagicMock:
+    process = MagicMock()
+    process.exitcode = exitcode
 
-        read_conn = MagicMock()
-        write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
+    # readable as the sentinel of a process that exited
+    read_fd, write_fd = os.pipe()
+    os.close(write_fd)
+    process.sentinel = read_fd
 
-        with pytest.raises(TaskCancelledError):
-            TaskExecutor.execute_process(
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=60,
-                continue_on_fail=False,
-            )
+    return process
 
-    def test_sigkill_raises_task_killed_error(self):
-        process = MagicMock()
-        process.is_alive.return_value = False
-        process.exitcode = SIGKILL_EXIT_CODE
 
-        read_conn = MagicMock()
-        write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
+def frame(frame_type: int, data: bytes) -> bytes:
+    header = len(data).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big") + bytes((frame_type,))
+    return header + data
 
-        with pytest.raises(TaskKilledError):
-            TaskExecutor.execute_process(
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=60,
-                continue_on_fail=False,
-            )
 
-    def test_other_non_zero_exit_code_raises_task_subprocess_failed_error(self):
-        process = MagicMock()
-        process.is_alive.return_value = False
-        process.exitcode = -1  # Some other error code
+async def execute_with_pipe_frames(
+    frames: list[bytes], exitcode: int = 0, **kwargs
+) -> tuple[ResultSpool, PrintArgs, int, TaskUsage | None]:
+    process = make_exited_process(exitcode)
+    read_conn, write_conn = multiprocessing.Pipe(duplex=False)
+    os.write(write_conn.fileno(), b"".join(frames))
 
-        read_conn = MagicMock()
-        write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
+    try:
+        return await TaskExecutor.execute_process(
+            process=process,
+            read_conn=read_conn,
+            write_conn=write_conn,
+            task_timeout=60,
+            continue_on_fail=False,
+            **kwargs,
+        )
+    finally:
+        os.close(process.sentinel)
 
+
+class TestTaskExecutorProcessExitHandling:
+    @pytest.mark.asyncio
+    async def test_sigterm_raises_task_cancelled_error(self):
+        with pytest.raises(TaskCancelledError):
+            await execute_with_pipe_frames([], exitcode=SIGTERM_EXIT_CODE)
+
+    @pytest.mark.asyncio
+    async def test_sigkill_raises_task_killed_error(self):
+        with pytest.raises(TaskKilledError):
+            await execute_with_pipe_frames([], exitcode=SIGKILL_EXIT_CODE)
+
+    @pytest.mark.asyncio
+    async def test_other_non_zero_exit_code_raises_task_subprocess_failed_error(self):
         with pytest.raises(TaskSubprocessFailedError) as exc_info:
-            TaskExecutor.execute_process(
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=60,
-                continue_on_fail=False,
-            )
+            await execute_with_pipe_frames([], exitcode=-1)  # Some other error code
 
         assert exc_info.value.exit_code == -1
 
-    def test_zero_exit_code_with_empty_pipe_raises_task_result_read_error(self):
+    @pytest.mark.asyncio
+    async def test_zero_exit_code_with_empty_pipe_raises_task_result_read_error(self):
         from src.errors import TaskResultReadError
 
-        process = MagicMock()
-        process.is_alive.return_value = False
-        process.exitcode = 0
+        with pytest.raises(TaskResultReadError):
+            await execute_with_pipe_frames([])
 
-        read_conn = MagicMock()
-        write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
+    @pytest.mark.asyncio
+    async def test_timeout_stops_process(self):
+        security_config = SecurityConfig(
+            stdlib_allow={"time"},
+            external_allow=set(),
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+        code = TaskExecutor.compile_code("import time\ntime.sleep(30)", "all_items")
+        process, read_conn, write_conn = TaskExecutor.create_process(
+            code, "all_items", [], security_config
+        )
 
-        with pytest.raises(TaskResultReadError):
-            TaskExecutor.execute_process(
+        with pytest.raises(TaskTimeoutError):
+            await TaskExecutor.execute_process(
                 process=process,
                 read_conn=read_conn,
                 write_conn=write_conn,
-                task_timeout=60,
+                task_timeout=1,
                 continue_on_fail=False,
             )
 
+        assert not process.is_alive()
+        assert process.exitcode == SIGTERM_EXIT_CODE
 
-class TestTaskExecutorPipeCommunication:
-    @patch("os.read")
-    def test_successful_result_communication(self, mock_os_read):
-        result_data: PipeResultMessage = {
-            "result": [{"json": {"foo": "bar"}}],
-            "print_args": [],
-        }
-        result_json = json.dumps(result_data).encode("utf-8")
-        result_length = len(result_json).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
 
-        mock_os_read.side_effect = [result_length, result_json]
+class TestTaskExecutorResourceAccounting:
+    @staticmethod
+    async def run_task(code: str, timing: TaskTiming | None = None, **limits):
+        security_config = SecurityConfig(
+            stdlib_allow={"time"},
+            external_allow=set(),
+            builtins_deny=set(),
+            runner_env_deny=True,
+            **limits,
+        )
+        process, read_conn, write_conn = TaskExecutor.create_process(
+            TaskExecutor.compile_code(code, "all_items"),
+            "all_items",
+            [],
+            security_config,
+        )
+        return await TaskExecutor.execute_process(
+            process=process,
+            read_conn=read_conn,
+            write_conn=write_conn,
+            task_timeout=10,
+            continue_on_fail=False,
+            timing=timing,
+        )
 
-        process = MagicMock()
-        process.is_alive.return_value = False
-        process.exitcode = 0
+    @pytest.mark.asyncio
+    async def test_sigxcpu_raises_task_resource_limit_error(self):
+        with pytest.raises(TaskResourceLimitError) as exc_info:
+            await execute_with_pipe_frames([], exitcode=SIGXCPU_EXIT_CODE)
 
-        read_conn = MagicMock()
-        write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
+        assert exc_info.value.resource == "CPU time"
 
-        result, print_args, size = TaskExecutor.execute_process(
+    @pytest.mark.asyncio
+    async def test_memory_limit_exit_code_raises_task_resource_limit_error(self):
+        with pytest.raises(TaskResourceLimitError) as exc_info:
+            await execute_with_pipe_frames([], exitcode=MEMORY_LIMIT_EXIT_CODE)
+
+        assert exc_info.value.resource == "memory"
+
+    @pytest.mark.asyncio
+    async def test_task_over_cpu_limit_is_stopped(self):
+        with pytest.raises(TaskResourceLimitError) as exc_info:
+            await self.run_task("while True: pass", cpu_limit=1)
+
+        assert exc_info.value.resource == "CPU time"
+
+    @pytest.mark.asyncio
+    async def test_task_over_memory_limit_is_stopped(self):
+        code = "data = bytearray(256 * 1024 * 1024)\nreturn []"
+
+        with pytest.raises(TaskResourceLimitError) as exc_info:
+            await self.run_task(code, memory_limit=64 * 1024 * 1024)
+
+        assert exc_info.value.resource == "memory"
+
+    @pytest.mark.asyncio
+    async def test_task_records_subprocess_phases(self):
+        timing = TaskTiming()
+
+        result, _, _, _ = await self.run_task(
+            "import time\ntime.sleep(0.2)\nreturn []", timing=timing
+        )
+        result.close()
+
+        assert list(timing.phases) == [
+            "spawn",
+            "sandbox",
+            "user_code",
+            "serialization",
+            "pipe_transfer",
+        ]
+        assert 0.2 <= timing.phases["user_code"] < 1
+
+    @pytest.mark.asyncio
+    async def test_task_within_limits_reports_usage(self):
+        code = "data = bytearray(16 * 1024 * 1024)\nreturn [{'size': len(data)}]"
+
+        result, _, _, usage = await self.run_task(
+            code, memory_limit=64 * 1024 * 1024, cpu_limit=10
+        )
+        result.close()
+
+        assert usage is not None
+        assert usage["max_rss"] >= 16 * 1024 * 1024
+        assert usage["user_cpu"] >= 0 and usage["system_cpu"] >= 0
+        assert usage["voluntary_switches"] >= 0
+        assert usage["involuntary_switches"] >= 0
+
+
+class TestPerItem:
+    @staticmethod
+    async def run_task(code: str, items: list) -> list:
+        security_config = SecurityConfig(
+            stdlib_allow=set(),
+            external_allow=set(),
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+        process, read_conn, write_conn = TaskExecutor.create_process(
+            TaskExecutor.compile_code(code, "per_item"),
+            "per_item",
+            items,
+            security_config,
+        )
+        result, _, _, _ = await TaskExecutor.execute_process(
             process=process,
             read_conn=read_conn,
             write_conn=write_conn,
-            task_timeout=60,
+            task_timeout=10,
             continue_on_fail=False,
         )
+        try:
+            return result.to_value()
+        finally:
+            result.close()
+
+    @pytest.mark.asyncio
+    async def test_runs_code_per_item(self):
+        code = """
+if _item["json"]["n"] == 1:
+    return None
+return {"json": {"double": _item["json"]["n"] * 2}, "binary": {"b": 1}}
+"""
+        items = [{"json": {"n": n}} for n in range(3)]
+
+        assert await self.run_task(code, items) == [
+            {"json": {"double": 0}, "pairedItem": {"item": 0}, "binary": {"b": 1}},
+            {"json": {"double": 4}, "pairedItem": {"item": 2}, "binary": {"b": 1}},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_runs_each_item_on_fresh_globals(self):
+        code = """
+global seen
+try:
+    seen += 1
+except NameError:
+    seen = 1
+return {"seen": seen}
+"""
+        items = [{"json": {}} for _ in range(3)]
+
+        assert [item["json"] for item in await self.run_task(code, items)] == [
+            {"seen": 1}
+        ] * 3
+
+    @pytest.mark.asyncio
+    async def test_runs_each_item_on_fresh_globals_with_exec(self):
+        code = """
+exec("global seen\\ntry:\\n    seen += 1\\nexcept NameError:\\n    seen = 1")
+return {"seen": eval("seen")}
+"""
+        items = [{"json": {}} for _ in range(3)]
+
+        assert [item["json"] for item in await self.run_task(code, items)] == [
+            {"seen": 1}
+        ] * 3
+
+    @pytest.mark.asyncio
+    async def test_builtins_changed_by_one_item_do_not_reach_the_next(self):
+        code = """
+if _item["json"]["n"] == 0:
+    try:
+        raise ValueError()
+    except ValueError as e:
+        frame = getattr(getattr(e, "__trace" + "back__"), "tb_" + "frame")
+    getattr(frame, "f_built" + "ins")["len"] = lambda value: -1
+return {"len": len("abc")}
+"""
+        items = [{"json": {"n": n}} for n in range(3)]
+
+        assert [item["json"] for item in await self.run_task(code, items)] == [
+            {"len": -1},
+            {"len": 3},
+            {"len": 3},
+        ]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "change",
+        [
+            'builtins["len"] = None',
+            'del builtins["len"]',
+            'builtins["added"] = None',
+            'del builtins["len"]\n    builtins["added"] = None',
+        ],
+    )
+    async def test_builtins_are_restored_after_each_item(self, change):
+        code = f"""
+def function_builtins():
+    try:
+        raise ValueError()
+    except ValueError as e:
+        frame = getattr(getattr(e, "__trace" + "back__"), "tb_" + "frame")
+    return getattr(getattr(frame, "f_" + "back"), "f_built" + "ins")
+builtins = function_builtins()
+if _item["json"]["n"] == 0:
+    {change}
+    return None
+return {{"len": len("abc"), "added": "added" in builtins}}
+"""
+        items = [{"json": {"n": n}} for n in range(3)]
+
+        assert [item["json"] for item in await self.run_task(code, items)] == [
+            {"len": 3, "added": False}
+        ] * 2
+
+    @pytest.mark.parametrize(
+        "code,created",
+        [
+            ("return _item", 1),
+            ("global x\nx = 1\nreturn _item", 4),  # once more per item
+        ],
+    )
+    def test_creates_user_function_once_unless_code_writes_globals(self, code, created):
+        security_config = SecurityConfig(
+            stdlib_allow=set(),
+            external_allow=set(),
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+        read_fd, write_fd = os.pipe()
+        write_conn = MagicMock()
+        write_conn.fileno.return_value = write_fd
+        items = [{"json": {"n": n}} for n in range(3)]
+
+        with (
+            patch.object(sys, "stderr"),
+            patch.object(
+                TaskExecutor,
+                "_create_user_function",
+                wraps=TaskExecutor._create_user_function,
+            ) as create_user_function,
+        ):
+            TaskExecutor._per_item(
+                TaskExecutor.compile_code(code, "per_item"),
+                items,
+                write_conn,
+                security_config,
+                sandbox_ready=True,
+            )
+
+        with os.fdopen(read_fd, "rb") as read_file:
+            assert b'"pairedItem": {"item": 2}' in read_file.read()
+        assert create_user_function.call_count == created
+
+    @pytest.mark.parametrize(
+        "code,reusable",
+        [
+            ("return _item", True),
+            ("def f():\n    return _item\nreturn [f() for _ in range(2)]", True),
+            ("global x\nx = 1\nreturn x", False),
+            ("def f():\n    global x\n    del x\nreturn f", False),
+            ("return len(globals())", False),
+            ('exec("x = 1")\nreturn _item', False),
+            ('return eval("_item")', False),
+            ("return vars()", False),
+            ('def f():\n    return compile("x = 1", "", "exec")\nreturn f', False),
+        ],
+    )
+    def test_reuses_user_function_unless_code_writes_globals(self, code, reusable):
+        compiled = marshal.loads(TaskExecutor.compile_code(code, "per_item"))
+
+        function = TaskExecutor._create_user_function(
+            compiled, {"__builtins__": {}}, {}
+        )
+
+        assert (not _may_write_globals(function.__code__)) == reusable
+
+
+class TestSharding:
+    @staticmethod
+    async def run_sharded(
+        code: str,
+        items: list,
+        shard_count: int,
+        continue_on_fail: bool = False,
+        timing: TaskTiming | None = None,
+    ) -> tuple[list, list]:
+        security_config = SecurityConfig(
+            stdlib_allow=set(),
+            external_allow=set(),
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+        compiled = TaskExecutor.compile_code(code, "per_item")
+        shards = [
+            TaskExecutor.create_process(
+                compiled, "per_item", shard, security_config, item_offset=offset
+            )
+            for offset, shard in TaskExecutor.shard_items(items, shard_count)
+        ]
+        result, print_args, _, _ = await TaskExecutor.execute_sharded(
+            shards, task_timeout=10, continue_on_fail=continue_on_fail, timing=timing
+        )
+        try:
+            return result.to_value(), print_args
+        finally:
+            result.close()
+
+    @pytest.mark.parametrize("item_count,shard_count", [(10, 3), (2, 3), (0, 2)])
+    def test_shard_items_splits_contiguously(self, item_count, shard_count):
+        items = list(range(item_count))
+
+        shards = TaskExecutor.shard_items(items, shard_count)
+
+        assert len(shards) == shard_count
+        assert [item for _, shard in shards for item in shard] == items
+        assert [offset for offset, _ in shards] == [
+            sum(len(shard) for _, shard in shards[:i]) for i in range(shard_count)
+        ]
+        sizes = [len(shard) for _, shard in shards]
+        assert max(sizes) - min(sizes) <= 1
+
+    @pytest.mark.asyncio
+    async def test_merges_results_and_prints_in_item_order(self):
+        code = """
+n = _item["json"]["n"]
+print("item", n)
+if n % 4 == 1:
+    return None
+return {"n": n}
+"""
+        items = [{"json": {"n": n}} for n in range(10)]
+
+        result, print_args = await self.run_sharded(code, items, 3)
+
+        assert result == [
+            {"json": {"n": n}, "pairedItem": {"item": n}}
+            for n in range(10)
+            if n % 4 != 1
+        ]
+        assert print_args == [["'item'", str(n)] for n in range(10)]
+
+    @pytest.mark.asyncio
+    async def test_truncates_prints_across_shards(self):
+        code = """
+for i in range(MAX_PRINT_ARGS_ALLOWED + 20):
+    print(_item["json"]["n"], i)
+return _item
+"""
+        code = code.replace("MAX_PRINT_ARGS_ALLOWED", str(MAX_PRINT_ARGS_ALLOWED))
+        items = [{"json": {"n": n}} for n in range(2)]
+
+        _, print_args = await self.run_sharded(code, items, 2)
+
+        assert len(print_args) == MAX_PRINT_ARGS_ALLOWED + 1
+        assert print_args[:MAX_PRINT_ARGS_ALLOWED] == [
+            ["0", str(i)] for i in range(MAX_PRINT_ARGS_ALLOWED)
+        ]
+        assert print_args[-1] == [
+            f"[Output truncated - {MAX_PRINT_ARGS_ALLOWED + 40} more print statements]"
+        ]
+
+    def test_merge_print_args_truncates_once_all_are_merged(self):
+        shard_print_args = [
+            [["'a'"]] * 60,
+            [["'b'"]] * 60,
+            [["'c'"]] * 10,
+        ]
+
+        print_args = TaskExecutor._merge_print_args(shard_print_args)
+
+        assert print_args == [["'a'"]] * 60 + [["'b'"]] * 40 + [
+            ["[Output truncated - 30 more print statements]"]
+        ]
+
+    @pytest.mark.asyncio
+    async def test_records_longest_phases_across_shards(self):
+        timing = TaskTiming()
+        items = [{"json": {"n": n}} for n in range(4)]
+
+        with patch.object(
+            timing, "record_concurrent", wraps=timing.record_concurrent
+        ) as record_concurrent:
+            await self.run_sharded("return _item", items, 2, timing=timing)
+
+        (shard_timings,) = record_concurrent.call_args.args
+        assert len(shard_timings) == 2
+        assert all("user_code" in t.phases for t in shard_timings)
+        assert timing.phases["user_code"] == max(
+            t.phases["user_code"] for t in shard_timings
+        )
+
+    @pytest.mark.asyncio
+    async def test_raises_error_of_first_failing_shard(self):
+        code = """
+if _item["json"]["n"] in (5, 8):
+    raise ValueError(f"item {_item['json']['n']}")
+return _item
+"""
+        items = [{"json": {"n": n}} for n in range(10)]
+
+        with pytest.raises(TaskRuntimeError) as exc_info:
+            await self.run_sharded(code, items, 3)
+
+        assert "item 5" in str(exc_info.value)
+
+    @pytest.mark.asyncio
+    async def test_returns_error_item_on_continue_on_fail(self):
+        code = 'raise ValueError("boom")'
+        items = [{"json": {}} for _ in range(4)]
+
+        result, print_args = await self.run_sharded(
+            code, items, 2, continue_on_fail=True
+        )
+
+        assert len(result) == 1 and "boom" in result[0]["json"]["error"]
+        assert print_args == []
+
+    def test_merge_raises_on_combined_result_too_large(self):
+        shards = []
+        for _ in range(2):
+            spool = ResultSpool()
+            spool.append(b'{"json": {"n": 1}}')
+            shards.append((spool, [], spool.size, None))
+
+        with pytest.raises(TaskResultTooLargeError):
+            TaskExecutor._merge_shard_results(shards, shards[0][0].size + 1)
+
+
+class TestTaskExecutorPipeCommunication:
+    @pytest.mark.asyncio
+    async def test_successful_result_communication(self):
+        chunk = json.dumps([{"json": {"foo": "bar"}}]).encode("utf-8")
+        end_data: PipeResultMessage = {"print_args": []}
+        end = json.dumps(end_data).encode("utf-8")
+
+        result, print_args, size, _ = await execute_with_pipe_frames(
+            [frame(PIPE_FRAME_RESULT_CHUNK, chunk), frame(PIPE_FRAME_END, end)],
+        )
 
-        assert result == [{"json": {"foo": "bar"}}]
+        assert result.to_value() == [{"json": {"foo": "bar"}}]
         assert print_args == []
-        assert size == len(result_json)
+        assert size == len(chunk) - 2
+
+    @pytest.mark.asyncio
+    async def test_usage_is_passed_on(self):
+        usage: TaskUsage = {
+            "user_cpu": 0.25,
+            "system_cpu": 0.05,
+            "max_rss": 32 * 1024 * 1024,
+            "voluntary_switches": 12,
+            "involuntary_switches": 3,
+        }
+        end_data: PipeResultMessage = {"print_args": [], "usage": usage}
+        end = json.dumps(end_data).encode("utf-8")
+
+        _, _, _, received_usage = await execute_with_pipe_frames(
+            [frame(PIPE_FRAME_END, end)]
+        )
+
+        assert received_usage == usage
+
+    @pytest.mark.asyncio
+    async def test_result_chunks_are_joined(self):
+        first = json.dumps([{"json": {"n": 1}}, {"json": {"n": 2}}]).encode("utf-8")
+        second = json.dumps([{"json": {"n": 3}}]).encode("utf-8")
+        end = json.dumps({"print_args": [["'hi'"]]}).encode("utf-8")
+
+        result, print_args, _, _ = await execute_with_pipe_frames(
+            [
+                frame(PIPE_FRAME_RESULT_CHUNK, first),
+                frame(PIPE_FRAME_RESULT_CHUNK, second),
+                frame(PIPE_FRAME_END, end),
+            ],
+        )
+
+        assert result.to_value() == [{"json": {"n": n}} for n in (1, 2, 3)]
+        assert print_args == [["'hi'"]]
+
+    @pytest.mark.asyncio
+    async def test_non_list_result_in_closing_message(self):
+        end_data: PipeResultMessage = {"result": {"json": {}}, "print_args": []}
+        end = json.dumps(end_data).encode("utf-8")
+
+        result, _, _, _ = await execute_with_pipe_frames([frame(PIPE_FRAME_END, end)])
+
+        assert result.to_value() == {"json": {}}
+
+    @pytest.mark.parametrize(
+        "chunk",
+        [
+            b'{"json": {}}',
+            b"[]",
+            b' [{"json": {}}]',
+            b'[{"json": {}}], "injected": true',
+            b'[{"json": {}}]}, "injected": {"a": [1]',
+            b'[{"json": {"a": 1,}}]',
+            b'[{"json": {"text": "\xff"}}]',
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_rejects_result_chunk_not_a_json_array(self, chunk):
+        from src.errors import TaskResultReadError
+
+        end = json.dumps({"print_args": []}).encode("utf-8")
+
+        with pytest.raises(TaskResultReadError) as exc_info:
+            await execute_with_pipe_frames(
+                [frame(PIPE_FRAME_RESULT_CHUNK, chunk), frame(PIPE_FRAME_END, end)],
+            )
+
+        assert exc_info.value.original_error is not None
+
+    @pytest.mark.asyncio
+    async def test_result_over_max_size_raises_error(self):
+        from src.errors import TaskResultTooLargeError
+
+        chunk = json.dumps([{"json": {"text": "x" * 100}}]).encode("utf-8")
+        end = json.dumps({"print_args": []}).encode("utf-8")
+
+        with pytest.raises(TaskResultTooLargeError):
+            await execute_with_pipe_frames(
+                [
+                    frame(PIPE_FRAME_RESULT_CHUNK, chunk),
+                    frame(PIPE_FRAME_RESULT_CHUNK, chunk),
+                    frame(PIPE_FRAME_END, end),
+                ],
+                max_result_size=len(chunk),
+            )
+
+    @pytest.mark.asyncio
+    async def test_print_frames_are_passed_to_callback(self):
+        chunk = json.dumps([{"json": {}}]).encode("utf-8")
+        end = json.dumps({"print_args": [["'last'"]]}).encode("utf-8")
+        received = []
+
+        async def on_print(args):
+            received.append(args)
+
+        _, print_args, _, _ = await execute_with_pipe_frames(
+            [
+                frame(PIPE_FRAME_PRINT, b"[\"'a'\"]"),
+                frame(PIPE_FRAME_PRINT, b'["\'b\'", "1"]'),
+                frame(PIPE_FRAME_RESULT_CHUNK, chunk),
+                frame(PIPE_FRAME_END, end),
+            ],
+            on_print=on_print,
+        )
+
+        assert received == [["'a'"], ["'b'", "1"]]
+        assert print_args == [["'last'"]]
+
+    @pytest.mark.asyncio
+    async def test_print_frames_are_collected_without_callback(self):
+        end = json.dumps({"print_args": [["'last'"]]}).encode("utf-8")
+
+        _, print_args, _, _ = await execute_with_pipe_frames(
+            [frame(PIPE_FRAME_PRINT, b"[\"'a'\"]"), frame(PIPE_FRAME_END, end)],
+        )
+
+        assert print_args == [["'a'"], ["'last'"]]
+
+    @pytest.mark.parametrize("data", [b'"a"', b"[1]", b"[", b'{"a": ["b"]}'])
+    @pytest.mark.asyncio
+    async def test_rejects_print_frame_not_a_list_of_strings(self, data):
+        from src.errors import TaskResultReadError
+
+        end = json.dumps({"print_args": []}).encode("utf-8")
+
+        with pytest.raises(TaskResultReadError):
+            await execute_with_pipe_frames(
+                [frame(PIPE_FRAME_PRINT, data), frame(PIPE_FRAME_END, end)],
+                on_print=AsyncMock(),
+            )
+
+    @pytest.mark.asyncio
+    async def test_frame_larger_than_pipe_buffer(self):
+        items = [{"json": {"text": "x" * 1000}} for _ in range(500)]
+        chunk = json.dumps(items).encode("utf-8")
+        end = json.dumps({"print_args": []}).encode("utf-8")
+        data = frame(PIPE_FRAME_RESULT_CHUNK, chunk) + frame(PIPE_FRAME_END, end)
+
+        process = make_exited_process(0)
+        read_conn, write_conn = multiprocessing.Pipe(duplex=False)
+        write_fd = os.dup(write_conn.fileno())
+
+        def write_slowly():
+            for start in range(0, len(data), 4096):
+                os.write(write_fd, data[start : start + 4096])
+            os.close(write_fd)
+
+        writer = threading.Thread(target=write_slowly)
+        writer.start()
+
+        try:
+            result, _, _, _ = await TaskExecutor.execute_process(
+                process=process,
+                read_conn=read_conn,
+                write_conn=write_conn,
+                task_timeout=60,
+                continue_on_fail=False,
+            )
+        finally:
+            writer.join()
+            os.close(process.sentinel)
+
+        assert result.to_value() == items
+
+    @pytest.mark.asyncio
+    async def test_frame_cut_short_raises_error(self):
+        from src.errors import TaskResultReadError
+
+        data = frame(PIPE_FRAME_RESULT_CHUNK, b'[{"json": {}}]')
+
+        with pytest.raises(TaskResultReadError) as exc_info:
+            await execute_with_pipe_frames([data[:-3]])
 
-    @patch("os.read")
-    def test_successful_error_communication(self, mock_os_read):
+        assert isinstance(exc_info.value.original_error, EOFError)
+
+    @pytest.mark.asyncio
+    async def test_successful_error_communication(self):
         from src.errors import TaskRuntimeError
 
         error_info: TaskErrorInfo = {
@@ -155,58 +771,36 @@ class TestTaskExecutorPipeCommunication:
             "print_args": [],
         }
         error_json = json.dumps(error_data).encode("utf-8")
-        error_length = len(error_json).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
-
-        mock_os_read.side_effect = [error_length, error_json]
-
-        process = MagicMock()
-        process.is_alive.return_value = False
-        process.exitcode = 0
-
-        read_conn = MagicMock()
-        write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
 
         with pytest.raises(TaskRuntimeError) as exc_info:
-            TaskExecutor.execute_process(
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=60,
-                continue_on_fail=False,
-            )
+            await execute_with_pipe_frames([frame(PIPE_FRAME_END, error_json)])
 
         assert str(exc_info.value) == "Test error"
         assert exc_info.value.stack_trace == "traceback..."
 
 
-class TestTaskExecutorLowLevelIO:
-    @patch("os.read")
-    def test_read_exact_bytes_single_read(self, mock_os_read):
-        data = b"test data"
-        mock_os_read.return_value = data
+class TestSerializeResultChunks:
+    def test_splits_items_into_chunks_of_bounded_size(self):
+        items = [{"json": {"text": "x" * 1000}} for _ in range(3000)]
 
-        result = PipeReader._read_exact_bytes(999, len(data))
+        chunks = list(TaskExecutor._serialize_result_chunks(items))
 
-        assert result == data
-        mock_os_read.assert_called_once_with(999, len(data))
+        assert len(chunks) > 1
+        assert all(len(chunk) < PIPE_CHUNK_SIZE + 2000 for chunk in chunks)
+        assert [item for chunk in chunks for item in json.loads(chunk)] == items
 
-    @patch("os.read")
-    def test_read_exact_bytes_multiple_reads(self, mock_os_read):
-        mock_os_read.side_effect = [b"test", b" ", b"data"]
+    def test_item_larger_than_chunk_size_is_sent_alone(self):
+        items = [{"json": {"n": 1}}, {"json": {"text": "x" * PIPE_CHUNK_SIZE}}]
 
-        result = PipeReader._read_exact_bytes(999, 9)
+        chunks = list(TaskExecutor._serialize_result_chunks(items))
 
-        assert result == b"test data"
-        assert mock_os_read.call_count == 3
+        assert [json.loads(chunk) for chunk in chunks] == [items]
 
-    @patch("os.read")
-    def test_read_exact_bytes_eof_error(self, mock_os_read):
-        mock_os_read.side_effect = [b"test", b""]  # empty for EOF
+    def test_no_chunks_for_empty_result(self):
+        assert list(TaskExecutor._serialize_result_chunks([])) == []
 
-        with pytest.raises(EOFError, match="Pipe closed before reading all data"):
-            PipeReader._read_exact_bytes(999, 10)
 
+class TestTaskExecutorLowLevelIO:
     @patch("os.write")
     def test_write_bytes_write_failure(self, mock_os_write):
         mock_os_write.return_value = 0
@@ -292,6 +886,21 @@ class TestFilterBuiltins:
         assert "len" in result
         assert result["__import__"] is not None
 
+    def test_user_function_looks_up_builtins_in_dict_behind_read_only_view(self):
+        allowed = TaskExecutor._get_allowed_builtins(self._make_security_config())
+        read_only = TaskExecutor._make_read_only(allowed)
+        globals = {"__builtins__": read_only}
+        code = "return len(globals()['__builtins__'])"
+        compiled = marshal.loads(TaskExecutor.compile_code(code, "all_items"))
+
+        function = TaskExecutor._create_user_function(compiled, globals, allowed)
+
+        assert function() == len(allowed)
+        assert type(function.__builtins__) is dict
+        assert globals["__builtins__"] is read_only
+        assert function.__builtins__ == allowed
+        assert function.__builtins__ is not allowed
+
 
 def _run_with_guard(code: str, namespace: dict | None = None) -> dict:
     tree = ast.parse(code)
@@ -381,6 +990,31 @@ class TestSafeFormatGuard:
         result = _safe_format("format", Custom(), "anything")
         assert result == ("custom", ("anything",))
 
+    def test_repeated_template_validated_once(self):
+        _find_blocked_format_token.cache_clear()
+
+        for name in ("a", "b", "c"):
+            assert _safe_format("format", "Hello {}", name) == f"Hello {name}"
+
+        assert _find_blocked_format_token.cache_info().misses == 1
+        assert _find_blocked_format_token.cache_info().hits == 2
+
+    def test_repeated_blocked_template_rejected(self):
+        for _ in range(2):
+            with pytest.raises(SecurityViolationError):
+                _safe_format("format", "{0.__class__}", object())
+
+    def test_str_subclass_template_not_cached(self):
+        class Template(str):
+            pass
+
+        _find_blocked_format_token.cache_clear()
+
+        assert _safe_format("format", Template("Hello {}"), "world") == "Hello world"
+        with pytest.raises(SecurityViolationError):
+            _safe_format("format", Template("{0.__class__}"), object())
+        assert _find_blocked_format_token.cache_info().currsize == 0
+
     def test_kwarg_named_like_internal_param_passes_through(self):
         assert _safe_format("format", "{method_name}", method_name="ok") == "ok"
         assert _safe_format("format", "{receiver}", receiver="ok") == "ok"
@@ -388,7 +1022,7 @@ class TestSafeFormatGuard:
 
 class TestFormatGuardTransformer:
     def test_rewrites_format_method_call(self):
-        tree = ast.parse('"hi {}".format(name)')
+        tree = ast.parse("template.format(name)")
         FormatGuardTransformer().visit(tree)
         ast.fix_missing_locations(tree)
         rendered = ast.unparse(tree)
@@ -396,13 +1030,28 @@ class TestFormatGuardTransformer:
         assert ".format(" not in rendered
 
     def test_rewrites_format_map_method_call(self):
-        tree = ast.parse('"hi {a}".format_map({"a": 1})')
+        tree = ast.parse('template.format_map({"a": 1})')
         FormatGuardTransformer().visit(tree)
         ast.fix_missing_locations(tree)
         rendered = ast.unparse(tree)
         assert EXECUTOR_SAFE_FORMAT_KEY in rendered
         assert ".format_map(" not in rendered
 
+    @pytest.mark.parametrize(
+        "code", ['"hi {}".format(name)', '"hi {a}".format_map({"a": 1})']
+    )
+    def test_leaves_safe_literal_template_unguarded(self, code):
+        tree = ast.parse(code)
+        FormatGuardTransformer().visit(tree)
+        ast.fix_missing_locations(tree)
+        assert ast.unparse(tree) == ast.unparse(ast.parse(code))
+
+    def test_rewrites_blocked_literal_template(self):
+        tree = ast.parse('"{0.__class__}".format(obj)')
+        FormatGuardTransformer().visit(tree)
+        ast.fix_missing_locations(tree)
+        assert EXECUTOR_SAFE_FORMAT_KEY in ast.unparse(tree)
+
     def test_leaves_unrelated_calls_untouched(self):
         tree = ast.parse('"abc".upper()')
         FormatGuardTransformer().visit(tree)
@@ -525,3 +1174,138 @@ return template.format(lambda: None)
         ns = {"__builtins__": __builtins__, EXECUTOR_SAFE_FORMAT_KEY: _safe_format}
         with pytest.raises(SecurityViolationError):
             exec(compiled, ns)
+
+    @pytest.mark.parametrize(
+        "filename", [EXECUTOR_ALL_ITEMS_FILENAME, EXECUTOR_PER_ITEM_FILENAME]
+    )
+    def test_keeps_line_numbers_of_user_code(self, filename):
+        raw = 'x = 1\n\nraise ValueError("line 3")\n'
+        compiled = TaskExecutor._compile_user_code(raw, filename)
+
+        with pytest.raises(ValueError) as exc_info:
+            exec(compiled, {"__builtins__": __builtins__})
+
+        frame = traceback.extract_tb(exc_info.value.__traceback__)[-1]
+        assert (frame.filename, frame.name, frame.lineno) == (
+            filename,
+            "_user_function",
+            3,
+        )
+
+    def test_keeps_multiline_strings_unchanged(self):
+        compiled = TaskExecutor._compile_user_code('return """a\nb"""', "<inline>")
+
+        ns = {"__builtins__": __builtins__}
+        exec(compiled, ns)
+
+        assert ns[EXECUTOR_USER_OUTPUT_KEY] == "a\nb"
+
+    def test_compiles_given_tree_without_parsing(self):
+        tree = ast.parse("return 2")
+
+        with patch("src.task_executor.ast.parse") as parse:
+            compiled = TaskExecutor._compile_user_code("return 1", "<inline>", tree)
+
+        ns = {"__builtins__": __builtins__}
+        exec(compiled, ns)
+        assert ns[EXECUTOR_USER_OUTPUT_KEY] == 2
+        parse.assert_not_called()
+
+
+class TestCompileCode:
+    @pytest.fixture(autouse=True)
+    def empty_cache(self, monkeypatch):
+        monkeypatch.setattr(TaskExecutor, "_compile_cache", collections.OrderedDict())
+
+    def test_returns_marshalled_code_for_mode(self):
+        code = TaskExecutor.compile_code("return 1", "per_item")
+
+        compiled = marshal.loads(code)
+
+        assert compiled.co_filename == EXECUTOR_PER_ITEM_FILENAME
+        ns = {"__builtins__": __builtins__, EXECUTOR_SAFE_FORMAT_KEY: _safe_format}
+        exec(compiled, ns)
+        assert ns[EXECUTOR_USER_OUTPUT_KEY] == 1
+
+    def test_caches_per_code_and_mode(self):
+        with patch.object(
+            TaskExecutor,
+            "_compile_user_code",
+            wraps=TaskExecutor._compile_user_code,
+        ) as compile_user_code:
+            first = TaskExecutor.compile_code("return 1", "all_items")
+            second = TaskExecutor.compile_code("return 1", "all_items")
+            TaskExecutor.compile_code("return 1", "per_item")
+            TaskExecutor.compile_code("return 2", "all_items")
+
+        assert first is second
+        assert compile_user_code.call_count == 3
+
+    def test_evicts_least_recently_used(self, monkeypatch):
+        monkeypatch.setattr("src.task_executor.MAX_COMPILE_CACHE_SIZE", 2)
+
+        TaskExecutor.compile_code("return 1", "all_items")
+        TaskExecutor.compile_code("return 2", "all_items")
+        TaskExecutor.compile_code("return 1", "all_items")
+        TaskExecutor.compile_code("return 3", "all_items")
+
+        def code_hash(code: str) -> str:
+            return hashlib.sha256(code.encode()).hexdigest()
+
+        assert [key[0] for key in TaskExecutor._compile_cache] == [
+            code_hash("return 1"),
+            code_hash("return 3"),
+        ]
+
+    def test_raises_syntax_error(self):
+        with pytest.raises(SyntaxError):
+            TaskExecutor.compile_code("return (", "all_items")
+
+
+class TestPreloadModules:
+    def make_security_config(self, stdlib_allow, external_allow=None):
+        return SecurityConfig(
+            stdlib_allow=stdlib_allow,
+            external_allow=external_allow or set(),
+            builtins_deny=set(),
+            runner_env_deny=False,
+        )
+
+    def test_preload_names_skip_wildcard_allowlists(self):
+        config = self.make_security_config({"*"}, {"pandas", "numpy"})
+
+        assert TaskExecutor._get_preload_names(config) == ["numpy", "pandas"]
+
+    def test_reports_preloaded_and_imported_modules(self):
+        with patch.dict("sys.modules"):
+            import sys
+
+            sys.modules.pop("colorsys", None)
+            config = self.make_security_config({"colorsys"})
+
+            report, imported = TaskExecutor.preload_modules(config)
+
+        assert report["modules"] == ["colorsys"]
+        assert report["failed"] == []
+        assert "colorsys" in imported
+        assert report["imported_count"] == len(imported)
+        assert report["duration"] >= 0
+
+    def test_reports_modules_that_fail_to_import(self):
+        config = self.make_security_config(set(), {"n8n_nonexistent_module"})
+
+        report, _ = TaskExecutor.preload_modules(config)
+
+        assert report["modules"] == []
+        assert report["failed"] == ["n8n_nonexistent_module"]
+
+    def test_restores_importlib(self):
+        import importlib
+
+        import_module = importlib.import_module
+        dunder_import = importlib.__import__
+
+        TaskExecutor.preload_modules(self.make_security_config({"json"}))
+
+        assert importlib.import_module is import_module
+        assert importlib.__import__ is dunder_import
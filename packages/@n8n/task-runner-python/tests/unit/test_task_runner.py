@@ -1,12 +1,27 @@
 import asyncio
+import collections
+import threading
+import time
 
 import pytest
 from unittest.mock import patch, Mock
 
 from websockets.exceptions import InvalidStatus
 
-from src.task_runner import TaskRunner
+from src.task_runner import TaskOffer, TaskRunner
+from src.task_state import TaskState
+from src.task_analyzer import TaskAnalyzer
+from src.task_executor import TaskExecutor
+from src.task_timing import TaskTiming
 from src.config.task_runner_config import TaskRunnerConfig
+from src.errors import CodeValidationTimeoutError, SecurityViolationError
+from src.message_types.broker import TaskSettings
+from src.message_types import (
+    BrokerTaskCancel,
+    BrokerTaskOfferAccept,
+    RunnerTaskOffer,
+    RunnerTaskRejected,
+)
 
 
 def make_config(**overrides):
@@ -15,8 +30,11 @@ def make_config(**overrides):
         "runner_id": "",
         "task_broker_uri": "http://127.0.0.1:5679",
         "max_concurrency": 5,
+        "adaptive_concurrency": False,
         "max_payload_size": 1024 * 1024,
         "task_timeout": 60,
+        "task_memory_limit": 0,
+        "task_cpu_limit": 0,
         "auto_shutdown_timeout": 0,
         "graceful_shutdown_timeout": 10,
         "stdlib_allow": {"*"},
@@ -24,6 +42,14 @@ def make_config(**overrides):
         "builtins_deny": set(),
         "env_deny": False,
         "allow_transitive_imports": False,
+        "worker_pool_size": 0,
+        "worker_pool_refill_rate": 10,
+        "forkserver_preload": False,
+        "stream_print_output": False,
+        "code_cache_dir": "",
+        "code_cache_max_size": 64 * 1024 * 1024,
+        "code_cache_secret": "",
+        "per_item_max_shards": 1,
     }
     return TaskRunnerConfig(**{**defaults, **overrides})
 
@@ -114,3 +140,245 @@ class TestTaskRunnerDrain:
 
         assert runner.can_send_offers is False
         assert runner.offers_coroutine.cancelled()
+
+
+class TestTaskRunnerOffers:
+    async def start_offers(self, runner: TaskRunner) -> list[RunnerTaskOffer]:
+        offers: list[RunnerTaskOffer] = []
+
+        async def send_message(message):
+            if isinstance(message, RunnerTaskOffer):
+                offers.append(message)
+
+        runner.websocket_connection = Mock(latency=0.0)
+        runner._send_message = send_message  # type: ignore[method-assign]
+        runner.can_send_offers = True
+        runner.offers_coroutine = asyncio.create_task(runner._send_offers_loop())
+        await asyncio.sleep(0.01)
+
+        return offers
+
+    @pytest.mark.asyncio
+    async def test_reoffers_as_soon_as_slot_frees_up(self):
+        runner = TaskRunner(make_config(max_concurrency=1))
+        offers = await self.start_offers(runner)
+
+        try:
+            assert len(offers) == 1
+
+            accept = BrokerTaskOfferAccept(task_id="t1", offer_id=offers[0].offer_id)
+            await runner._handle_task_offer_accept(accept)
+            await asyncio.sleep(0.01)
+
+            assert len(offers) == 1
+
+            await runner._handle_task_cancel(BrokerTaskCancel(task_id="t1", reason=""))
+            await asyncio.sleep(0.01)
+
+            assert len(offers) == 2
+        finally:
+            await runner._cancel_coroutine(runner.offers_coroutine)
+
+    @pytest.mark.asyncio
+    async def test_reoffers_as_soon_as_offer_expires(self):
+        runner = TaskRunner(make_config(max_concurrency=1))
+
+        with (
+            patch.object(runner, "_get_offer_timing", return_value=(50, 0.0)),
+            patch("src.task_runner.OFFER_VALIDITY_MAX_JITTER", 0),
+        ):
+            offers = await self.start_offers(runner)
+
+            try:
+                await asyncio.sleep(0.2)
+            finally:
+                await runner._cancel_coroutine(runner.offers_coroutine)
+
+        assert 3 <= len(offers) <= 6
+        assert len(runner.open_offers) == 1
+        assert len(runner.offer_expiries) == 1
+
+    @pytest.mark.asyncio
+    async def test_offers_adaptive_concurrency_as_soon_as_it_grows(self):
+        runner = TaskRunner(make_config(adaptive_concurrency=True))
+        assert runner.concurrency is not None
+        runner.concurrency.limit = 1
+        offers = await self.start_offers(runner)
+
+        try:
+            assert len(offers) == 1
+
+            runner.concurrency._set_limit(2, "test")
+            await asyncio.sleep(0.01)
+
+            assert len(offers) == 2
+        finally:
+            await runner._cancel_coroutine(runner.offers_coroutine)
+
+    @pytest.mark.parametrize(
+        "latency,expected",
+        [
+            (0.0, (5000, 0.1)),  # not measured yet
+            (0.01, (5000, 0.1)),
+            (0.5, (10000, 1.0)),
+            (10.0, (30000, 20.0)),
+        ],
+    )
+    def test_offer_timing_scales_with_round_trip(self, latency, expected):
+        runner = TaskRunner(make_config())
+        runner.websocket_connection = Mock(latency=latency)
+
+        assert runner._get_offer_timing() == expected
+
+
+class TestTaskRunnerValidation:
+    @pytest.fixture(autouse=True)
+    def empty_caches(self, monkeypatch):
+        monkeypatch.setattr(TaskAnalyzer, "_cache", collections.OrderedDict())
+        monkeypatch.setattr(TaskExecutor, "_compile_cache", collections.OrderedDict())
+
+    @pytest.fixture
+    def runner(self):
+        runner = TaskRunner(make_config(stdlib_allow={"json"}, external_allow=set()))
+        yield runner
+        runner.validation_pool.shutdown(wait=True)
+
+    def make_settings(self, code: str) -> TaskSettings:
+        return TaskSettings(
+            code=code,
+            node_mode="all_items",
+            continue_on_fail=False,
+            items=[],
+            workflow_name="",
+            workflow_id="",
+            node_name="",
+            node_id="",
+        )
+
+    @pytest.mark.asyncio
+    async def test_validates_uncached_code_in_pool(self, runner):
+        threads = []
+        validate = runner.analyzer.validate
+
+        def record_thread(code):
+            threads.append(threading.current_thread().name)
+            return validate(code)
+
+        timing = TaskTiming()
+        with patch.object(runner.analyzer, "validate", side_effect=record_thread):
+            code = await runner._validate_and_compile(
+                self.make_settings("return 1"), timing
+            )
+
+        assert code == TaskExecutor.compile_code("return 1", "all_items")
+        assert len(threads) == 1 and threads[0].startswith("validation")
+        assert list(timing.phases) == ["validation", "compile"]
+
+    @pytest.mark.asyncio
+    async def test_serves_cached_code_on_event_loop(self, runner):
+        settings = self.make_settings("return 1")
+        first = await runner._validate_and_compile(settings, TaskTiming())
+
+        timing = TaskTiming()
+        with patch.object(runner.validation_pool, "submit") as submit:
+            second = await runner._validate_and_compile(settings, timing)
+
+        submit.assert_not_called()
+        assert second == first
+        assert list(timing.phases) == ["validation"]
+
+    @pytest.mark.asyncio
+    async def test_raises_cached_violations_on_event_loop(self, runner):
+        settings = self.make_settings("import os")
+        with pytest.raises(SecurityViolationError):
+            await runner._validate_and_compile(settings, TaskTiming())
+
+        with patch.object(runner.validation_pool, "submit") as submit:
+            with pytest.raises(SecurityViolationError):
+                await runner._validate_and_compile(settings, TaskTiming())
+
+        submit.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_times_out_slow_validation(self, runner):
+        def slow_validate(code):
+            time.sleep(0.2)
+
+        with (
+            patch("src.task_runner.VALIDATION_TIMEOUT", 0.05),
+            patch.object(runner.analyzer, "validate", side_effect=slow_validate),
+        ):
+            with pytest.raises(CodeValidationTimeoutError):
+                await runner._validate_and_compile(
+                    self.make_settings("return 1"), TaskTiming()
+                )
+
+
+class TestTaskRunnerSharding:
+    def make_settings(self, item_count: int, node_mode="per_item") -> TaskSettings:
+        return TaskSettings(
+            code="return _item",
+            node_mode=node_mode,
+            continue_on_fail=False,
+            items=[{"json": {}}] * item_count,
+            workflow_name="",
+            workflow_id="",
+            node_name="",
+            node_id="",
+        )
+
+    def start_task(self, runner: TaskRunner, task_id: str, slots: int = 1) -> None:
+        task_state = TaskState(task_id)
+        task_state.slots = slots
+        runner.running_tasks[task_id] = task_state
+
+    @pytest.mark.parametrize(
+        "max_shards,item_count,node_mode,expected",
+        [
+            (1, 10_000, "per_item", 1),
+            (4, 10_000, "all_items", 1),
+            (4, 10_000, "per_item", 4),
+            (4, 2_500, "per_item", 2),
+            (4, 500, "per_item", 1),
+        ],
+    )
+    def test_shards_per_item_tasks_with_enough_items(
+        self, max_shards, item_count, node_mode, expected
+    ):
+        runner = TaskRunner(make_config(per_item_max_shards=max_shards))
+        self.start_task(runner, "t1")
+
+        settings = self.make_settings(item_count, node_mode)
+
+        assert runner._get_shard_count(settings) == expected
+
+    def test_shards_only_into_free_slots(self):
+        runner = TaskRunner(make_config(max_concurrency=5, per_item_max_shards=8))
+        self.start_task(runner, "t1")
+        self.start_task(runner, "t2", slots=3)
+
+        assert runner.used_slots == 4
+        assert runner._get_shard_count(self.make_settings(10_000)) == 2
+
+        self.start_task(runner, "t3")
+
+        assert runner._get_shard_count(self.make_settings(10_000)) == 1
+
+    @pytest.mark.asyncio
+    async def test_rejects_task_when_shards_take_all_slots(self):
+        runner = TaskRunner(make_config(max_concurrency=2))
+        sent = []
+
+        async def send_message(message):
+            sent.append(message)
+
+        runner._send_message = send_message  # type: ignore[method-assign]
+        runner.open_offers["o1"] = TaskOffer("o1", time.time() + 10)
+        self.start_task(runner, "t1", slots=2)
+
+        await runner._handle_task_offer_accept(
+            BrokerTaskOfferAccept(task_id="t2", offer_id="o1")
+        )
+
+        assert isinstance(sent[0], RunnerTaskRejected)
+        assert "t2" not in runner.running_tasks
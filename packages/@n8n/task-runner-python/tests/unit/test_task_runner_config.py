@@ -1,8 +1,23 @@
 import os
 from unittest.mock import patch
 
+import pytest
+
 from src.config.task_runner_config import TaskRunnerConfig
-from src.constants import ENV_ALLOW_TRANSITIVE_IMPORTS, ENV_GRANT_TOKEN
+from src.errors import ConfigurationError
+from src.constants import (
+    ENV_ALLOW_TRANSITIVE_IMPORTS,
+    ENV_CODE_CACHE_DIR,
+    ENV_CODE_CACHE_MAX_SIZE,
+    ENV_CODE_CACHE_SECRET,
+    ENV_GRANT_TOKEN,
+    ENV_MAX_CONCURRENCY,
+    ENV_PER_ITEM_MAX_SHARDS,
+    ENV_TASK_CPU_LIMIT,
+    ENV_TASK_MEMORY_LIMIT,
+    ENV_WORKER_POOL_REFILL_RATE,
+    ENV_WORKER_POOL_SIZE,
+)
 
 
 class TestAllowTransitiveImports:
@@ -17,3 +32,166 @@ class TestAllowTransitiveImports:
             clear=True,
         ):
             assert TaskRunnerConfig.from_env().allow_transitive_imports is True
+
+
+class TestWorkerPool:
+    def test_disabled_by_default(self):
+        with patch.dict(os.environ, {ENV_GRANT_TOKEN: "t"}, clear=True):
+            config = TaskRunnerConfig.from_env()
+
+        assert config.worker_pool_size == 0
+        assert config.is_worker_pool_enabled is False
+
+    def test_reads_size_and_refill_rate_from_env(self):
+        with patch.dict(
+            os.environ,
+            {
+                ENV_GRANT_TOKEN: "t",
+                ENV_WORKER_POOL_SIZE: "4",
+                ENV_WORKER_POOL_REFILL_RATE: "20",
+            },
+            clear=True,
+        ):
+            config = TaskRunnerConfig.from_env()
+
+        assert config.worker_pool_size == 4
+        assert config.worker_pool_refill_rate == 20
+        assert config.is_worker_pool_enabled is True
+
+    def test_rejects_negative_size(self):
+        with patch.dict(
+            os.environ, {ENV_GRANT_TOKEN: "t", ENV_WORKER_POOL_SIZE: "-1"}, clear=True
+        ):
+            with pytest.raises(ConfigurationError):
+                TaskRunnerConfig.from_env()
+
+    def test_rejects_non_positive_refill_rate(self):
+        with patch.dict(
+            os.environ,
+            {ENV_GRANT_TOKEN: "t", ENV_WORKER_POOL_REFILL_RATE: "0"},
+            clear=True,
+        ):
+            with pytest.raises(ConfigurationError):
+                TaskRunnerConfig.from_env()
+
+
+class TestMaxConcurrency:
+    def test_fixed_by_default(self):
+        with patch.dict(os.environ, {ENV_GRANT_TOKEN: "t"}, clear=True):
+            config = TaskRunnerConfig.from_env()
+
+        assert config.max_concurrency == 5
+        assert config.adaptive_concurrency is False
+
+    def test_reads_auto_from_env(self):
+        with patch.dict(
+            os.environ, {ENV_GRANT_TOKEN: "t", ENV_MAX_CONCURRENCY: "auto"}, clear=True
+        ):
+            config = TaskRunnerConfig.from_env()
+
+        assert config.adaptive_concurrency is True
+
+
+class TestTaskResourceLimits:
+    def test_unlimited_by_default(self):
+        with patch.dict(os.environ, {ENV_GRANT_TOKEN: "t"}, clear=True):
+            config = TaskRunnerConfig.from_env()
+
+        assert config.task_memory_limit == 0
+        assert config.task_cpu_limit == 0
+
+    def test_reads_limits_from_env(self):
+        with patch.dict(
+            os.environ,
+            {
+                ENV_GRANT_TOKEN: "t",
+                ENV_TASK_MEMORY_LIMIT: "512",
+                ENV_TASK_CPU_LIMIT: "30",
+            },
+            clear=True,
+        ):
+            config = TaskRunnerConfig.from_env()
+
+        assert config.task_memory_limit == 512 * 1024 * 1024
+        assert config.task_cpu_limit == 30
+
+    @pytest.mark.parametrize("env_var", [ENV_TASK_MEMORY_LIMIT, ENV_TASK_CPU_LIMIT])
+    def test_rejects_negative_limit(self, env_var):
+        with patch.dict(os.environ, {ENV_GRANT_TOKEN: "t", env_var: "-1"}, clear=True):
+            with pytest.raises(ConfigurationError):
+                TaskRunnerConfig.from_env()
+
+
+class TestCodeCache:
+    def test_disabled_by_default(self):
+        with patch.dict(os.environ, {ENV_GRANT_TOKEN: "t"}, clear=True):
+            config = TaskRunnerConfig.from_env()
+
+        assert config.is_code_cache_enabled is False
+        assert config.code_cache_max_size == 64 * 1024 * 1024
+
+    def test_reads_dir_and_max_size_from_env(self):
+        with patch.dict(
+            os.environ,
+            {
+                ENV_GRANT_TOKEN: "t",
+                ENV_CODE_CACHE_DIR: "/var/cache/n8n-runner",
+                ENV_CODE_CACHE_MAX_SIZE: "16",
+            },
+            clear=True,
+        ):
+            config = TaskRunnerConfig.from_env()
+
+        assert config.is_code_cache_enabled is True
+        assert config.code_cache_dir == "/var/cache/n8n-runner"
+        assert config.code_cache_max_size == 16 * 1024 * 1024
+
+    def test_reads_secret_and_drops_it_from_env(self):
+        with patch.dict(
+            os.environ,
+            {ENV_GRANT_TOKEN: "t", ENV_CODE_CACHE_SECRET: "s3cret"},
+            clear=True,
+        ):
+            config = TaskRunnerConfig.from_env()
+
+            assert ENV_CODE_CACHE_SECRET not in os.environ
+
+        assert config.code_cache_secret == "s3cret"
+
+    def test_rejects_non_positive_max_size(self):
+        with patch.dict(
+            os.environ,
+            {ENV_GRANT_TOKEN: "t", ENV_CODE_CACHE_MAX_SIZE: "0"},
+            clear=True,
+        ):
+            with pytest.raises(ConfigurationError):
+                TaskRunnerConfig.from_env()
+
+
+class TestPerItemSharding:
+    def test_disabled_by_default(self):
+        with patch.dict(os.environ, {ENV_GRANT_TOKEN: "t"}, clear=True):
+            config = TaskRunnerConfig.from_env()
+
+        assert config.per_item_max_shards == 1
+        assert config.is_sharding_enabled is False
+
+    def test_reads_max_shards_from_env(self):
+        with patch.dict(
+            os.environ,
+            {ENV_GRANT_TOKEN: "t", ENV_PER_ITEM_MAX_SHARDS: "4"},
+            clear=True,
+        ):
+            config = TaskRunnerConfig.from_env()
+
+        assert config.per_item_max_shards == 4
+        assert config.is_sharding_enabled is True
+
+    def test_rejects_non_positive_max_shards(self):
+        with patch.dict(
+            os.environ,
+            {ENV_GRANT_TOKEN: "t", ENV_PER_ITEM_MAX_SHARDS: "0"},
+            clear=True,
+        ):
+            with pytest.raises(ConfigurationError):
+                TaskRunnerConfig.from_env()
@@ -0,0 +1,77 @@
+from unittest.mock import patch
+
+from src.task_timing import TaskTiming
+
+
+class TestTaskTiming:
+    def test_records_phase_until_now(self):
+        timing = TaskTiming()
+
+        with patch("time.monotonic", return_value=10.5):
+            next_start = timing.record("validation", 10.0)
+
+        assert timing.phases == {"validation": 0.5}
+        assert next_start == 10.5
+
+    def test_records_subprocess_phases_in_order(self):
+        timing = TaskTiming()
+        timing.phases["validation"] = 0.001
+
+        timing.record_subprocess(
+            spawn_started=100.0,
+            timestamps={
+                "started": 100.01,
+                "code_started": 100.015,
+                "code_finished": 100.115,
+                "finished": 100.12,
+            },
+            received=100.125,
+        )
+
+        assert list(timing.phases) == [
+            "validation",
+            "spawn",
+            "sandbox",
+            "user_code",
+            "serialization",
+            "pipe_transfer",
+        ]
+        assert round(timing.phases["spawn"], 6) == 0.01
+        assert round(timing.phases["user_code"], 6) == 0.1
+        assert round(timing.phases["pipe_transfer"], 6) == 0.005
+
+    def test_clamps_negative_durations(self):
+        timing = TaskTiming()
+
+        timing.record_subprocess(
+            spawn_started=100.0,
+            timestamps={
+                "started": 99.99,
+                "code_started": 100.0,
+                "code_finished": 100.0,
+                "finished": 100.0,
+            },
+            received=100.0,
+        )
+
+        assert timing.phases["spawn"] == 0.0
+
+    def test_records_concurrent_phases_as_longest(self):
+        timing = TaskTiming()
+        timing.phases["items"] = 0.002
+        first, second = TaskTiming(), TaskTiming()
+        first.phases.update(spawn=0.01, user_code=0.5)
+        second.phases.update(spawn=0.03, user_code=0.2)
+
+        timing.record_concurrent([first, second])
+
+        assert timing.phases == {"items": 0.002, "spawn": 0.03, "user_code": 0.5}
+
+    def test_summary(self):
+        timing = TaskTiming()
+        timing.phases = {"validation": 0.0012, "user_code": 0.25}
+
+        assert timing.summary() == "validation 1.2ms, user code 250.0ms"
+
+    def test_summary_without_phases(self):
+        assert TaskTiming().summary() == "no phases timed"
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+from functools import partial
+from unittest.mock import patch
+
+import pytest
+
+from src.config.security_config import SecurityConfig
+from src.shared_items import SharedItems
+from src.task_executor import TaskExecutor
+from src.worker_pool import WorkerPool
+
+
+def make_security_config() -> SecurityConfig:
+    return SecurityConfig(
+        stdlib_allow=set(),
+        external_allow=set(),
+        builtins_deny=set(),
+        runner_env_deny=True,
+    )
+
+
+async def wait_for_idle_workers(pool: WorkerPool, count: int, timeout: float = 10.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while pool.idle_count < count:
+        if asyncio.get_running_loop().time() > deadline:
+            raise TimeoutError(f"Pool did not reach {count} idle workers")
+        await asyncio.sleep(0.05)
+
+
+class TestWorkerPool:
+    def test_acquire_returns_none_when_empty(self):
+        pool = WorkerPool(make_security_config(), size=1, refill_rate=10)
+
+        assert pool.acquire() is None
+
+    @pytest.mark.asyncio
+    async def test_refill_logs_unexpected_errors_and_retries(self, caplog):
+        pool = WorkerPool(make_security_config(), size=1, refill_rate=100)
+        worker = pool._spawn()
+
+        with patch.object(pool, "_spawn", side_effect=[RuntimeError("boom"), worker]):
+            with caplog.at_level(logging.ERROR, logger="src.worker_pool"):
+                pool.start()
+                try:
+                    await wait_for_idle_workers(pool, 1)
+                finally:
+                    await pool.stop()
+
+        [record] = caplog.records
+        assert record.message == "Unexpected error spawning pooled worker"
+        assert record.exc_info is not None
+        assert str(record.exc_info[1]) == "boom"
+
+    @pytest.mark.asyncio
+    async def test_pooled_worker_executes_dispatched_task(self):
+        pool = WorkerPool(make_security_config(), size=1, refill_rate=100)
+        pool.start()
+
+        try:
+            await wait_for_idle_workers(pool, 1)
+            worker = pool.acquire()
+            assert worker is not None
+
+            result, print_args, _, _ = await TaskExecutor.execute_process(
+                process=worker.process,
+                read_conn=worker.read_conn,
+                write_conn=worker.write_conn,
+                task_timeout=10,
+                continue_on_fail=False,
+                dispatch=partial(
+                    worker.dispatch,
+                    TaskExecutor.compile_code(
+                        "print('hi')\nreturn [{'json': {'n': len(_items)}}]",
+                        "all_items",
+                    ),
+                    "all_items",
+                    [{"json": {}}, {"json": {}}],
+                ),
+            )
+
+            assert result.to_value() == [{"json": {"n": 2}}]
+            assert print_args == [["'hi'"]]
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(
+        not SharedItems.is_supported(), reason="memfd is not supported on this platform"
+    )
+    async def test_pooled_worker_receives_shared_items(self):
+        pool = WorkerPool(make_security_config(), size=1, refill_rate=100)
+        pool.start()
+        shared = SharedItems.create([{"json": {"v": 1}}, {"json": {"v": 2}}])
+
+        try:
+            await wait_for_idle_workers(pool, 1)
+            worker = pool.acquire()
+            assert worker is not None
+
+            result, _, _, _ = await TaskExecutor.execute_process(
+                process=worker.process,
+                read_conn=worker.read_conn,
+                write_conn=worker.write_conn,
+                task_timeout=10,
+                continue_on_fail=False,
+                dispatch=partial(
+                    worker.dispatch,
+                    TaskExecutor.compile_code(
+                        "return [{'json': {'sum': sum(i['json']['v'] for i in _items)}}]",
+                        "all_items",
+                    ),
+                    "all_items",
+                    shared,
+                ),
+            )
+
+            assert result.to_value() == [{"json": {"sum": 3}}]
+        finally:
+            shared.close()
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(
+        not SharedItems.is_supported(), reason="memfd is not supported on this platform"
+    )
+    async def test_pooled_worker_receives_shared_items_by_item(self):
+        pool = WorkerPool(make_security_config(), size=1, refill_rate=100)
+        pool.start()
+        shared = SharedItems.create(
+            [{"json": {"v": 1}}, {"json": {"v": 2}}], by_item=True
+        )
+
+        try:
+            await wait_for_idle_workers(pool, 1)
+            worker = pool.acquire()
+            assert worker is not None
+
+            result, _, _, _ = await TaskExecutor.execute_process(
+                process=worker.process,
+                read_conn=worker.read_conn,
+                write_conn=worker.write_conn,
+                task_timeout=10,
+                continue_on_fail=False,
+                dispatch=partial(
+                    worker.dispatch,
+                    TaskExecutor.compile_code(
+                        "return {'v': _item['json']['v'] + 1}", "per_item"
+                    ),
+                    "per_item",
+                    shared,
+                ),
+            )
+
+            assert result.to_value() == [
+                {"json": {"v": 2}, "pairedItem": {"item": 0}},
+                {"json": {"v": 3}, "pairedItem": {"item": 1}},
+            ]
+        finally:
+            shared.close()
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_refills_after_acquire(self):
+        pool = WorkerPool(make_security_config(), size=1, refill_rate=100)
+        pool.start()
+
+        try:
+            await wait_for_idle_workers(pool, 1)
+            worker = pool.acquire()
+            assert worker is not None
+            assert pool.idle_count == 0
+
+            await wait_for_idle_workers(pool, 1)
+            assert pool.idle_count == 1
+
+            pool._discard(worker)
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_stop_shuts_down_idle_workers(self):
+        pool = WorkerPool(make_security_config(), size=2, refill_rate=100)
+        pool.start()
+        await wait_for_idle_workers(pool, 2)
+        processes = [worker.process for worker in pool.idle_workers]
+
+        await pool.stop()
+
+        assert pool.idle_count == 0
+        assert all(not process.is_alive() for process in processes)